@@ -0,0 +1,64 @@
+"""
+Per-frame face analysis cost on a fixed image.
+
+    python benchmarks/face_analysis.py [image] [--frames N]
+
+Times analyze_face with detection on every call (image mode) and with
+landmarks detected once and passed in (video mode, as the face track store
+does). Timing is wall-clock around the call, so the same script can be run
+on older checkouts to compare before and after a change.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from models.face_analyzer import get_face_analyzer
+
+
+DEFAULT_IMAGE = os.path.join(BACKEND_DIR, '..', 'frontend', 'public', 'futuristic-subject-portrait-for-ai-verification.jpg')
+
+
+def time_calls(fn, frames):
+    times = []
+    for _ in range(frames):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return np.asarray(times)
+
+
+def report(label, times):
+    print(f"  {label:<22} mean {times.mean():7.2f} ms/frame   p50 {np.percentile(times, 50):7.2f}   p95 {np.percentile(times, 95):7.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('image', nargs='?', default=DEFAULT_IMAGE)
+    parser.add_argument('--frames', type=int, default=100)
+    args = parser.parse_args()
+
+    image = Image.open(args.image).convert('RGB')
+    analyzer = get_face_analyzer()
+    landmarks = analyzer.detect_facial_landmarks(np.asarray(image))
+
+    # Warm-up: model init, first-call allocations
+    for _ in range(3):
+        analyzer.analyze_face(image)
+
+    print(f"{os.path.basename(args.image)} {image.size[0]}x{image.size[1]}, {args.frames} frames, "
+          f"face {'found' if landmarks is not None else 'not found'}")
+    report('detect + metrics', time_calls(lambda: analyzer.analyze_face(image), args.frames))
+
+    if landmarks is not None:
+        report('precomputed landmarks', time_calls(lambda: analyzer.analyze_face(image, landmarks), args.frames))
+
+
+if __name__ == '__main__':
+    main()
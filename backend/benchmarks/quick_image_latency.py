@@ -0,0 +1,79 @@
+"""
+Latency of the quick image path (/analyze/image) on a fixed upload.
+
+    python benchmarks/quick_image_latency.py [image] [--requests N] [--concurrency C]
+
+Runs analyze_image_quick on the upload's bytes through a pool sized like
+main.quick_executor, so latencies include queueing once concurrency exceeds
+QUICK_IMAGE_WORKERS.
+"""
+import argparse
+import io
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+import config
+from services.quick_analyzer import analyze_image_quick
+
+
+DEFAULT_IMAGE = os.path.join(BACKEND_DIR, '..', 'frontend', 'public', 'futuristic-subject-portrait-for-ai-verification.jpg')
+
+
+def timed_request(data, submitted):
+    result = analyze_image_quick(io.BytesIO(data))
+    return (time.perf_counter() - submitted) * 1000, result
+
+
+def report(label, times):
+    print(f"  {label:<14} mean {times.mean():7.2f} ms   p50 {np.percentile(times, 50):7.2f}   p95 {np.percentile(times, 95):7.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('image', nargs='?', default=DEFAULT_IMAGE)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=1)
+    args = parser.parse_args()
+
+    with open(args.image, 'rb') as f:
+        data = f.read()
+
+    # Warm-up: model load, first-call allocations
+    for _ in range(3):
+        result = analyze_image_quick(io.BytesIO(data))
+    if 'error' in result:
+        print(f"Quick path unavailable: {result['error']}")
+        return
+
+    with ThreadPoolExecutor(max_workers=config.QUICK_IMAGE_WORKERS) as pool:
+        start = time.perf_counter()
+        futures = []
+        for i in range(args.requests):
+            # Keep at most `concurrency` requests outstanding
+            if i >= args.concurrency:
+                futures[i - args.concurrency].result()
+            futures.append(pool.submit(timed_request, data, time.perf_counter()))
+        results = [future.result() for future in futures]
+        wall_s = time.perf_counter() - start
+
+    latency = np.asarray([ms for ms, _ in results])
+    decode = np.asarray([result['decode_ms'] for _, result in results])
+    inference = np.asarray([result['inference_ms'] for _, result in results])
+
+    print(f"{os.path.basename(args.image)}, {args.requests} requests, concurrency {args.concurrency}, "
+          f"{config.QUICK_IMAGE_WORKERS} workers, {result['model_name']} ({result['backend']})")
+    report('request', latency)
+    report('decode', decode)
+    report('inference', inference)
+    print(f"  throughput     {args.requests / wall_s:.1f} req/s")
+
+
+if __name__ == '__main__':
+    main()
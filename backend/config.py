@@ -15,6 +15,13 @@ def get_float_env(key: str, default: float) -> float:
         return default
 
 
+def get_int_env(key: str, default: int) -> int:
+    try:
+        return int(os.getenv(key, str(default)))
+    except ValueError:
+        return default
+
+
 ENSEMBLE_WEIGHTS = {
     'neural': 0.50,
     'frequency': 0.25,
@@ -35,11 +42,30 @@ MODEL_CONFIG = {
 }
 
 
+# Quick image path: one ensemble model, one resize. benchmarks/quick_image_latency.py measures it.
+QUICK_IMAGE_MODEL = os.getenv('QUICK_IMAGE_MODEL', 'dima806/deepfake_vs_real_image_detection')
+QUICK_IMAGE_BACKEND = os.getenv('QUICK_IMAGE_BACKEND', 'torch').lower()  # 'torch' or 'onnx'
+QUICK_IMAGE_WORKERS = get_int_env('QUICK_IMAGE_WORKERS', 2)
+
+
+# Tiled neural scoring for high-resolution images (opt-in per request or globally)
+TILED_NEURAL_ENABLED = get_bool_env('TILED_NEURAL_ENABLED', False)
+TILED_MAX_TILES = get_int_env('TILED_MAX_TILES', 48)
+# Share of the tiled aggregate in the neural score; the rest is the global prediction
+TILED_SCORE_WEIGHT = get_float_env('TILED_SCORE_WEIGHT', 0.5)
+
+
 MAX_FILE_SIZE_MB = int(os.getenv('MAX_FILE_SIZE_MB', '50'))
+IN_MEMORY_UPLOAD_MB = get_int_env('IN_MEMORY_UPLOAD_MB', 20)
 ALLOWED_IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp', '.webp'}
 ALLOWED_VIDEO_EXTENSIONS = {'.mp4', '.avi', '.mov', '.mkv'}
 
 
+# Upper bound on decoded image size. Larger images are decoded at reduced
+# size (JPEG draft mode) and downscaled so analysis memory stays bounded.
+IMAGE_MAX_PIXELS = get_int_env('IMAGE_MAX_PIXELS', 16_000_000)
+
+
 UPLOAD_DIR = os.getenv('UPLOAD_DIR', 'uploads')
 
 
@@ -48,6 +74,9 @@ FACE_ANALYSIS_ENABLED = get_bool_env('FACE_ANALYSIS_ENABLED', True)
 METADATA_ANALYSIS_ENABLED = get_bool_env('METADATA_ANALYSIS_ENABLED', True)
 NEURAL_ENSEMBLE_ENABLED = get_bool_env('NEURAL_ENSEMBLE_ENABLED', True)
 
+# Worker threads shared by all requests for running image layers concurrently
+IMAGE_LAYER_WORKERS = get_int_env('IMAGE_LAYER_WORKERS', 4)
+
 
 ENABLE_DYNAMIC_WEIGHTING = get_bool_env('ENABLE_DYNAMIC_WEIGHTING', True)
 NEURAL_CONFIDENCE_BOOST = 2.5
@@ -60,6 +89,77 @@ FACE_NOT_DETECTED_REDISTRIBUTE = True
 FACE_DETECTION_CONFIDENCE = 0.5
 MIN_FACE_SIZE = 50
 
+# MediaPipe FaceLandmarker instances shared by every face-dependent analyzer
+LANDMARKER_POOL_SIZE = get_int_env('LANDMARKER_POOL_SIZE', 2)
+
+# Haar face detection runs on frames downscaled to this longest side (0 = full size)
+FACE_DETECT_MAX_SIDE = get_int_env('FACE_DETECT_MAX_SIDE', 640)
+# Frames per blobFromImages batch for the res10 SSD face detector
+FACE_DNN_BATCH_SIZE = get_int_env('FACE_DNN_BATCH_SIZE', 16)
+# Face crops per FaceNet forward pass in the identity persistence check
+IDENTITY_BATCH_SIZE = get_int_env('IDENTITY_BATCH_SIZE', 32)
+
+# Frame sampling decodes sequentially and only seeks across gaps longer than
+# this many frames (roughly one GOP; seeking re-decodes from the last keyframe)
+VIDEO_SEEK_GAP_FRAMES = get_int_env('VIDEO_SEEK_GAP_FRAMES', 250)
+
+# Sampled frames are held in one in-memory arena; arenas larger than this are
+# backed by a temporary np.memmap file instead (in FRAME_ARENA_DIR if set)
+FRAME_ARENA_MEMMAP_MB = get_int_env('FRAME_ARENA_MEMMAP_MB', 512)
+FRAME_ARENA_DIR = os.getenv('FRAME_ARENA_DIR') or None
+# Gray and RGB conversions kept per arena (least recently used are dropped)
+FRAME_ARENA_CACHE_FRAMES = get_int_env('FRAME_ARENA_CACHE_FRAMES', 8)
+
+# The single-pass video ingest computes scene cuts, motion and mouth traces on
+# frames scaled to this width; clip frames for the 3D model keep this short side
+INGEST_WORK_WIDTH = get_int_env('INGEST_WORK_WIDTH', 256)
+INGEST_SCENE_THRESHOLD = get_float_env('INGEST_SCENE_THRESHOLD', 27.0)
+INGEST_MIN_SCENE_FRAMES = get_int_env('INGEST_MIN_SCENE_FRAMES', 15)
+INGEST_CLIP_SHORT_SIDE = get_int_env('INGEST_CLIP_SHORT_SIDE', 224)
+
+# Frame decoding backend: 'opencv' (VideoCapture) or 'ffmpeg' (rawvideo pipe,
+# scaled inside the decoder); ffmpeg falls back to OpenCV when it is missing
+VIDEO_READER_BACKEND = os.getenv('VIDEO_READER_BACKEND', 'opencv').lower()
+# Quick mode decodes at most this large; keyframe-only decoding through ffmpeg
+# is opt-in (per request, here, or chosen by the scheduler for tight budgets)
+QUICK_KEYFRAMES_ONLY = get_bool_env('QUICK_KEYFRAMES_ONLY', False)
+QUICK_DECODE_MAX_SIDE = get_int_env('QUICK_DECODE_MAX_SIDE', 960)
+
+# Streaming mode analyzes long videos in fixed windows with bounded memory
+STREAM_WINDOW_SECONDS = get_float_env('STREAM_WINDOW_SECONDS', 10.0)
+STREAM_FRAMES_PER_WINDOW = get_int_env('STREAM_FRAMES_PER_WINDOW', 16)
+
+# Frame and clip limits for one video request; with a budget_ms the scheduler
+# picks a frame count in [MIN, MAX] and the clip count from its cost model
+VIDEO_MAX_TARGET_FRAMES = get_int_env('VIDEO_MAX_TARGET_FRAMES', 50)
+VIDEO_MIN_TARGET_FRAMES = get_int_env('VIDEO_MIN_TARGET_FRAMES', 8)
+VIDEO_MAX_CLIPS = get_int_env('VIDEO_MAX_CLIPS', 10)
+# Above this share of the budget for a full decode, only keyframes are decoded
+SCHEDULER_DECODE_SHARE = get_float_env('SCHEDULER_DECODE_SHARE', 0.4)
+
+# Optical flow between sampled frames runs on grayscale frames this wide
+MOTION_WORK_WIDTH = get_int_env('MOTION_WORK_WIDTH', 320)
+
+# Sampled frames whose 64-bit pHashes differ in at most this many bits share
+# one run of the per-frame layers
+FRAME_DEDUP_ENABLED = get_bool_env('FRAME_DEDUP_ENABLED', True)
+FRAME_DEDUP_MAX_DISTANCE = get_int_env('FRAME_DEDUP_MAX_DISTANCE', 4)
+
+# Comprehensive mode first scores CASCADE_SCREEN_FRAMES low-res frames with the
+# quick model, then runs the full per-frame layers on CASCADE_STAGE2_SHARE of
+# the sampled frame count, chosen from the screened frames
+CASCADE_ENABLED = get_bool_env('CASCADE_ENABLED', True)
+CASCADE_SCREEN_FRAMES = get_int_env('CASCADE_SCREEN_FRAMES', 200)
+CASCADE_STAGE2_SHARE = get_float_env('CASCADE_STAGE2_SHARE', 0.5)
+CASCADE_BATCH_SIZE = get_int_env('CASCADE_BATCH_SIZE', 32)
+
+# VideoMAE scores this many clips per forward pass; on CPU the forward can
+# run under bfloat16 autocast. VIDEOMAE_PRELOAD loads it at startup instead
+# of on the first 3D-layer request (turn off when the 3D layer is unused).
+VIDEOMAE_BATCH_SIZE = get_int_env('VIDEOMAE_BATCH_SIZE', 4)
+VIDEOMAE_CPU_BF16 = get_bool_env('VIDEOMAE_CPU_BF16', False)
+VIDEOMAE_PRELOAD = get_bool_env('VIDEOMAE_PRELOAD', True)
+
 
 ENABLE_DETAILED_BREAKDOWN = get_bool_env('ENABLE_DETAILED_BREAKDOWN', True)
 ENABLE_CONFIDENCE_SCORES = get_bool_env('ENABLE_CONFIDENCE_SCORES', True)
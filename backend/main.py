@@ -4,6 +4,7 @@ from services.comprehensive_analyzer import analyze_image_comprehensive
 from fastapi import FastAPI, UploadFile, File, HTTPException
 from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.formparsers import MultiPartParser
 import os
 import shutil
 import asyncio
@@ -13,15 +14,18 @@ import threading
 from concurrent.futures import ThreadPoolExecutor
 import time
 
-from utils.image_utils import preprocess_image
-from models.deepfake_detector import predict_image
+from services.quick_analyzer import analyze_image_quick
 from models.progress_tracker import get_progress_tracker, reset_progress_tracker
+from models.face_detectors import detector_metrics
+from models.video.scheduler import get_cost_model
 import config
 
 
 app = FastAPI(title="Deepfake Detection API", version="2.0")
 
 executor = ThreadPoolExecutor(max_workers=2)
+# Separate pool so quick image checks never queue behind long video jobs
+quick_executor = ThreadPoolExecutor(max_workers=config.QUICK_IMAGE_WORKERS)
 
 app.add_middleware(
     CORSMiddleware,
@@ -35,6 +39,10 @@ app.add_middleware(
 UPLOAD_DIR = config.UPLOAD_DIR
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
+# Uploads are spooled to memory up to this size (starlette defaults to 1 MB),
+# so image requests never touch disk
+MultiPartParser.max_file_size = config.IN_MEMORY_UPLOAD_MB * 1024 * 1024
+
 
 def validate_file(file: UploadFile, allowed_extensions: set):
     file_ext = os.path.splitext(file.filename)[1].lower()
@@ -45,6 +53,22 @@ def validate_file(file: UploadFile, allowed_extensions: set):
             detail=f"Invalid file type. Allowed: {', '.join(allowed_extensions)}"
         )
     
+    if file.size is not None and file.size > config.MAX_FILE_SIZE_MB * 1024 * 1024:
+        raise HTTPException(
+            status_code=413,
+            detail=f"File too large. Maximum size: {config.MAX_FILE_SIZE_MB}MB"
+        )
+    
+    return True
+
+
+def validate_segment(start: float, end: float):
+    if start is not None and start < 0:
+        raise HTTPException(status_code=400, detail="start must be >= 0")
+    
+    if end is not None and end <= (start or 0.0):
+        raise HTTPException(status_code=400, detail="end must be greater than start")
+    
     return True
 
 
@@ -58,7 +82,8 @@ async def root():
             "quick_image_analysis": "/analyze/image",
             "comprehensive_image_analysis": "/analyze/image/comprehensive",
             "simple_video_analysis": "/analyze/video",
-            "comprehensive_video_analysis": "/analyze/video/comprehensive"
+            "comprehensive_video_analysis": "/analyze/video/comprehensive",
+            "streaming_video_analysis": "/analyze/video/stream"
         }
     }
 
@@ -72,7 +97,9 @@ async def health_check():
             "frequency_analysis": config.FREQUENCY_ANALYSIS_ENABLED,
             "face_analysis": config.FACE_ANALYSIS_ENABLED,
             "metadata_analysis": config.METADATA_ANALYSIS_ENABLED
-        }
+        },
+        "face_detectors": detector_metrics(),
+        "layer_costs": get_cost_model().snapshot()
     }
 
 
@@ -81,13 +108,17 @@ async def analyze_image(file: UploadFile = File(...)):
     try:
         validate_file(file, config.ALLOWED_IMAGE_EXTENSIONS)
         
-        path = os.path.join(UPLOAD_DIR, file.filename)
+        loop = asyncio.get_event_loop()
+        result = await loop.run_in_executor(
+            quick_executor,
+            analyze_image_quick,
+            file.file
+        )
         
-        with open(path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        if 'error' in result:
+            raise HTTPException(status_code=500, detail=result['error'])
         
-        image = preprocess_image(path)
-        fake_prob = predict_image(image)
+        fake_prob = result['score']
         
         if fake_prob > config.RISK_THRESHOLDS['high']:
             risk = "High"
@@ -102,16 +133,13 @@ async def analyze_image(file: UploadFile = File(...)):
             risk_level=risk
         )
         
-        try:
-            os.remove(path)
-        except:
-            pass
-        
         return {
             "fake_probability": round(fake_prob, 2),
             "risk_level": risk,
             "report": report,
-            "analysis_type": "quick"
+            "analysis_type": "quick",
+            "backend": result.get('backend'),
+            "latency_ms": round(result.get('latency_ms', 0.0), 1)
         }
     
     except HTTPException:
@@ -121,25 +149,21 @@ async def analyze_image(file: UploadFile = File(...)):
 
 
 @app.post("/analyze/image/comprehensive")
-async def analyze_image_comprehensive_endpoint(file: UploadFile = File(...)):
+async def analyze_image_comprehensive_endpoint(file: UploadFile = File(...), tiled: bool = None):
     try:
         validate_file(file, config.ALLOWED_IMAGE_EXTENSIONS)
         
         reset_progress_tracker()
         tracker = get_progress_tracker()
         
-        path = os.path.join(UPLOAD_DIR, file.filename)
-        
-        with open(path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
         tracker.update("File uploaded successfully")
         
         loop = asyncio.get_event_loop()
         results = await loop.run_in_executor(
             executor,
             analyze_image_comprehensive,
-            path
+            file.file,
+            tiled
         )
         
         if results is None or 'error' in results:
@@ -148,11 +172,6 @@ async def analyze_image_comprehensive_endpoint(file: UploadFile = File(...)):
         
         report = generate_comprehensive_report(results)
         
-        try:
-            os.remove(path)
-        except:
-            pass
-        
         response = {
             "final_score": round(results.get('final_score', 0.5), 3),
             "risk_level": results.get('risk_level', 'Unknown'),
@@ -168,6 +187,8 @@ async def analyze_image_comprehensive_endpoint(file: UploadFile = File(...)):
                 "facial_analysis": results.get('facial_analysis'),
                 "metadata_forensics": results.get('metadata_forensics')
             }
+            response["image_info"] = results.get('image_info')
+            response["timings"] = results.get('timings')
         
         tracker.update("Complete!")
         
@@ -271,9 +292,11 @@ async def analyze_video_endpoint(file: UploadFile = File(...)):
 
 
 @app.post("/analyze/video/quick")
-async def analyze_video_quick_endpoint(file: UploadFile = File(...)):
+async def analyze_video_quick_endpoint(file: UploadFile = File(...), budget_ms: float = None,
+                                       start: float = None, end: float = None, keyframes_only: bool = None):
     try:
         validate_file(file, config.ALLOWED_VIDEO_EXTENSIONS)
+        validate_segment(start, end)
         
         reset_progress_tracker()
         tracker = get_progress_tracker()
@@ -291,7 +314,12 @@ async def analyze_video_quick_endpoint(file: UploadFile = File(...)):
         results = await loop.run_in_executor(
             executor,
             analyze_video_quick,
-            video_path
+            video_path,
+            "temp_frames",
+            budget_ms,
+            start,
+            end,
+            keyframes_only
         )
         
         try:
@@ -362,6 +390,15 @@ async def analyze_video_quick_endpoint(file: UploadFile = File(...)):
             else:
                 response["layer_summaries"]["audio"] = {"present": False}
         
+        if results.get('schedule'):
+            response["schedule"] = results['schedule']
+        
+        if results.get('segment'):
+            response["segment"] = results['segment']
+        
+        if results.get('frame_dedup'):
+            response["frame_dedup"] = results['frame_dedup']
+        
         tracker.update("Quick analysis complete!")
         
         return response
@@ -374,10 +411,75 @@ async def analyze_video_quick_endpoint(file: UploadFile = File(...)):
         raise HTTPException(status_code=500, detail=f"Quick video analysis failed: {str(e)}")
 
 
+@app.post("/analyze/video/stream")
+async def analyze_video_stream_endpoint(file: UploadFile = File(...), window_seconds: float = None,
+                                        start: float = None, end: float = None):
+    try:
+        validate_file(file, config.ALLOWED_VIDEO_EXTENSIONS)
+        validate_segment(start, end)
+        
+        reset_progress_tracker()
+        tracker = get_progress_tracker()
+        
+        video_path = os.path.join(UPLOAD_DIR, file.filename)
+        
+        with open(video_path, "wb") as buffer:
+            shutil.copyfileobj(file.file, buffer)
+        
+        tracker.update("File uploaded successfully")
+        
+        from models.video.streaming import analyze_video_streaming
+        
+        # Per-window scores are published on /analyze/progress as they complete
+        loop = asyncio.get_event_loop()
+        results = await loop.run_in_executor(
+            executor,
+            analyze_video_streaming,
+            video_path,
+            window_seconds,
+            None,
+            None,
+            start,
+            end
+        )
+        
+        try:
+            os.remove(video_path)
+        except:
+            pass
+        
+        if results is None:
+            raise HTTPException(status_code=500, detail="Analysis returned no results")
+            
+        if 'error' in results:
+            raise HTTPException(status_code=500, detail=results['error'])
+        
+        return {
+            "final_score": round(results.get('final_score', 0.5), 3),
+            "risk_level": results.get('risk_level', 'Unknown'),
+            "confidence": round(results.get('confidence', 0.0), 3),
+            "analysis_type": "streaming",
+            "method_breakdown": results.get('method_breakdown', {}),
+            "max_window_score": round(results.get('max_window_score', 0.0), 3),
+            "windows": results.get('windows', []),
+            "stream": results.get('stream', {}),
+            "segment": results.get('segment')
+        }
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Streaming video analysis failed: {str(e)}")
+
+
 @app.post("/analyze/video/comprehensive")
-async def analyze_video_comprehensive_endpoint(file: UploadFile = File(...)):
+async def analyze_video_comprehensive_endpoint(file: UploadFile = File(...), budget_ms: float = None,
+                                               start: float = None, end: float = None):
     try:
         validate_file(file, config.ALLOWED_VIDEO_EXTENSIONS)
+        validate_segment(start, end)
         
         reset_progress_tracker()
         tracker = get_progress_tracker()
@@ -395,7 +497,11 @@ async def analyze_video_comprehensive_endpoint(file: UploadFile = File(...)):
         results = await loop.run_in_executor(
             executor,
             analyze_video_comprehensive,
-            video_path
+            video_path,
+            "temp_frames",
+            budget_ms,
+            start,
+            end
         )
         
         try:
@@ -512,6 +618,15 @@ async def analyze_video_comprehensive_endpoint(file: UploadFile = File(...)):
                 "background_compression": round(compression.get('avg_background_compression', 0), 3)
             }
         
+        if results.get('schedule'):
+            response["schedule"] = results['schedule']
+        
+        if results.get('segment'):
+            response["segment"] = results['segment']
+        
+        if results.get('frame_dedup'):
+            response["frame_dedup"] = results['frame_dedup']
+        
         tracker.update("Analysis complete!")
         
         return response
@@ -537,12 +652,20 @@ async def startup_event():
     
     if config.NEURAL_ENSEMBLE_ENABLED:
         from models.ensemble_detector import get_ensemble_detector
-        get_ensemble_detector()
+        detector = get_ensemble_detector()
+        
+        # Warm the quick path (and build the ONNX session if configured)
+        from PIL import Image
+        detector.predict_quick(Image.new('RGB', detector.quick_input_size()))
     
     if config.FACE_ANALYSIS_ENABLED:
         from models.face_analyzer import get_face_analyzer
         get_face_analyzer()
     
+    if config.VIDEOMAE_PRELOAD:
+        from models.video.video_3d_model import get_videomae_model
+        get_videomae_model()
+    
     print("\nVideo Detection Capabilities:")
     print("  - Smart frame extraction")
     print("  - Temporal consistency analysis")
@@ -1,26 +1,7 @@
-import torch
-from transformers import AutoImageProcessor, AutoModelForImageClassification
 from PIL import Image
+from models.ensemble_detector import predict_quick
 
-DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
-
-processor = AutoImageProcessor.from_pretrained(
-    "dima806/deepfake_vs_real_image_detection",
-    use_fast=True
-)
-
-model = AutoModelForImageClassification.from_pretrained(
-    "dima806/deepfake_vs_real_image_detection"
-).to(DEVICE)
-
-model.eval()
 
 def predict_image(image: Image.Image):
-    inputs = processor(images=image, return_tensors="pt").to(DEVICE)
-
-    with torch.no_grad():
-        outputs = model(**inputs)
-        probs = torch.softmax(outputs.logits, dim=1)
-
-    fake_prob = probs[0][1].item()
-    return fake_prob
+    # Served by the shared ensemble's quick mode instead of a second model copy
+    return predict_quick(image).get('score', 0.5)
@@ -1,9 +1,20 @@
+import os
+import threading
+import time
 import torch
 from transformers import AutoImageProcessor, AutoModelForImageClassification
 from PIL import Image
 import numpy as np
+import config
 from models.progress_tracker import get_progress_tracker
 
+try:
+    import onnxruntime as ort
+    ONNXRUNTIME_AVAILABLE = True
+except ImportError:
+    ort = None
+    ONNXRUNTIME_AVAILABLE = False
+
 if not hasattr(torch, 'compiler'):
     class _MockCompiler:
         @staticmethod
@@ -22,6 +33,47 @@ else:
 
 DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
 
+# The HF processors resize to 224 px, so a 512 px pyramid level is plenty;
+# preprocessing holds ~16 bytes/pixel (float32 RGB plus resize buffers).
+ANALYSIS_MAX_SIDE = 512
+WORKING_BYTES_PER_PIXEL = 16
+
+# Tiled mode scores native-resolution 224 px tiles, so it reads a larger level
+TILED_ANALYSIS_MAX_SIDE = 2048
+
+ONNX_CACHE_DIR = os.path.join(os.path.dirname(__file__), '..', 'models_cache', 'onnx')
+
+
+# Class labels (lowercase words) that mean the image is fake
+FAKE_LABEL_WORDS = {'fake', 'deepfake', 'synthetic', 'generated', 'manipulated', 'artificial', 'ai'}
+
+
+def fake_label_index(model):
+    """Index of the fake class in model.config.id2label (the non-real class of a two-class model, else 1)"""
+    id2label = getattr(getattr(model, 'config', None), 'id2label', None) or {}
+    labels = {int(idx): str(label).lower().replace('-', ' ').replace('_', ' ').split() for idx, label in id2label.items()}
+    
+    for idx, words in sorted(labels.items()):
+        if FAKE_LABEL_WORDS.intersection(words):
+            return idx
+    
+    real = [idx for idx, words in labels.items() if 'real' in words]
+    if len(labels) == 2 and len(real) == 1:
+        return next(idx for idx in labels if idx != real[0])
+    
+    return 1
+
+
+class _LogitsOnly(torch.nn.Module):
+    """Export wrapper: HF models return a ModelOutput, ONNX wants a plain tensor"""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, pixel_values):
+        return self.model(pixel_values=pixel_values).logits
+
 
 class EnsembleDetector:
     def __init__(self):
@@ -79,6 +131,11 @@ class EnsembleDetector:
             import traceback
             traceback.print_exc()
         
+        self.fake_indices = [fake_label_index(model) for model in self.models]
+        
+        self._onnx_sessions = {}
+        self._onnx_lock = threading.Lock()
+        
         print(f"Total models loaded: {len(self.models)}/2")
         if len(self.models) == 0:
             print("WARNING: No models loaded! Video analysis will return neutral scores.")
@@ -130,7 +187,8 @@ class EnsembleDetector:
                     tracker.update(f"      Preprocessing image...")
                 
                 if self.model_types[i] == "huggingface":
-                    score, confidence = self._predict_huggingface(image, model, self.processors[i], i+1, len(self.models), silent)
+                    score, confidence = self._predict_huggingface(image, model, self.processors[i], i+1, len(self.models), silent,
+                                                                  fake_index=self.fake_indices[i])
                 else:
                     score, confidence = 0.5, 0.0
                 
@@ -173,7 +231,7 @@ class EnsembleDetector:
             'num_models': len(self.models)
         }
     
-    def _predict_huggingface(self, image, model, processor, model_num, total_models, silent=False):
+    def _predict_huggingface(self, image, model, processor, model_num, total_models, silent=False, fake_index=1):
         if not silent:
             tracker = get_progress_tracker()
             tracker.update(f"      Running neural network inference...")
@@ -183,11 +241,212 @@ class EnsembleDetector:
             outputs = model(**inputs)
             probs = torch.softmax(outputs.logits, dim=1)
         
-        fake_prob = probs[0][1].item()
+        fake_prob = probs[0][fake_index].item()
         confidence = max(probs[0]).item()
         
         return fake_prob, confidence
     
+    def predict_tiled(self, image, tile_size=224, overlap=0.25, max_tiles=None):
+        """
+        Sliding-window scoring for high-resolution images.
+        
+        The image is cut into overlapping tile_size tiles (downscaled first if
+        the grid would exceed max_tiles) and every model scores all tiles in a
+        single batched forward. Returns the per-tile score grid and aggregates.
+        """
+        if len(self.models) == 0:
+            return {'score': 0.5, 'error': 'No models loaded - models failed to initialize'}
+        
+        max_tiles = max(1, max_tiles or config.TILED_MAX_TILES)
+        image = image.convert('RGB')
+        
+        start = time.perf_counter()
+        image = fit_tile_budget(image, tile_size, overlap, max_tiles)
+        tiles, rows, cols = extract_tiles(np.asarray(image), tile_size, overlap)
+        
+        tile_predictions = []
+        tile_confidences = []
+        
+        for i, model in enumerate(self.models):
+            try:
+                pixel_values = self._prepare_batch(tiles, self.processors[i])
+                with torch.inference_mode():
+                    logits = model(pixel_values=pixel_values.to(DEVICE)).logits
+                    probs = torch.softmax(logits.float(), dim=1).cpu().numpy()
+                
+                tile_predictions.append(probs[:, self.fake_indices[i]])
+                tile_confidences.append(probs.max(axis=1))
+            except Exception as e:
+                print(f"Tiled prediction error on model {i}: {e}")
+        
+        if not tile_predictions:
+            return {'score': 0.5, 'error': 'Tiled prediction failed on all models'}
+        
+        # Same confidence-weighted vote as the global path, per tile
+        predictions = np.stack(tile_predictions)
+        confidences = np.stack(tile_confidences)
+        weight_sum = confidences.sum(axis=0)
+        tile_scores = np.where(
+            weight_sum > 0,
+            (predictions * confidences).sum(axis=0) / np.maximum(weight_sum, 1e-10),
+            predictions.mean(axis=0)
+        )
+        
+        grid = tile_scores.reshape(rows, cols)
+        tile_max = float(tile_scores.max())
+        tile_mean = float(tile_scores.mean())
+        
+        return {
+            'score': (tile_max * 0.5) + (tile_mean * 0.5),
+            'tile_max': tile_max,
+            'tile_mean': tile_mean,
+            'grid': [[round(float(v), 3) for v in row] for row in grid],
+            'grid_shape': [rows, cols],
+            'num_tiles': int(len(tiles)),
+            'tile_size': tile_size,
+            'analyzed_resolution': list(image.size),
+            'tiling_ms': (time.perf_counter() - start) * 1000
+        }
+    
+    def _prepare_batch(self, tiles, processor):
+        """(N, H, W, 3) uint8 tiles -> normalized (N, 3, h, w) tensor for one processor"""
+        batch = torch.from_numpy(tiles).permute(0, 3, 1, 2).float()
+        
+        w, h = processor_input_size(processor)
+        if batch.shape[2:] != (h, w):
+            batch = torch.nn.functional.interpolate(batch, size=(h, w), mode='bilinear', align_corners=False)
+        
+        if getattr(processor, 'do_rescale', True):
+            batch = batch * float(getattr(processor, 'rescale_factor', 1 / 255))
+        
+        if getattr(processor, 'do_normalize', True):
+            mean = torch.tensor(getattr(processor, 'image_mean', [0.5, 0.5, 0.5]), dtype=torch.float32).view(1, 3, 1, 1)
+            std = torch.tensor(getattr(processor, 'image_std', [0.5, 0.5, 0.5]), dtype=torch.float32).view(1, 3, 1, 1)
+            batch = (batch - mean) / std
+        
+        return batch.contiguous()
+    
+    def quick_model_index(self):
+        if config.QUICK_IMAGE_MODEL in self.model_names:
+            return self.model_names.index(config.QUICK_IMAGE_MODEL)
+        return 0
+    
+    def quick_input_size(self):
+        """(width, height) the quick model expects; callers resize once to this"""
+        if len(self.models) == 0:
+            return (224, 224)
+        return processor_input_size(self.processors[self.quick_model_index()])
+    
+    def predict_quick(self, image):
+        """
+        Latency-optimized single-model prediction.
+        
+        Reuses the already-loaded ensemble model and skips the HF processor:
+        the image is resized at most once (to quick_input_size()) and
+        normalized with the processor's own constants.
+        """
+        if len(self.models) == 0:
+            return {'score': 0.5, 'confidence': 0.0, 'error': 'No models loaded - models failed to initialize'}
+        
+        index = self.quick_model_index()
+        processor = self.processors[index]
+        
+        start = time.perf_counter()
+        pixel_values = self._prepare_pixel_values(image.convert('RGB'), processor)
+        
+        backend = 'torch'
+        session = self._get_onnx_session(index) if config.QUICK_IMAGE_BACKEND == 'onnx' else None
+        
+        if session is not None:
+            logits = session.run(None, {'pixel_values': pixel_values})[0]
+            probs = torch.softmax(torch.from_numpy(logits), dim=1)
+            backend = 'onnx'
+        else:
+            with torch.inference_mode():
+                inputs = torch.from_numpy(pixel_values).to(DEVICE)
+                probs = torch.softmax(self.models[index](pixel_values=inputs).logits, dim=1)
+        
+        return {
+            'score': float(probs[0][self.fake_indices[index]].item()),
+            'confidence': float(max(probs[0]).item()),
+            'model_name': self.model_names[index],
+            'backend': backend,
+            'inference_ms': (time.perf_counter() - start) * 1000
+        }
+    
+    def predict_quick_batch(self, pixels, batch_size=32):
+        """
+        Fake probabilities of the quick model for (N, H, W, 3) uint8 RGB frames,
+        in forward passes of batch_size; None when no model is loaded.
+        """
+        if len(self.models) == 0:
+            return None
+        
+        index = self.quick_model_index()
+        batch_size = max(1, batch_size)
+        scores = []
+        
+        with torch.inference_mode():
+            for i in range(0, len(pixels), batch_size):
+                pixel_values = self._prepare_batch(pixels[i:i + batch_size], self.processors[index])
+                logits = self.models[index](pixel_values=pixel_values.to(DEVICE)).logits
+                scores.append(torch.softmax(logits.float(), dim=1)[:, self.fake_indices[index]].cpu().numpy())
+        
+        return np.concatenate(scores) if scores else np.zeros(0, dtype=np.float32)
+    
+    def _prepare_pixel_values(self, image, processor):
+        size = processor_input_size(processor)
+        if image.size != size:
+            image = image.resize(size, Image.BILINEAR)
+        
+        pixels = np.asarray(image, dtype=np.float32)
+        
+        if getattr(processor, 'do_rescale', True):
+            pixels = pixels * np.float32(getattr(processor, 'rescale_factor', 1 / 255))
+        
+        if getattr(processor, 'do_normalize', True):
+            mean = np.asarray(getattr(processor, 'image_mean', [0.5, 0.5, 0.5]), dtype=np.float32)
+            std = np.asarray(getattr(processor, 'image_std', [0.5, 0.5, 0.5]), dtype=np.float32)
+            pixels = (pixels - mean) / std
+        
+        return np.ascontiguousarray(pixels.transpose(2, 0, 1)[np.newaxis])
+    
+    def _get_onnx_session(self, index):
+        """Lazily export the model to ONNX and open a CPU session; None if unavailable"""
+        if not ONNXRUNTIME_AVAILABLE:
+            return None
+        
+        with self._onnx_lock:
+            if index in self._onnx_sessions:
+                return self._onnx_sessions[index]
+            
+            session = None
+            try:
+                os.makedirs(ONNX_CACHE_DIR, exist_ok=True)
+                onnx_path = os.path.join(ONNX_CACHE_DIR, self.model_names[index].replace('/', '__') + '.onnx')
+                
+                if not os.path.exists(onnx_path):
+                    print(f"Exporting {self.model_names[index]} to ONNX...")
+                    w, h = processor_input_size(self.processors[index])
+                    dummy = torch.zeros(1, 3, h, w, device=DEVICE)
+                    torch.onnx.export(
+                        _LogitsOnly(self.models[index]),
+                        (dummy,),
+                        onnx_path,
+                        input_names=['pixel_values'],
+                        output_names=['logits'],
+                        dynamic_axes={'pixel_values': {0: 'batch'}, 'logits': {0: 'batch'}},
+                        opset_version=17
+                    )
+                
+                session = ort.InferenceSession(onnx_path, providers=['CPUExecutionProvider'])
+                print(f"ONNX Runtime session ready for {self.model_names[index]}")
+            except Exception as e:
+                print(f"ONNX backend unavailable, using torch: {e}")
+            
+            self._onnx_sessions[index] = session
+            return session
+    
     def _weighted_voting(self, predictions, confidences):
         if len(predictions) == 0:
             return 0.5
@@ -219,15 +478,106 @@ class EnsembleDetector:
             return "disagreement"
 
 
+def processor_input_size(processor):
+    """(width, height) an HF image processor resizes to"""
+    size = getattr(processor, 'size', None) or {}
+    if 'height' in size and 'width' in size:
+        return (int(size['width']), int(size['height']))
+    edge = int(size.get('shortest_edge', 224))
+    return (edge, edge)
+
+
+def tile_positions(length, tile_size, stride):
+    if length <= tile_size:
+        return [0]
+    positions = list(range(0, length - tile_size + 1, stride))
+    if positions[-1] != length - tile_size:
+        positions.append(length - tile_size)
+    return positions
+
+
+def count_tiles(size, tile_size, overlap):
+    stride = max(1, int(tile_size * (1 - overlap)))
+    w, h = size
+    return len(tile_positions(w, tile_size, stride)) * len(tile_positions(h, tile_size, stride))
+
+
+def fit_tile_budget(image, tile_size, overlap, max_tiles):
+    """Downscale until the tile grid fits the compute budget"""
+    w, h = image.size
+    scale = 1.0
+    
+    while count_tiles((int(w * scale), int(h * scale)), tile_size, overlap) > max_tiles:
+        scale *= 0.9
+    
+    if scale < 1.0:
+        new_size = (max(tile_size, int(w * scale)), max(tile_size, int(h * scale)))
+        image = image.resize(new_size, Image.BILINEAR, reducing_gap=2.0)
+    
+    return image
+
+
+def extract_tiles(pixels, tile_size, overlap):
+    """Overlapping tiles as one (N, tile, tile, 3) uint8 array, row-major, plus grid shape"""
+    h, w = pixels.shape[:2]
+    
+    if h < tile_size or w < tile_size:
+        pad_h, pad_w = max(0, tile_size - h), max(0, tile_size - w)
+        pixels = np.pad(pixels, ((0, pad_h), (0, pad_w), (0, 0)), mode='edge')
+        h, w = pixels.shape[:2]
+    
+    stride = max(1, int(tile_size * (1 - overlap)))
+    ys = tile_positions(h, tile_size, stride)
+    xs = tile_positions(w, tile_size, stride)
+    
+    tiles = np.empty((len(ys) * len(xs), tile_size, tile_size, 3), dtype=np.uint8)
+    n = 0
+    for y in ys:
+        for x in xs:
+            tiles[n] = pixels[y:y + tile_size, x:x + tile_size]
+            n += 1
+    
+    return tiles, len(ys), len(xs)
+
+
 _ensemble_detector = None
+_ensemble_lock = threading.Lock()
 
 def get_ensemble_detector():
     global _ensemble_detector
-    if _ensemble_detector is None:
-        _ensemble_detector = EnsembleDetector()
+    with _ensemble_lock:
+        if _ensemble_detector is None:
+            _ensemble_detector = EnsembleDetector()
     return _ensemble_detector
 
 
 def predict_ensemble(image, silent=False):
     detector = get_ensemble_detector()
     return detector.predict_ensemble(image, silent=silent)
+
+
+def predict_ensemble_tiled(image, silent=False):
+    """Global ensemble prediction plus the tiled grid; the score blends the two by TILED_SCORE_WEIGHT"""
+    detector = get_ensemble_detector()
+    result = detector.predict_ensemble(image, silent=silent)
+    
+    tiled = detector.predict_tiled(image)
+    result['tiled'] = tiled
+    
+    if 'error' not in tiled:
+        result['global_score'] = result['score']
+        weight = min(max(config.TILED_SCORE_WEIGHT, 0.0), 1.0)
+        result['score'] = float((1.0 - weight) * result['score'] + weight * tiled['score'])
+        result['tiled_weight'] = weight
+    
+    return result
+
+
+def predict_quick(image):
+    detector = get_ensemble_detector()
+    return detector.predict_quick(image)
+
+
+def predict_quick_batch(pixels, batch_size=32):
+    detector = get_ensemble_detector()
+    return detector.predict_quick_batch(pixels, batch_size)
@@ -0,0 +1,237 @@
+import os
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+import cv2
+import numpy as np
+import config
+
+
+MODEL_DIR = os.path.join(os.path.dirname(__file__), '..', 'models_cache')
+DNN_PROTOTXT = os.path.join(MODEL_DIR, 'deploy.prototxt')
+DNN_CAFFEMODEL = os.path.join(MODEL_DIR, 'res10_300x300_ssd_iter_140000.caffemodel')
+DNN_PROTOTXT_URL = 'https://raw.githubusercontent.com/opencv/opencv/master/samples/dnn/face_detector/deploy.prototxt'
+DNN_CAFFEMODEL_URL = 'https://raw.githubusercontent.com/opencv/opencv_3rdparty/dnn_samples_face_detector_20170830/res10_300x300_ssd_iter_140000.caffemodel'
+DNN_INPUT_SIZE = (300, 300)
+DNN_MEAN = (104.0, 177.0, 123.0)
+
+FRONTAL_FACE = 'haarcascade_frontalface_default.xml'
+EYE = 'haarcascade_eye.xml'
+
+
+# Cascades and nets are parsed once per thread: OpenCV does not guarantee that
+# detectMultiScale / Net.forward are safe to call concurrently on one instance.
+_local = threading.local()
+_dnn_download_lock = threading.Lock()
+_dnn_model_ready = None
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+@contextmanager
+def _timed(name, images=1):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        with _stats_lock:
+            stat = _stats.setdefault(name, {'calls': 0, 'images': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+            stat['calls'] += 1
+            stat['images'] += images
+            stat['total_ms'] += elapsed_ms
+            stat['max_ms'] = max(stat['max_ms'], elapsed_ms)
+
+
+def detector_metrics():
+    """Per-detector call counts and latency since startup"""
+    with _stats_lock:
+        return {
+            name: {
+                'calls': stat['calls'],
+                'images': stat['images'],
+                'avg_ms': round(stat['total_ms'] / stat['calls'], 2) if stat['calls'] else 0.0,
+                'avg_ms_per_image': round(stat['total_ms'] / stat['images'], 2) if stat['images'] else 0.0,
+                'max_ms': round(stat['max_ms'], 2)
+            }
+            for name, stat in _stats.items()
+        }
+
+
+def _resolve_cascade_path(name):
+    if os.path.exists(name):
+        return name
+    return os.path.join(cv2.data.haarcascades, name)
+
+
+def get_cascade(name=FRONTAL_FACE):
+    """This thread's CascadeClassifier for a bundled cascade name or a file path, or None"""
+    cascades = getattr(_local, 'cascades', None)
+    if cascades is None:
+        cascades = _local.cascades = {}
+
+    if name not in cascades:
+        path = _resolve_cascade_path(name)
+        cascade = cv2.CascadeClassifier(path) if os.path.exists(path) else None
+        cascades[name] = cascade if cascade is not None and not cascade.empty() else None
+
+    return cascades[name]
+
+
+def ensure_dnn_model():
+    """Download the res10 SSD face model once per process; True when it is on disk"""
+    global _dnn_model_ready
+
+    with _dnn_download_lock:
+        if _dnn_model_ready is not None:
+            return _dnn_model_ready
+
+        if not os.path.exists(DNN_PROTOTXT) or not os.path.exists(DNN_CAFFEMODEL):
+            os.makedirs(MODEL_DIR, exist_ok=True)
+
+            try:
+                if not os.path.exists(DNN_PROTOTXT):
+                    urllib.request.urlretrieve(DNN_PROTOTXT_URL, DNN_PROTOTXT)
+                if not os.path.exists(DNN_CAFFEMODEL):
+                    print("Downloading DNN face detection model (7MB)...")
+                    urllib.request.urlretrieve(DNN_CAFFEMODEL_URL, DNN_CAFFEMODEL)
+                    print("DNN model downloaded")
+            except Exception as e:
+                print(f"  DNN face model download failed: {e}")
+
+        _dnn_model_ready = os.path.exists(DNN_PROTOTXT) and os.path.exists(DNN_CAFFEMODEL)
+        return _dnn_model_ready
+
+
+def get_face_dnn():
+    """This thread's res10 SSD face net, or None when the model is unavailable"""
+    if not hasattr(_local, 'dnn_net'):
+        _local.dnn_net = None
+
+        if ensure_dnn_model():
+            try:
+                _local.dnn_net = cv2.dnn.readNetFromCaffe(DNN_PROTOTXT, DNN_CAFFEMODEL)
+            except Exception as e:
+                print(f"  DNN face detector failed: {e}")
+
+    return _local.dnn_net
+
+
+def downscale_for_detection(image, max_side=None):
+    """Shrink image so its longest side is <= max_side; returns (image, scale)"""
+    if max_side is None:
+        max_side = config.FACE_DETECT_MAX_SIDE
+
+    h, w = image.shape[:2]
+    if not max_side or max(h, w) <= max_side:
+        return image, 1.0
+
+    scale = max_side / float(max(h, w))
+    small = cv2.resize(image, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+    return small, scale
+
+
+def detect_faces_haar(image, scale_factor=1.1, min_neighbors=4, min_size=(30, 30),
+                      cascade=FRONTAL_FACE, max_side=None, color=cv2.COLOR_BGR2GRAY):
+    """
+    Haar detection on a downscaled copy of image (BGR by default, or gray).
+
+    Returns an (N, 4) int array of (x, y, w, h) boxes in full-resolution coords.
+    """
+    classifier = get_cascade(cascade)
+    if classifier is None:
+        return np.zeros((0, 4), dtype=int)
+
+    with _timed(f"haar:{cascade}"):
+        gray = image if image.ndim == 2 else cv2.cvtColor(image, color)
+        small, scale = downscale_for_detection(gray, max_side)
+
+        scaled_min = (max(1, int(min_size[0] * scale)), max(1, int(min_size[1] * scale)))
+        faces = classifier.detectMultiScale(small, scale_factor, min_neighbors, minSize=scaled_min)
+
+        if len(faces) == 0:
+            return np.zeros((0, 4), dtype=int)
+
+        return np.round(np.asarray(faces, dtype=np.float32) / scale).astype(int)
+
+
+def largest_box(boxes):
+    if len(boxes) == 0:
+        return None
+    x, y, w, h = max(boxes, key=lambda f: f[2] * f[3])
+    return (int(x), int(y), int(w), int(h))
+
+
+def detect_faces_dnn(image, confidence_threshold=0.5, rgb=False):
+    """
+    res10 SSD detection (the net already works on a 300x300 blob).
+
+    Returns a list of ((x, y, w, h), confidence) sorted by confidence, or None
+    when the DNN model is unavailable.
+    """
+    net = get_face_dnn()
+    if net is None:
+        return None
+
+    with _timed('dnn:res10'):
+        h, w = image.shape[:2]
+        blob = cv2.dnn.blobFromImage(cv2.resize(image, DNN_INPUT_SIZE), 1.0, DNN_INPUT_SIZE, DNN_MEAN, swapRB=rgb)
+        net.setInput(blob)
+        detections = net.forward()
+
+    return parse_dnn_detections(detections[0, 0], w, h, confidence_threshold)
+
+
+def detect_faces_dnn_batch(images, confidence_threshold=0.5, rgb=False, batch_size=None):
+    """
+    detect_faces_dnn() over a list of frames, FACE_DNN_BATCH_SIZE blobs per
+    forward pass via blobFromImages.
+
+    Returns one face list per input (empty for None frames), or None when the
+    DNN model is unavailable.
+    """
+    net = get_face_dnn()
+    if net is None:
+        return None
+
+    batch_size = max(1, batch_size or config.FACE_DNN_BATCH_SIZE)
+    results = [[] for _ in images]
+    valid = [i for i, image in enumerate(images) if image is not None]
+
+    for start in range(0, len(valid), batch_size):
+        chunk = valid[start:start + batch_size]
+
+        with _timed('dnn:res10_batch', images=len(chunk)):
+            blob = cv2.dnn.blobFromImages(
+                [cv2.resize(images[i], DNN_INPUT_SIZE) for i in chunk],
+                1.0, DNN_INPUT_SIZE, DNN_MEAN, swapRB=rgb
+            )
+            net.setInput(blob)
+            detections = net.forward()[0, 0]
+
+        # Column 0 is the index of the image within the batch
+        image_ids = detections[:, 0].astype(int)
+
+        for j, i in enumerate(chunk):
+            h, w = images[i].shape[:2]
+            results[i] = parse_dnn_detections(detections[image_ids == j], w, h, confidence_threshold)
+
+    return results
+
+
+def parse_dnn_detections(detections, width, height, confidence_threshold=0.5):
+    confidences = detections[:, 2]
+    keep = confidences > confidence_threshold
+
+    boxes = detections[keep, 3:7] * np.array([width, height, width, height])
+    boxes = np.clip(boxes, 0, [width, height, width, height]).astype(int)
+
+    faces = [
+        ((int(x1), int(y1), int(x2 - x1), int(y2 - y1)), float(confidence))
+        for (x1, y1, x2, y2), confidence in zip(boxes, confidences[keep])
+        if x2 > x1 and y2 > y1
+    ]
+    faces.sort(key=lambda f: f[1], reverse=True)
+    return faces
@@ -5,6 +5,12 @@ from scipy import fftpack
 from utils.forensics_utils import convert_to_frequency_domain, apply_dct
 
 
+# Resolution this layer needs; the per-channel FFT (complex128 + float64
+# magnitude and ring masks) costs ~64 bytes/pixel of working memory.
+ANALYSIS_MAX_SIDE = 2048
+WORKING_BYTES_PER_PIXEL = 64
+
+
 def analyze_frequency_domain(image):
     try:
         if isinstance(image, str):
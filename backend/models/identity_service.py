@@ -0,0 +1,102 @@
+import threading
+import numpy as np
+import torch
+import config
+
+
+# Cosine similarity below this between two face embeddings means a different identity
+IDENTITY_SIMILARITY_THRESHOLD = 0.85
+
+
+def compare_identities(embeddings, threshold=IDENTITY_SIMILARITY_THRESHOLD):
+    """
+    Identity shifts and clusters from the cosine-similarity matrix of
+    L2-normalized embeddings (one row per face, in frame order).
+    """
+    similarity = embeddings @ embeddings.T
+    consecutive = np.diagonal(similarity, offset=1)
+
+    # Each face joins the cluster of the first face it matches
+    labels = np.argmax(similarity >= threshold, axis=1)
+
+    return {
+        'num_shifts': int(np.sum(consecutive < threshold)),
+        'avg_similarity': float(np.mean(consecutive)),
+        'min_similarity': float(np.min(similarity)),
+        'identity_clusters': int(len(np.unique(labels))),
+        'has_faces': True
+    }
+
+
+class IdentityService:
+    """
+    Process-wide FaceNet embedder (InceptionResnetV1, vggface2) and MTCNN
+    detector, loaded once and reused by every video.
+
+    Faces are detected as one MTCNN batch over the frames and embedded in
+    batches of IDENTITY_BATCH_SIZE; a lock serializes forward passes.
+    """
+
+    def __init__(self, batch_size=16):
+        self.batch_size = max(1, batch_size)
+        self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+        self.resnet = None
+        self.mtcnn = None
+        self._lock = threading.Lock()
+
+        try:
+            from facenet_pytorch import InceptionResnetV1, MTCNN
+
+            resnet = InceptionResnetV1(pretrained='vggface2').eval().to(self.device)
+            self.mtcnn = MTCNN(keep_all=False, device=self.device)
+            self.resnet = resnet
+            print(f"FaceNet identity service loaded on {self.device}")
+        except Exception as e:
+            print(f"FaceNet identity service unavailable: {e}")
+
+    @property
+    def available(self):
+        return self.resnet is not None
+
+    def detect_faces(self, pil_images):
+        """One aligned face tensor (or None) per image"""
+        pil_images = list(pil_images)
+        if not pil_images:
+            return []
+
+        with self._lock:
+            try:
+                # Batched MTCNN needs equally sized images, which frames of one video are
+                faces = self.mtcnn(pil_images)
+            except Exception:
+                faces = [self.mtcnn(img) for img in pil_images]
+
+        return list(faces)
+
+    def embed(self, faces):
+        """(N, 512) L2-normalized embeddings of 3x160x160 face tensors"""
+        faces = [face for face in faces if face is not None]
+        if not faces:
+            return np.zeros((0, 512), dtype=np.float32)
+
+        batches = []
+
+        with self._lock, torch.no_grad():
+            for i in range(0, len(faces), self.batch_size):
+                batch = torch.stack(faces[i:i + self.batch_size]).to(self.device)
+                batches.append(self.resnet(batch).cpu().numpy())
+
+        embeddings = np.concatenate(batches).astype(np.float32)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return embeddings / np.maximum(norms, 1e-8)
+
+
+_identity_service = None
+_identity_service_lock = threading.Lock()
+
+def get_identity_service():
+    global _identity_service
+    with _identity_service_lock:
+        if _identity_service is None:
+            _identity_service = IdentityService(batch_size=config.IDENTITY_BATCH_SIZE)
+    return _identity_service
@@ -0,0 +1,440 @@
+import os
+import queue
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+import cv2
+import numpy as np
+import config
+
+
+MEDIAPIPE_AVAILABLE = False
+MEDIAPIPE_VERSION = None
+
+try:
+    import mediapipe as mp
+    MEDIAPIPE_VERSION = mp.__version__
+
+    try:
+        from mediapipe.tasks import python
+        from mediapipe.tasks.python import vision
+        MEDIAPIPE_AVAILABLE = True
+        print(f"MediaPipe {MEDIAPIPE_VERSION} with Tasks API loaded")
+    except Exception as e:
+        print(f"MediaPipe Tasks API import failed: {e}")
+        print(f"  This is often caused by WASM/memory issues in the Python environment")
+        print(f"  Falling back to OpenCV DNN (reduced facial analysis accuracy)")
+        MEDIAPIPE_AVAILABLE = False
+
+except ImportError as e:
+    print(f"MediaPipe not available: {e}")
+    print(f"  Install with: pip install mediapipe")
+
+
+MODEL_DIR = os.path.join(os.path.dirname(__file__), '..', 'models_cache')
+FACE_LANDMARKER_MODEL = os.path.join(MODEL_DIR, 'face_landmarker.task')
+MODEL_URL = 'https://storage.googleapis.com/mediapipe-models/face_landmarker/face_landmarker/float16/1/face_landmarker.task'
+
+
+def download_model():
+    if os.path.exists(FACE_LANDMARKER_MODEL):
+        return True
+
+    try:
+        print(f"Downloading MediaPipe face landmarker model...")
+        os.makedirs(MODEL_DIR, exist_ok=True)
+
+        urllib.request.urlretrieve(MODEL_URL, FACE_LANDMARKER_MODEL)
+
+        if os.path.exists(FACE_LANDMARKER_MODEL):
+            size_mb = os.path.getsize(FACE_LANDMARKER_MODEL) / (1024 * 1024)
+            print(f"Model downloaded successfully ({size_mb:.1f} MB)")
+            return True
+        else:
+            print("Model download failed")
+            return False
+
+    except Exception as e:
+        print(f"Failed to download model: {e}")
+        return False
+
+
+NUM_LANDMARKS = 478
+
+LEFT_EYE = [33, 160, 158, 133, 153, 144]
+RIGHT_EYE = [362, 385, 387, 263, 373, 380]
+# Inner lip top/bottom and mouth corners
+MOUTH = [13, 14, 78, 308]
+
+
+def create_landmarker(video_mode=False):
+    base_options = python.BaseOptions(
+        model_asset_path=FACE_LANDMARKER_MODEL,
+        delegate=python.BaseOptions.Delegate.CPU
+    )
+
+    options = vision.FaceLandmarkerOptions(
+        base_options=base_options,
+        running_mode=vision.RunningMode.VIDEO if video_mode else vision.RunningMode.IMAGE,
+        output_face_blendshapes=False,
+        output_facial_transformation_matrixes=False,
+        num_faces=1,
+        min_face_detection_confidence=0.5,
+        min_face_presence_confidence=0.5,
+        min_tracking_confidence=0.5
+    )
+
+    return vision.FaceLandmarker.create_from_options(options)
+
+
+def landmarks_to_array(face_landmarks):
+    """MediaPipe landmark list -> (N, 3) float32 array of normalized x, y, z"""
+    return np.array([(lm.x, lm.y, lm.z) for lm in face_landmarks], dtype=np.float32)
+
+
+def landmarks_to_pixels(face_landmarks, width, height):
+    """Normalized (N, 3) landmarks -> (N, 2) int64 pixel coords clipped to the image"""
+    points = (face_landmarks[:, :2] * np.array([width, height], dtype=np.float32)).astype(np.int64)
+    return np.clip(points, 0, [width - 1, height - 1])
+
+
+def landmarks_to_pixel_array(face_landmarks, width, height):
+    """Normalized (N, 3) landmarks -> (N, 3) float32 pixel coords (z scaled like x)"""
+    points = face_landmarks * np.array([width, height, width], dtype=np.float32)
+    points[:, 0] = np.clip(points[:, 0], 0, width - 1)
+    points[:, 1] = np.clip(points[:, 1], 0, height - 1)
+    return points
+
+
+class LandmarkTrack:
+    """
+    Landmarks of one face across a sequence of frames.
+
+    landmarks is (F, 478, 3) float32 in normalized coords with NaN rows for
+    frames without a face; present is the matching (F,) bool mask.
+    """
+
+    def __init__(self, landmarks, present, timestamps_ms, track_losses=0):
+        self.landmarks = landmarks
+        self.present = present
+        self.timestamps_ms = timestamps_ms
+        self.track_losses = track_losses
+
+    @classmethod
+    def from_results(cls, results, timestamps_ms):
+        landmarks = np.full((len(results), NUM_LANDMARKS, 3), np.nan, dtype=np.float32)
+        present = np.zeros(len(results), dtype=bool)
+
+        for i, face_landmarks in enumerate(results):
+            if face_landmarks is not None and len(face_landmarks) >= NUM_LANDMARKS:
+                landmarks[i] = face_landmarks[:NUM_LANDMARKS]
+                present[i] = True
+
+        # A loss is a present -> missing transition; the next hit is a re-detection
+        track_losses = int(np.sum(present[:-1] & ~present[1:])) if len(present) > 1 else 0
+
+        return cls(landmarks, present, np.asarray(timestamps_ms, dtype=np.int64), track_losses)
+
+    def __len__(self):
+        return len(self.present)
+
+    @property
+    def face_frames(self):
+        return int(self.present.sum())
+
+    def points(self, indices, present_only=False):
+        points = self.landmarks[:, indices]
+        return points[self.present] if present_only else points
+
+    def eye_aspect_ratio(self):
+        """Per-frame mean EAR of both eyes, NaN where no face was tracked (0.3 for a degenerate eye)"""
+        def ear(eye):
+            p = self.landmarks[:, eye, :2]
+            v1 = np.linalg.norm(p[:, 1] - p[:, 5], axis=1)
+            v2 = np.linalg.norm(p[:, 2] - p[:, 4], axis=1)
+            h = np.linalg.norm(p[:, 0] - p[:, 3], axis=1)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                return np.where(h > 0, (v1 + v2) / (2.0 * h), 0.3)
+
+        values = ((ear(LEFT_EYE) + ear(RIGHT_EYE)) / 2.0).astype(np.float32)
+        values[~self.present] = np.nan
+        return values
+
+    def mouth_openness(self):
+        """Per-frame inner-lip gap over mouth width, NaN where no face was tracked (0.0 for a degenerate mouth)"""
+        p = self.landmarks[:, MOUTH, :2]
+        gap = np.linalg.norm(p[:, 0] - p[:, 1], axis=1)
+        width = np.linalg.norm(p[:, 2] - p[:, 3], axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            values = np.where(width > 0, gap / width, 0.0).astype(np.float32)
+
+        values[~self.present] = np.nan
+        return values
+
+    def summary(self):
+        return {
+            'frames': len(self),
+            'face_frames': self.face_frames,
+            'track_losses': self.track_losses
+        }
+
+
+class LandmarkService:
+    """
+    Process-wide pool of MediaPipe FaceLandmarker instances.
+
+    A landmarker is not safe to call from several threads at once, so callers
+    check one out for the duration of a detect/detect_many/track call. Instances
+    are created once and reused; checkout waits are recorded for metrics.
+
+    In video mode the landmarkers run with RunningMode.VIDEO: MediaPipe tracks
+    the face from the previous frame's landmarks and only falls back to full
+    face detection when the track is lost. MediaPipe has no way to reset that
+    state, so a landmarker whose track ended is replaced by a fresh one on a
+    background thread before anything goes back into the pool; no video
+    starts from another video's face and no request waits for the rebuild
+    unless the whole pool is renewing.
+    """
+
+    def __init__(self, pool_size=2, video_mode=False):
+        self.video_mode = video_mode
+        self._pool = queue.Queue()
+        self._instances = []
+        self._metrics_lock = threading.Lock()
+        self._checkouts = 0
+        self._total_wait_ms = 0.0
+        self._max_wait_ms = 0.0
+        self._contended = 0
+        # VIDEO mode needs strictly increasing timestamps per instance
+        self._clock = {}
+
+        if not MEDIAPIPE_AVAILABLE or not download_model():
+            return
+
+        for _ in range(max(1, pool_size)):
+            try:
+                landmarker = create_landmarker(video_mode=video_mode)
+            except Exception as e:
+                print(f"MediaPipe initialization failed: {e}")
+                print(f"  Common causes:")
+                print(f"  - WASM initialization failure (try upgrading mediapipe)")
+                print(f"  - Model file corrupted (delete face_landmarker.task and retry)")
+                print(f"  - Memory constraints (restart Python environment)")
+                break
+            self._instances.append(landmarker)
+            self._clock[id(landmarker)] = 0
+            self._pool.put(landmarker)
+
+        if self._instances:
+            mode = 'video' if video_mode else 'image'
+            print(f"MediaPipe Face Landmarker pool initialized ({len(self._instances)} {mode} instances)")
+
+    @property
+    def available(self):
+        return len(self._instances) > 0
+
+    @contextmanager
+    def checkout(self, renew=False):
+        """renew: return a fresh landmarker to the pool (built in the background) instead of this one"""
+        start = time.perf_counter()
+        contended = self._pool.empty()
+        landmarker = self._pool.get()
+        wait_ms = (time.perf_counter() - start) * 1000
+
+        with self._metrics_lock:
+            self._checkouts += 1
+            self._total_wait_ms += wait_ms
+            self._max_wait_ms = max(self._max_wait_ms, wait_ms)
+            if contended:
+                self._contended += 1
+
+        try:
+            yield landmarker
+        finally:
+            if renew:
+                threading.Thread(target=self._renew, args=(landmarker,), name='landmarker-renew', daemon=True).start()
+            else:
+                self._pool.put(landmarker)
+
+    def _renew(self, landmarker):
+        """Put a fresh instance in the pool in place of landmarker, or landmarker itself if one cannot be created"""
+        try:
+            fresh = create_landmarker(video_mode=self.video_mode)
+        except Exception as e:
+            print(f"MediaPipe landmarker re-creation failed, reusing instance: {e}")
+            self._pool.put(landmarker)
+            return
+
+        with self._metrics_lock:
+            closed = landmarker not in self._instances
+            if not closed:
+                self._instances[self._instances.index(landmarker)] = fresh
+
+        # The service was closed while this track ran
+        if closed:
+            fresh.close()
+            return
+
+        self._clock[id(fresh)] = 0
+        self._clock.pop(id(landmarker), None)
+
+        try:
+            landmarker.close()
+        except Exception:
+            pass
+
+        self._pool.put(fresh)
+
+    def detect(self, rgb_image):
+        """Landmarks of the first face as (N, 3) float32 normalized coords, or None"""
+        return self.detect_many([rgb_image])[0]
+
+    def detect_many(self, rgb_images):
+        """detect() over an iterable of frames (consumed lazily) with a single checkout"""
+        if self.video_mode:
+            raise ValueError("detect_many needs an image-mode LandmarkService, use track()")
+
+        if not self.available:
+            return [None for _ in rgb_images]
+
+        results = []
+        with self.checkout() as landmarker:
+            for rgb_image in rgb_images:
+                if rgb_image is None:
+                    results.append(None)
+                    continue
+
+                try:
+                    mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=np.ascontiguousarray(rgb_image))
+                    detection_result = landmarker.detect(mp_image)
+                except Exception as e:
+                    print(f"MediaPipe detection failed: {e}")
+                    results.append(None)
+                    continue
+
+                if detection_result.face_landmarks:
+                    results.append(landmarks_to_array(detection_result.face_landmarks[0]))
+                else:
+                    results.append(None)
+
+        return results
+
+    def iter_track(self, rgb_images, timestamps_ms):
+        """
+        Track one face through an iterable of frames, yielding
+        (rgb_image, landmarks or None) per frame as it is processed.
+
+        timestamps_ms must be non-decreasing frame times of the source video.
+        The landmarker is replaced afterwards, so the next track starts clean.
+        """
+        if not self.video_mode:
+            raise ValueError("track needs a video-mode LandmarkService")
+
+        timestamps_ms = [int(t) for t in timestamps_ms]
+
+        if not self.available:
+            for rgb_image, _ in zip(rgb_images, timestamps_ms):
+                yield rgb_image, None
+            return
+
+        with self.checkout(renew=True) as landmarker:
+            # Shift this video onto the instance's clock so timestamps keep increasing
+            offset = self._clock[id(landmarker)] + 1 - (timestamps_ms[0] if timestamps_ms else 0)
+            last = self._clock[id(landmarker)]
+
+            try:
+                for rgb_image, timestamp in zip(rgb_images, timestamps_ms):
+                    if rgb_image is None:
+                        yield None, None
+                        continue
+
+                    last = max(timestamp + offset, last + 1)
+
+                    try:
+                        mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=np.ascontiguousarray(rgb_image))
+                        detection_result = landmarker.detect_for_video(mp_image, last)
+                    except Exception as e:
+                        print(f"MediaPipe tracking failed: {e}")
+                        yield rgb_image, None
+                        continue
+
+                    if detection_result.face_landmarks:
+                        yield rgb_image, landmarks_to_array(detection_result.face_landmarks[0])
+                    else:
+                        yield rgb_image, None
+            finally:
+                self._clock[id(landmarker)] = last
+
+    def track(self, rgb_images, timestamps_ms):
+        """
+        Collect iter_track() into a LandmarkTrack.
+        Returns None when no landmarker is available.
+        """
+        if not self.available:
+            return None
+
+        timestamps_ms = [int(t) for t in timestamps_ms]
+        results = [landmarks for _, landmarks in self.iter_track(rgb_images, timestamps_ms)]
+
+        return LandmarkTrack.from_results(results, timestamps_ms[:len(results)])
+
+    def metrics(self):
+        with self._metrics_lock:
+            return {
+                'pool_size': len(self._instances),
+                'idle': self._pool.qsize(),
+                'checkouts': self._checkouts,
+                'contended_checkouts': self._contended,
+                'avg_wait_ms': self._total_wait_ms / self._checkouts if self._checkouts else 0.0,
+                'max_wait_ms': self._max_wait_ms
+            }
+
+    def close(self):
+        for landmarker in self._instances:
+            try:
+                landmarker.close()
+            except Exception:
+                pass
+        self._instances = []
+        self._clock = {}
+
+
+_landmark_service = None
+_landmark_service_lock = threading.Lock()
+
+def get_landmark_service():
+    global _landmark_service
+    with _landmark_service_lock:
+        if _landmark_service is None:
+            _landmark_service = LandmarkService(pool_size=config.LANDMARKER_POOL_SIZE)
+    return _landmark_service
+
+
+_landmark_tracker = None
+_landmark_tracker_lock = threading.Lock()
+
+def get_landmark_tracker():
+    global _landmark_tracker
+    with _landmark_tracker_lock:
+        if _landmark_tracker is None:
+            _landmark_tracker = LandmarkService(pool_size=config.LANDMARKER_POOL_SIZE, video_mode=True)
+    return _landmark_tracker
+
+
+def track_frame_landmarks(frame_paths, timestamps):
+    """
+    Build the per-video LandmarkTrack from sampled frame files.
+
+    timestamps are the frame times in seconds from the frame sampler.
+    Returns None when MediaPipe is unavailable.
+    """
+    tracker = get_landmark_tracker()
+
+    if not tracker.available or len(frame_paths) == 0:
+        return None
+
+    from models.video.frame_store import read_rgb
+
+    rgb_frames = (read_rgb(frame_path) for frame_path in frame_paths)
+    return tracker.track(rgb_frames, [t * 1000.0 for t in timestamps])
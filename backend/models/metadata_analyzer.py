@@ -2,15 +2,53 @@ import os
 from PIL import Image
 import piexif
 import numpy as np
-from utils.forensics_utils import apply_ela
+import config
+from utils.forensics_utils import ela_difference
+from utils.image_utils import load_image, open_image_source
 
 
-def analyze_metadata(image_path):
+# ELA and block statistics need the file's own JPEG block grid, so they run at
+# native resolution (None: no pyramid level) on images within IMAGE_MAX_PIXELS;
+# working set is ~7 bytes/pixel (pixel array + uint8 ELA map + one float32
+# region); a native decode is resident memory on top, like a pyramid level.
+ANALYSIS_MAX_SIDE = None
+WORKING_BYTES_PER_PIXEL = 7
+
+
+def analysis_size(native_size, decoded_size):
+    """Resolution the ELA and block statistics run at for an image decoded at decoded_size"""
+    w, h = native_size
+    return tuple(native_size) if w * h <= config.IMAGE_MAX_PIXELS else tuple(decoded_size)
+
+
+def load_analysis_image(source, image=None):
+    """
+    Native-resolution RGB image for ELA: image itself when it was decoded at
+    native size, otherwise a fresh full decode of source. Images over the
+    pixel budget use image or a budget decode instead (resampled, so ELA
+    no longer sees the file's block grid).
+    """
+    native = open_image_source(source)
+    w, h = native.size
+    
+    if w * h > config.IMAGE_MAX_PIXELS:
+        return image if image is not None else load_image(source, max_pixels=config.IMAGE_MAX_PIXELS)[0]
+    
+    if image is not None and image.size == native.size:
+        return image
+    
+    return native.convert('RGB')
+
+
+def analyze_metadata(source, image=None):
+    """image: the request's decoded image, reused when it is at native resolution"""
     try:
-        exif_score, exif_data = analyze_exif_data(image_path)
-        ela_score = perform_ela_analysis(image_path)
+        pixels = load_analysis_image(source, image)
+        
+        exif_score, exif_data = analyze_exif_data(source)
+        ela_score = perform_ela_analysis(pixels)
         software = detect_editing_software(exif_data)
-        compression_score = check_compression_consistency(image_path)
+        compression_score = check_compression_consistency(pixels)
         
         final_score = (
             exif_score * 0.35 +
@@ -27,6 +65,7 @@ def analyze_metadata(image_path):
             'editing_software_detected': str(software),
             'exif_suspicious': bool(exif_score > 0.6),
             'ela_anomalies': bool(ela_score > 0.6),
+            'analysis_resolution': list(pixels.size),
             'metadata_details': exif_data
         }
     
@@ -39,9 +78,23 @@ def analyze_metadata(image_path):
         }
 
 
-def analyze_exif_data(image_path):
+def load_exif_dict(source):
+    if isinstance(source, str):
+        return piexif.load(source)
+    
+    # In-memory sources: PIL only parses the header to expose the EXIF block
+    with open_image_source(source) as img:
+        exif_bytes = img.info.get('exif')
+    
+    if not exif_bytes:
+        return {}
+    
+    return piexif.load(exif_bytes)
+
+
+def analyze_exif_data(source):
     try:
-        exif_dict = piexif.load(image_path)
+        exif_dict = load_exif_dict(source)
         
         exif_data = {}
         suspicious_score = 0.0
@@ -114,23 +167,18 @@ def analyze_exif_data(image_path):
         return 0.60, {}
 
 
-def perform_ela_analysis(image_path):
+def perform_ela_analysis(image):
     try:
-        ela_image = apply_ela(image_path, quality=95)
+        # Statistics of the min-max normalized ELA map, computed on the uint8
+        # difference one region at a time so no full-size float map exists
+        ela_image = ela_difference(image, quality=95)
         
-        ela_variance = np.var(ela_image)
-        ela_mean = np.mean(ela_image)
-        ela_std = np.std(ela_image)
-        
-        threshold = ela_mean + (2 * ela_std)
-        high_error_pixels = np.sum(ela_image > threshold)
-        total_pixels = ela_image.size
-        
-        high_error_ratio = high_error_pixels / total_pixels
+        ela_min = float(ela_image.min())
+        ela_range = float(ela_image.max()) - ela_min + 1e-10
         
-        h, w = ela_image.shape[:2] if len(ela_image.shape) == 2 else ela_image.shape[:2]
+        h, w = ela_image.shape[:2]
         
-        region_variances = []
+        regions = []
         for i in range(4):
             for j in range(4):
                 y_start = i * h // 4
@@ -138,8 +186,21 @@ def perform_ela_analysis(image_path):
                 x_start = j * w // 4
                 x_end = (j + 1) * w // 4
                 
-                region = ela_image[y_start:y_end, x_start:x_end]
-                region_variances.append(np.var(region))
+                regions.append(ela_image[y_start:y_end, x_start:x_end])
+        
+        sizes = np.array([region.size for region in regions], dtype=np.float64)
+        means = np.array([(region.astype(np.float32) - ela_min).mean(dtype=np.float64) / ela_range for region in regions])
+        region_variances = np.array([region.astype(np.float32).var(dtype=np.float64) / ela_range ** 2 for region in regions])
+        
+        total_pixels = sizes.sum()
+        ela_mean = np.sum(sizes * means) / total_pixels
+        ela_variance = np.sum(sizes * (region_variances + means ** 2)) / total_pixels - ela_mean ** 2
+        ela_std = np.sqrt(max(ela_variance, 0.0))
+        
+        threshold = ela_min + (ela_mean + (2 * ela_std)) * ela_range
+        high_error_pixels = sum(int(np.count_nonzero(region > threshold)) for region in regions)
+        
+        high_error_ratio = high_error_pixels / total_pixels
         
         regional_inconsistency = np.std(region_variances) / (np.mean(region_variances) + 1e-10)
         
@@ -177,10 +238,13 @@ def detect_editing_software(exif_data):
     return 'Unknown'
 
 
-def check_compression_consistency(image_path):
+def check_compression_consistency(image):
     try:
-        image = Image.open(image_path).convert('RGB')
-        img_array = np.array(image)
+        if isinstance(image, Image.Image):
+            image = image.convert('RGB')
+        else:
+            image = open_image_source(image).convert('RGB')
+        img_array = np.asarray(image)
         
         h, w = img_array.shape[:2]
         block_size = 64
@@ -4,16 +4,27 @@ import librosa
 import subprocess
 import os
 import tempfile
+from models.face_detectors import FRONTAL_FACE, detect_faces_haar, get_cascade, largest_box
 
 FFMPEG_PATH = os.getenv("FFMPEG_PATH", "ffmpeg")
 FFPROBE_PATH = FFMPEG_PATH.replace("ffmpeg", "ffprobe") if "ffmpeg" in FFMPEG_PATH else "ffprobe"
 
 MODELS_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'models_cache')
 
+# Face data read from the per-video FaceTrackStore (mouth openness for lip sync)
+FACE_ATTRIBUTES = ('landmarks',)
 
-def analyze_audio_stream(video_path):
+
+def analyze_audio_stream(video_path, landmark_track=None, has_audio=None, mouth_trace=None, start=None, end=None):
+    """
+    has_audio skips the stream probe when the caller already knows it;
+    mouth_trace is the ingest pass's mouth-region motion, used for lip sync
+    instead of decoding the video again when there is no landmark track.
+    start / end (seconds) restrict the analysis to that segment.
+    """
     try:
-        has_audio = check_audio_presence(video_path)
+        if has_audio is None:
+            has_audio = check_audio_presence(video_path)
         
         if not has_audio:
             return {
@@ -22,16 +33,7 @@ def analyze_audio_stream(video_path):
                 'message': 'No audio stream detected'
             }
         
-        results = {
-            'has_audio': True,
-            'score': 0.0,
-            'voice_deepfake_score': 0.0,
-            'lip_sync_score': 0.0,
-            'audio_consistency': 0.0,
-            'anomalies': []
-        }
-        
-        audio_path = extract_audio(video_path)
+        audio_path = extract_audio(video_path, start, end)
         
         if not audio_path:
             return {
@@ -44,29 +46,9 @@ def analyze_audio_stream(video_path):
                 'anomalies': ['Audio extraction failed - FFmpeg required']
             }
         
-        voice_result = detect_voice_deepfake(audio_path)
-        results['voice_deepfake_score'] = voice_result.get('score', 0.5)
-        
-        if voice_result.get('suspicious', False):
-            results['anomalies'].append('Suspicious voice patterns detected')
-        
-        lip_sync_result = analyze_lip_sync(video_path, audio_path)
-        results['lip_sync_score'] = lip_sync_result.get('score', 0.0)
-        
-        if lip_sync_result.get('out_of_sync', False):
-            results['anomalies'].append('Audio-video desynchronization detected')
-        
-        consistency_result = check_audio_consistency(audio_path)
-        results['audio_consistency'] = consistency_result.get('score', 0.0)
-        
-        if consistency_result.get('inconsistent', False):
-            results['anomalies'].append('Audio quality inconsistencies')
-        
-        results['score'] = (
-            results['voice_deepfake_score'] * 0.5 +
-            results['lip_sync_score'] * 0.3 +
-            results['audio_consistency'] * 0.2
-        )
+        # The OpenCV mouth fallback reads the whole file and would not line up with a segment
+        segmented = start is not None or end is not None
+        results = score_audio(audio_path, None if segmented else video_path, landmark_track, mouth_trace)
         
         if os.path.exists(audio_path):
             os.remove(audio_path)
@@ -82,6 +64,48 @@ def analyze_audio_stream(video_path):
         }
 
 
+def score_audio(audio_path, video_path=None, landmark_track=None, mouth_trace=None, offset=0.0, duration=None):
+    """
+    Voice, lip-sync and consistency scores for an extracted audio file, or
+    for the [offset, offset + duration) seconds of it. Without video_path lip
+    sync relies on landmark_track / mouth_trace only and never decodes video.
+    """
+    results = {
+        'has_audio': True,
+        'score': 0.0,
+        'voice_deepfake_score': 0.0,
+        'lip_sync_score': 0.0,
+        'audio_consistency': 0.0,
+        'anomalies': []
+    }
+    
+    voice_result = detect_voice_deepfake(audio_path, offset, duration)
+    results['voice_deepfake_score'] = voice_result.get('score', 0.5)
+    
+    if voice_result.get('suspicious', False):
+        results['anomalies'].append('Suspicious voice patterns detected')
+    
+    lip_sync_result = analyze_lip_sync(video_path, audio_path, landmark_track, mouth_trace, offset, duration)
+    results['lip_sync_score'] = lip_sync_result.get('score', 0.0)
+    
+    if lip_sync_result.get('out_of_sync', False):
+        results['anomalies'].append('Audio-video desynchronization detected')
+    
+    consistency_result = check_audio_consistency(audio_path, offset, duration)
+    results['audio_consistency'] = consistency_result.get('score', 0.0)
+    
+    if consistency_result.get('inconsistent', False):
+        results['anomalies'].append('Audio quality inconsistencies')
+    
+    results['score'] = (
+        results['voice_deepfake_score'] * 0.5 +
+        results['lip_sync_score'] * 0.3 +
+        results['audio_consistency'] * 0.2
+    )
+    
+    return results
+
+
 def check_audio_presence(video_path):
     try:
         cap = cv2.VideoCapture(video_path)
@@ -126,15 +150,19 @@ def check_audio_with_ffprobe(video_path):
         return False
 
 
-def extract_audio(video_path):
+def extract_audio(video_path, start=None, end=None):
     try:
         temp_audio = tempfile.NamedTemporaryFile(suffix='.wav', delete=False)
         audio_path = temp_audio.name
         temp_audio.close()
         
-        cmd = [
-            FFMPEG_PATH,
-            '-i', video_path,
+        cmd = [FFMPEG_PATH]
+        if start:
+            cmd += ['-ss', f'{start:.3f}']
+        cmd += ['-i', video_path]
+        if end is not None:
+            cmd += ['-t', f'{end - (start or 0.0):.3f}']
+        cmd += [
             '-vn',
             '-acodec', 'pcm_s16le',
             '-ar', '16000',
@@ -170,9 +198,9 @@ def extract_audio(video_path):
         return None
 
 
-def detect_voice_deepfake(audio_path):
+def detect_voice_deepfake(audio_path, offset=0.0, duration=None):
     try:
-        y, sr = librosa.load(audio_path, sr=16000)
+        y, sr = librosa.load(audio_path, sr=16000, offset=offset, duration=duration)
         
         if len(y) < sr:
             return {'score': 0.5, 'reason': 'Audio too short'}
@@ -222,14 +250,14 @@ def detect_voice_deepfake(audio_path):
         return {'score': 0.5, 'error': str(e)}
 
 
-def analyze_lip_sync(video_path, audio_path):
+def analyze_lip_sync(video_path, audio_path, landmark_track=None, mouth_trace=None, offset=0.0, duration=None):
     try:
-        y, sr = librosa.load(audio_path, sr=16000)
+        y, sr = librosa.load(audio_path, sr=16000, offset=offset, duration=duration)
         
         audio_envelope = np.abs(librosa.stft(y))
         audio_envelope = np.mean(audio_envelope, axis=0)
         
-        mouth_movements = extract_mouth_movements(video_path)
+        mouth_movements = extract_mouth_movements(video_path, landmark_track, mouth_trace)
         
         if mouth_movements is None or len(mouth_movements) == 0:
             return {'score': 0.0, 'reason': 'Could not track mouth'}
@@ -270,8 +298,17 @@ def analyze_lip_sync(video_path, audio_path):
         return {'score': 0.0, 'error': str(e)}
 
 
-def extract_mouth_movements(video_path):
+def extract_mouth_movements(video_path, landmark_track=None, mouth_trace=None):
     try:
+        if landmark_track is not None and landmark_track.face_frames >= 10:
+            return mouth_movements_from_track(landmark_track)
+        
+        if mouth_trace is not None and len(mouth_trace) > 0:
+            return np.asarray(mouth_trace)
+        
+        if video_path is None:
+            return []
+        
         return extract_mouth_movements_opencv(video_path)
         
     except Exception as e:
@@ -279,25 +316,27 @@ def extract_mouth_movements(video_path):
         return []
 
 
+def mouth_movements_from_track(landmark_track):
+    """Mouth openness from the shared landmark track, resampled to an even time grid"""
+    present = landmark_track.present
+    times = landmark_track.timestamps_ms[present].astype(np.float64)
+    openness = landmark_track.mouth_openness()[present]
+    
+    grid = np.linspace(times[0], times[-1], len(landmark_track))
+    return np.interp(grid, times, openness)
+
+
 def extract_mouth_movements_opencv(video_path):
     try:
-        face_cascade_path = cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
-        if not os.path.exists(face_cascade_path):
+        if get_cascade(FRONTAL_FACE) is None:
             print("Face cascade file not found")
             return extract_mouth_movements_simple(video_path)
         
-        face_cascade = cv2.CascadeClassifier(face_cascade_path)
-        
-        mouth_cascade_path = os.path.join(MODELS_CACHE_DIR, 'haarcascade_mcs_mouth.xml')
-        if not os.path.exists(mouth_cascade_path):
-            mouth_cascade_path = cv2.data.haarcascades + 'haarcascade_mcs_mouth.xml'
-        
-        use_mouth_cascade = os.path.exists(mouth_cascade_path)
+        mouth_cascade = os.path.join(MODELS_CACHE_DIR, 'haarcascade_mcs_mouth.xml')
+        if not os.path.exists(mouth_cascade):
+            mouth_cascade = 'haarcascade_mcs_mouth.xml'
         
-        if use_mouth_cascade:
-            mouth_cascade = cv2.CascadeClassifier(mouth_cascade_path)
-            if mouth_cascade.empty():
-                use_mouth_cascade = False
+        use_mouth_cascade = get_cascade(mouth_cascade) is not None
         
         cap = cv2.VideoCapture(video_path)
         mouth_openness = []
@@ -309,15 +348,15 @@ def extract_mouth_movements_opencv(video_path):
             
             gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
             
-            faces = face_cascade.detectMultiScale(gray, 1.1, 4, minSize=(100, 100))
+            box = largest_box(detect_faces_haar(gray, 1.1, 4, (100, 100)))
             
-            if len(faces) > 0:
-                x, y, w, h = max(faces, key=lambda f: f[2] * f[3])
+            if box is not None:
+                x, y, w, h = box
                 
                 if use_mouth_cascade:
                     face_roi = gray[y+h//2:y+h, x:x+w]
                     
-                    mouths = mouth_cascade.detectMultiScale(face_roi, 1.3, 5, minSize=(30, 20))
+                    mouths = detect_faces_haar(face_roi, 1.3, 5, (30, 20), cascade=mouth_cascade, max_side=0)
                     
                     if len(mouths) > 0:
                         mx, my, mw, mh = max(mouths, key=lambda m: m[2] * m[3])
@@ -378,9 +417,9 @@ def extract_mouth_movements_simple(video_path):
         return np.array([])
 
 
-def check_audio_consistency(audio_path):
+def check_audio_consistency(audio_path, offset=0.0, duration=None):
     try:
-        y, sr = librosa.load(audio_path, sr=16000)
+        y, sr = librosa.load(audio_path, sr=16000, offset=offset, duration=duration)
         
         segment_duration = 2.0
         segment_samples = int(segment_duration * sr)
@@ -1,8 +1,11 @@
 import cv2
 import numpy as np
+from models.video.frame_store import read_bgr
+from models.video.motion_engine import MotionEngine
 
 
-def analyze_boundaries(frame_paths, scene_boundaries, timestamps):
+def analyze_boundaries(frame_paths, scene_boundaries, timestamps, motion=None):
+    """motion: MotionEngine shared with the other layers (built here if None)"""
     try:
         results = {
             'score': 0.0,
@@ -15,6 +18,9 @@ def analyze_boundaries(frame_paths, scene_boundaries, timestamps):
         if len(frame_paths) < 2:
             return results
         
+        if motion is None:
+            motion = MotionEngine(frame_paths)
+        
         boundary_indices = set(scene_boundaries) if scene_boundaries else set()
         
         boundary_indices.update(range(min(5, len(frame_paths))))
@@ -26,8 +32,8 @@ def analyze_boundaries(frame_paths, scene_boundaries, timestamps):
             if idx >= len(frame_paths) - 1:
                 continue
             
-            current_frame = cv2.imread(frame_paths[idx])
-            next_frame = cv2.imread(frame_paths[idx + 1])
+            current_frame = read_bgr(frame_paths[idx])
+            next_frame = read_bgr(frame_paths[idx + 1])
             
             if current_frame is None or next_frame is None:
                 continue
@@ -54,7 +60,10 @@ def analyze_boundaries(frame_paths, scene_boundaries, timestamps):
                     'severity': float(color_shift)
                 })
             
-            structural_change = check_structural_change(current_frame, next_frame)
+            structural_change = motion.structural_change(idx)
+            if structural_change is None:
+                structural_change = check_structural_change(current_frame, next_frame)
+            
             if structural_change > 0.4:
                 results['boundary_anomalies'] += 1
                 results['suspicious_transitions'].append({
@@ -133,6 +142,7 @@ def check_structural_change(frame1, frame2):
 
 
 def get_boundary_weighted_scores(frame_scores, boundary_indices, weight_multiplier=2.0):
+    """frame_scores: (video frame index, score) pairs; boundary_indices are video frame indices"""
     if not frame_scores:
         return 0.5
     
@@ -141,7 +151,7 @@ def get_boundary_weighted_scores(frame_scores, boundary_indices, weight_multipli
     
     boundary_set = set(boundary_indices) if boundary_indices else set()
     
-    for idx, score in enumerate(frame_scores):
+    for idx, score in frame_scores:
         if idx in boundary_set:
             weights.append(weight_multiplier)
         else:
@@ -151,7 +161,7 @@ def get_boundary_weighted_scores(frame_scores, boundary_indices, weight_multipli
     
     total_weight = sum(weights)
     if total_weight == 0:
-        return np.mean(frame_scores)
+        return np.mean(weighted_scores)
     
     weighted_avg = sum(s * w for s, w in zip(weighted_scores, weights)) / total_weight
     
@@ -0,0 +1,104 @@
+import heapq
+import cv2
+import numpy as np
+
+from models.face_detectors import detect_faces_haar
+
+
+# Clip frames are compared at this width for the motion statistic
+STAT_WIDTH = 96
+# Mean absolute difference (gray levels) between clip frames counted as full motion
+MOTION_NORM = 8.0
+# Below these the clip is treated as static or as a black/fade frame run
+STATIC_MOTION = 0.5
+DARK_BRIGHTNESS = 16.0
+# Frames of each clip checked for a face: first, middle, last
+FACE_PROBES = 3
+
+FACE_WEIGHT = 0.6
+MOTION_WEIGHT = 0.4
+
+
+def clip_statistics(clip):
+    """Low-res motion, brightness and face presence of one (T, H, W, 3) RGB clip"""
+    h, w = clip.shape[1:3]
+    size = (STAT_WIDTH, max(1, int(h * STAT_WIDTH / float(w))))
+    gray = np.stack([cv2.cvtColor(cv2.resize(frame, size, interpolation=cv2.INTER_AREA), cv2.COLOR_RGB2GRAY)
+                     for frame in clip]).astype(np.float32)
+
+    motion = float(np.mean(np.abs(np.diff(gray, axis=0)))) if len(gray) > 1 else 0.0
+
+    probes = np.linspace(0, len(clip) - 1, FACE_PROBES).round().astype(int)
+    faces = sum(1 for i in probes if len(detect_faces_haar(clip[i], color=cv2.COLOR_RGB2GRAY, max_side=0)) > 0)
+
+    return {
+        'motion': motion,
+        'brightness': float(gray.mean()),
+        'face_ratio': faces / float(len(probes))
+    }
+
+
+def clip_informativeness(stats):
+    """(score, reason) for a clip from its clip_statistics"""
+    if stats['brightness'] < DARK_BRIGHTNESS:
+        return 0.0, 'dark'
+
+    if stats['motion'] < STATIC_MOTION and stats['face_ratio'] == 0:
+        return 0.0, 'static'
+
+    score = FACE_WEIGHT * stats['face_ratio'] + MOTION_WEIGHT * min(stats['motion'] / MOTION_NORM, 1.0)
+    reason = 'face' if stats['face_ratio'] > 0 else 'motion'
+
+    return float(score), reason
+
+
+class ClipSelector:
+    """
+    Keeps the k most informative clips out of candidates offered one at a
+    time, so only k + 1 clips are ever held while a video streams past.
+
+    Candidates are ranked by clip_informativeness; ties go to the earlier
+    clip. Dark and static clips are never selected.
+    """
+
+    def __init__(self, k):
+        self.k = max(0, k)
+        self.candidates = 0
+        self.rejected = {'dark': 0, 'static': 0}
+        self._heap = []
+
+    def offer(self, start_frame, clip):
+        self.candidates += 1
+        stats = clip_statistics(clip)
+        score, reason = clip_informativeness(stats)
+
+        if reason in self.rejected:
+            self.rejected[reason] += 1
+            return
+
+        entry = (score, -start_frame, clip, dict(stats, start_frame=start_frame, score=score, reason=reason))
+
+        if len(self._heap) < self.k:
+            heapq.heappush(self._heap, entry)
+        elif self._heap and entry[:2] > self._heap[0][:2]:
+            heapq.heapreplace(self._heap, entry)
+
+    def _chosen(self):
+        return sorted(self._heap, key=lambda entry: -entry[1])
+
+    def clips(self):
+        """Selected clips in video order"""
+        return [clip for _, _, clip, _ in self._chosen()]
+
+    def summary(self):
+        selected = [
+            {key: (round(value, 3) if isinstance(value, float) else value) for key, value in info.items()}
+            for _, _, _, info in self._chosen()
+        ]
+
+        return {
+            'candidates': self.candidates,
+            'budget': self.k,
+            'selected': selected,
+            'rejected': dict(self.rejected)
+        }
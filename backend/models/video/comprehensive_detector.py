@@ -1,7 +1,8 @@
 
 import os
-from PIL import Image
+import time
 import numpy as np
+import config
 from models.progress_tracker import get_progress_tracker
 
 
@@ -24,8 +25,14 @@ def convert_numpy_types(obj):
 
 from models.video.metadata_analyzer import analyze_video_metadata
 from models.video.frame_extractor import smart_frame_extraction
+from models.video.frame_cascade import FrameCascade
+from models.video.frame_dedup import FrameDedup
+from models.video.frame_store import open_pil
+from models.video.ingest import ingest_video
+from models.video.frame_reader import probe_video, segment_frames
+from models.video.scheduler import plan_video
 
-from models.ensemble_detector import predict_ensemble
+from models.ensemble_detector import get_ensemble_detector, predict_ensemble
 from models.face_analyzer import analyze_face
 from models.frequency_analyzer import analyze_frequency_domain
 from models.video.temporal_analyzer import analyze_temporal_consistency
@@ -40,10 +47,26 @@ from models.video.physics_checker import analyze_physics_consistency
 from models.video.boundary_analyzer import analyze_boundaries, get_boundary_weighted_scores
 from models.video.compression_analyzer import analyze_region_compression
 
+from models.video import temporal_analyzer, audio_analyzer, physiological_analyzer, compression_analyzer
+from models.video.face_track_store import FaceTrackStore
+from models.video.motion_engine import MotionEngine
 
-def analyze_video_comprehensive(video_path, output_dir="temp_frames"):
+# The per-frame face analysis reuses tracked landmarks from the face store
+FRAME_FACE_ATTRIBUTES = ('landmarks',)
+
+
+def skip_layer(schedule, layer):
+    reason = schedule.skipped.get(layer, 'disabled')
+    print(f"  Skipped: {reason}")
+    get_progress_tracker().update(f"Skipping {layer} ({reason})")
+
+
+def analyze_video_comprehensive(video_path, output_dir="temp_frames", budget_ms=None, start=None, end=None):
     
     tracker = get_progress_tracker()
+    frame_data = None
+    ingest = None
+    cascade = None
     
     try:
         print(f"\n{'='*60}")
@@ -69,10 +92,38 @@ def analyze_video_comprehensive(video_path, output_dir="temp_frames"):
         }
         
         
+        # Frame count, clip count and optional layers fitted to budget_ms
+        probe = probe_video(video_path)
+        frame_range = segment_frames(probe, start, end) if probe else None
+        if frame_range is not None and frame_range[1] <= frame_range[0]:
+            tracker.update("Segment is outside the video")
+            return {'error': 'Segment is outside the video', 'final_score': 0.5}
+        
+        schedule = plan_video(probe, budget_ms, frame_range=frame_range)
+        if budget_ms is not None:
+            print(f"Budget {budget_ms:.0f} ms: {schedule.target_frames} frames, {schedule.max_clips} clips, skipping {sorted(schedule.skipped) or 'nothing'}")
+        
+        # One decode of the whole video feeds sampling, scene cuts, 3D clips and motion traces
+        print("Ingesting video (single decode pass)...")
+        tracker.update("Decoding video...")
+        ingest = ingest_video(
+            video_path, target_frames=schedule.target_frames, clip_duration=2.0,
+            with_clips=schedule.runs('3d_video'), keyframes_only=schedule.keyframes_only,
+            max_clips=schedule.max_clips, probe=probe, start=start, end=end,
+            screen_frames=config.CASCADE_SCREEN_FRAMES if config.CASCADE_ENABLED else 0,
+            screen_size=get_ensemble_detector().quick_input_size()
+        )
+        if ingest is not None:
+            schedule.record('decode', ingest.build_ms, ingest.decode_stats['decoded'] * schedule.megapixels)
+            results['ingest'] = ingest.summary()
+            print(f"  Decoded {ingest.decode_stats['decoded']} frames in {ingest.build_ms:.0f} ms ({len(ingest.scene_cuts)} scene cuts)")
+        
         print("LAYER 1: Metadata Analysis...")
         tracker.update("LAYER 1: Analyzing metadata...")
-        metadata_result = analyze_video_metadata(video_path)
+        metadata_result = analyze_video_metadata(video_path, probe=ingest.probe if ingest else None, start=start, end=end)
         results['layer1_metadata'] = metadata_result
+        if 'segment' in metadata_result.get('metadata', {}):
+            results['segment'] = metadata_result['metadata']['segment']
         
         has_audio = metadata_result.get('has_audio', False)
         print(f"LAYER 1: Metadata Analysis")
@@ -87,7 +138,13 @@ def analyze_video_comprehensive(video_path, output_dir="temp_frames"):
         # Smart frame extraction
         print(f"\nLAYER 2A: Smart Frame Extraction")
         tracker.update("LAYER 2A: Extracting key frames...")
-        frame_data = smart_frame_extraction(video_path, output_dir, target_frames=50)
+        if ingest is not None:
+            frame_data = ingest.frame_data()
+        else:
+            frame_data = smart_frame_extraction(
+                video_path, output_dir, target_frames=schedule.target_frames, detect_faces=False, in_memory=True,
+                start=start, end=end
+            )
         
         if not frame_data or len(frame_data['frames']) == 0:
             tracker.update("Failed to extract frames")
@@ -99,9 +156,31 @@ def analyze_video_comprehensive(video_path, output_dir="temp_frames"):
         frame_paths = frame_data['frames']
         timestamps = frame_data['timestamps']
         print(f"  Extracted {len(frame_paths)} frames")
-        print(f"  Faces: {len(frame_data.get('face_frames', []))}")
+        if frame_data.get('arena') is not None:
+            results['frame_arena'] = {
+                'frames': len(frame_data['arena']),
+                'mb': round(frame_data['arena'].nbytes() / (1024 * 1024), 1),
+                'memmap': frame_data['arena'].memmap_path is not None
+            }
         tracker.update(f"Extracted {len(frame_paths)} frames")
         
+        # Faces are detected once per video; each layer reads what it declared
+        face_layers = [temporal_analyzer]
+        if schedule.runs('physiological'):
+            face_layers.append(physiological_analyzer)
+        if schedule.runs('compression'):
+            face_layers.append(compression_analyzer)
+        if has_audio:
+            face_layers.append(audio_analyzer)
+        face_store = FaceTrackStore.for_layers(frame_paths, timestamps, face_layers, extra=FRAME_FACE_ATTRIBUTES)
+        schedule.record('face_track', face_store.build_ms, len(frame_paths))
+        results['face_track'] = face_store.summary()
+        print(f"  Faces: {len(face_store.face_frames)} ({face_store.detector or 'none'}, {face_store.build_ms:.0f} ms)")
+        
+        # Optical flow and frame differences are computed once per frame pair
+        motion = MotionEngine(frame_paths)
+        
+        
         # =====================================================
         # LAYER 2A: VISUAL STREAM - Frame-Based Analysis
         # =====================================================
@@ -117,41 +196,99 @@ def analyze_video_comprehensive(video_path, output_dir="temp_frames"):
             'avg_frequency': 0.0
         }
         
-        for idx, frame_path in enumerate(frame_paths):
+        ensemble_scores, face_scores, frequency_scores = {}, {}, {}
+        face_ms = []
+        layer_start = time.perf_counter()
+        
+        # Stage 1 screens many low-res frames with the quick model; the full
+        # layers then run only on the frames it picks (frame, sample index, pool position)
+        if ingest is not None and ingest.screen is not None:
+            cascade = FrameCascade(ingest, frame_paths)
+            if not cascade.screen():
+                cascade = None
+        
+        if cascade is not None:
+            stage2 = cascade.stage2_frames(cascade.select(int(round(len(frame_paths) * config.CASCADE_STAGE2_SHARE))))
+            stage2_indices = [cascade.indices[pos] for _, _, pos in stage2]
+            print(f"  Cascade: full layers on {len(stage2)} of {len(cascade.indices)} screened frames ({cascade.screen_ms:.0f} ms screening)")
+        else:
+            stage2 = [(frame, i, None) for i, frame in enumerate(frame_paths)]
+            arena = frame_data.get('arena')
+            stage2_indices = list(arena.frame_indices) if arena is not None else list(range(len(frame_paths)))
+        
+        # Near-duplicate frames share their representative's scores
+        stage2_start = time.perf_counter()
+        dedup = FrameDedup([frame for frame, _, _ in stage2])
+        unique = len(dedup.representatives)
+        
+        for done, idx in enumerate(dedup.representatives, 1):
+            frame, sample, _ = stage2[idx]
             try:
-                img = Image.open(frame_path).convert('RGB')
+                img = open_pil(frame)
                 
                 # 1. Ensemble detector (silent mode to avoid progress spam)
                 ensemble_result = predict_ensemble(img, silent=True)
-                frame_results['ensemble_scores'].append(ensemble_result.get('score', 0.5))
+                ensemble_scores[idx] = ensemble_result.get('score', 0.5)
                 
-                # 2. Face analysis (if face present)
-                face_result = analyze_face(img)
-                if face_result.get('face_detected', False):
-                    frame_results['face_scores'].append(face_result.get('score', 0.5))
+                # 2. Face analysis (if face present); re-decoded frames detect their own faces
+                if sample is None or face_store.has_face(sample) or face_store.detector is None:
+                    landmarks = face_store.pixel_landmarks(sample) if sample is not None else None
+                    face_result = analyze_face(img, landmarks)
+                    if face_result.get('face_detected', False):
+                        face_scores[idx] = face_result.get('score', 0.5)
+                    if 'timings' in face_result:
+                        face_ms.append(face_result['timings'].get('total_ms', face_result['timings']['detect_ms']))
                 
                 # 3. Frequency analysis
                 freq_result = analyze_frequency_domain(img)
-                frame_results['frequency_scores'].append(freq_result.get('score', 0.5))
+                frequency_scores[idx] = freq_result.get('score', 0.5)
                 
-                if (idx + 1) % 10 == 0:
-                    print(f"  Processed {idx + 1}/{len(frame_paths)} frames")
-                    tracker.update(f"Processed {idx + 1}/{len(frame_paths)} frames")
+                if done % 10 == 0:
+                    print(f"  Processed {done}/{unique} unique frames")
+                    tracker.update(f"Processed {done}/{unique} unique frames")
                     
             except Exception:
                 continue
         
+        now = time.perf_counter()
+        schedule.record('frame_based', (now - layer_start) * 1000, len(frame_paths))
+        
+        frame_results['ensemble_scores'] = dedup.broadcast(ensemble_scores)
+        # Video frame index of each ensemble score, for the scene-boundary weighting
+        frame_results['ensemble_frames'] = [stage2_indices[i] for i, cluster in enumerate(dedup.cluster_of)
+                                            if cluster in ensemble_scores]
+        frame_results['face_scores'] = dedup.broadcast(face_scores)
+        frame_results['frequency_scores'] = dedup.broadcast(frequency_scores)
+        results['frame_dedup'] = dedup.summary((now - stage2_start) * 1000)
+        print(f"  Dedup: {unique}/{len(stage2)} unique frames ({results['frame_dedup']['dedup_ratio']:.0%} skipped)")
+        
         # Calculate averages
         if frame_results['ensemble_scores']:
             frame_results['avg_ensemble'] = np.mean(frame_results['ensemble_scores'])
             frame_results['max_ensemble'] = np.max(frame_results['ensemble_scores'])
         
+        # With the cascade, the average covers every screened frame: stage 2
+        # scores where measured, calibrated stage 1 scores elsewhere. The max
+        # stays measured-only, since it can trigger the fusion overrides.
+        if cascade is not None:
+            full_scores = {stage2[i][2]: ensemble_scores[cluster] for i, cluster in enumerate(dedup.cluster_of)
+                           if cluster in ensemble_scores}
+            if full_scores:
+                frame_results['measured_avg_ensemble'] = frame_results['avg_ensemble']
+                frame_results['avg_ensemble'] = cascade.estimate(full_scores)
+                frame_results['avg_ensemble_estimated'] = True
+                frame_results['cascade'] = cascade.summary(full_scores)
+        
         if frame_results['face_scores']:
             frame_results['avg_face'] = np.mean(frame_results['face_scores'])
         
         if frame_results['frequency_scores']:
             frame_results['avg_frequency'] = np.mean(frame_results['frequency_scores'])
         
+        if face_ms:
+            frame_results['avg_face_ms'] = float(np.mean(face_ms))
+            print(f"  Face analysis: {frame_results['avg_face_ms']:.1f} ms/frame over {len(face_ms)} frames")
+        
         results['layer2a_frame_based'] = frame_results
         
         print(f"  Avg: {frame_results['avg_ensemble']:.2f}, Max: {frame_results.get('max_ensemble', 0):.2f}")
@@ -163,7 +300,8 @@ def analyze_video_comprehensive(video_path, output_dir="temp_frames"):
         # =====================================================
         print(f"\nLAYER 2A: Temporal Consistency")
         tracker.update("Temporal: Analyzing consistency...")
-        temporal_result = analyze_temporal_consistency(frame_paths, timestamps)
+        with schedule.measure('temporal', len(frame_paths)):
+            temporal_result = analyze_temporal_consistency(frame_paths, timestamps, face_store, motion)
         results['layer2a_temporal'] = temporal_result
         
         print(f"  Score: {temporal_result.get('score', 0):.2f}")
@@ -175,11 +313,21 @@ def analyze_video_comprehensive(video_path, output_dir="temp_frames"):
         # =====================================================
         print(f"\nLAYER 2A: 3D Video Model")
         tracker.update("3D Model: Running video analysis...")
-        video_3d_result = analyze_with_3d_model(video_path, clip_duration=2.0)
-        results['layer2a_3d_video'] = video_3d_result
         
-        print(f"  Score: {video_3d_result.get('score', 0):.2f}")
-        tracker.update(f"3D Model: Score {video_3d_result.get('score', 0):.2f}")
+        if schedule.runs('3d_video'):
+            with schedule.measure('3d_video', schedule.max_clips):
+                video_3d_result = analyze_with_3d_model(
+                    video_path, clip_duration=2.0, clips=ingest.clips if ingest else None,
+                    max_clips=schedule.max_clips, start=start, end=end,
+                    clip_selection=ingest.clip_selection if ingest else None
+                )
+                results['layer2a_3d_video'] = video_3d_result
+        
+                print(f"  Score: {video_3d_result.get('score', 0):.2f}")
+                tracker.update(f"3D Model: Score {video_3d_result.get('score', 0):.2f}")
+        else:
+            skip_layer(schedule, '3d_video')
+            results['layer2a_3d_video'] = None
         
         # =====================================================
         # LAYER 2B: AUDIO STREAM
@@ -187,7 +335,11 @@ def analyze_video_comprehensive(video_path, output_dir="temp_frames"):
         if has_audio:
             print(f"\nLAYER 2B: Audio Analysis")
             tracker.update("LAYER 2B: Analyzing audio...")
-            audio_result = analyze_audio_stream(video_path)
+            with schedule.measure('audio', schedule.duration):
+                audio_result = analyze_audio_stream(
+                    video_path, face_store.landmarks, has_audio=True,
+                    mouth_trace=ingest.mouth_motion if ingest else None, start=start, end=end
+                )
             results['layer2b_audio'] = audio_result
             
             print(f"  Score: {audio_result.get('score', 0):.2f}")
@@ -203,24 +355,35 @@ def analyze_video_comprehensive(video_path, output_dir="temp_frames"):
         print(f"\nLAYER 2C: Physiological Analysis")
         tracker.update("LAYER 2C: Analyzing physiological signals...")
         
-        fps = metadata_result.get('metadata', {}).get('fps', 30)
-        physio_result = analyze_physiological_signals(frame_paths, fps=fps)
-        results['layer2c_physiological'] = physio_result
+        if schedule.runs('physiological'):
+            with schedule.measure('physiological', len(frame_paths)):
+                fps = metadata_result.get('metadata', {}).get('fps', 30)
+                physio_result = analyze_physiological_signals(frame_paths, fps=fps, face_store=face_store, motion=motion)
+                results['layer2c_physiological'] = physio_result
         
-        print(f"  Heartbeat: {physio_result.get('heartbeat_detected', False)}")
-        print(f"  Blinks: {physio_result.get('blink_pattern_natural', False)}")
-        tracker.update(f"Physiological: Heartbeat {'detected' if physio_result.get('heartbeat_detected', False) else 'not detected'}")
+                print(f"  Heartbeat: {physio_result.get('heartbeat_detected', False)}")
+                print(f"  Blinks: {physio_result.get('blink_pattern_natural', False)}")
+                tracker.update(f"Physiological: Heartbeat {'detected' if physio_result.get('heartbeat_detected', False) else 'not detected'}")
+        else:
+            skip_layer(schedule, 'physiological')
+            results['layer2c_physiological'] = None
         
         # =====================================================
         # LAYER 2D: PHYSICS & CONSISTENCY
         # =====================================================
         print(f"\nLAYER 2D: Physics Consistency")
         tracker.update("LAYER 2D: Checking physics...")
-        physics_result = analyze_physics_consistency(frame_paths)
-        results['layer2d_physics'] = physics_result
         
-        print(f"  Score: {physics_result.get('score', 0):.2f}")
-        tracker.update(f"Physics: Score {physics_result.get('score', 0):.2f}")
+        if schedule.runs('physics'):
+            with schedule.measure('physics', len(frame_paths)):
+                physics_result = analyze_physics_consistency(frame_paths)
+                results['layer2d_physics'] = physics_result
+        
+                print(f"  Score: {physics_result.get('score', 0):.2f}")
+                tracker.update(f"Physics: Score {physics_result.get('score', 0):.2f}")
+        else:
+            skip_layer(schedule, 'physics')
+            results['layer2d_physics'] = None
         
         # =====================================================
         # LAYER 3: SPECIALIZED DETECTION METHODS
@@ -229,30 +392,42 @@ def analyze_video_comprehensive(video_path, output_dir="temp_frames"):
         # 3A: Enhanced Boundary Analysis
         print(f"\nLAYER 3: Boundary Analysis")
         tracker.update("LAYER 3: Analyzing boundaries...")
-        scene_boundaries = frame_data.get('scene_boundaries', [])
-        boundary_result = analyze_boundaries(frame_paths, scene_boundaries, timestamps)
-        results['layer3_boundary'] = boundary_result
-        
-        print(f"  Suspicious transitions: {len(boundary_result.get('suspicious_transitions', []))}")
-        tracker.update(f"Suspicious transitions: {len(boundary_result.get('suspicious_transitions', []))}")
-        
-        # Apply boundary weighting to frame scores
-        if frame_results['ensemble_scores'] and scene_boundaries:
-            weighted_ensemble = get_boundary_weighted_scores(
-                frame_results['ensemble_scores'],
-                scene_boundaries,
-                weight_multiplier=2.0
-            )
-            frame_results['weighted_ensemble'] = weighted_ensemble
+        
+        if schedule.runs('boundary'):
+            with schedule.measure('boundary', len(frame_paths)):
+                scene_boundaries = frame_data.get('scene_boundaries', [])
+                boundary_result = analyze_boundaries(frame_paths, scene_boundaries, timestamps, motion)
+                results['layer3_boundary'] = boundary_result
+        
+                print(f"  Suspicious transitions: {len(boundary_result.get('suspicious_transitions', []))}")
+                tracker.update(f"Suspicious transitions: {len(boundary_result.get('suspicious_transitions', []))}")
+        
+                # Apply boundary weighting to frame scores
+                if frame_results['ensemble_scores'] and scene_boundaries:
+                    weighted_ensemble = get_boundary_weighted_scores(
+                        list(zip(frame_results['ensemble_frames'], frame_results['ensemble_scores'])),
+                        scene_boundaries,
+                        weight_multiplier=2.0
+                    )
+                    frame_results['weighted_ensemble'] = weighted_ensemble
+        else:
+            skip_layer(schedule, 'boundary')
+            results['layer3_boundary'] = None
         
         # 3B: Per-Region Compression Analysis
         print(f"\nLAYER 3: Compression Analysis")
         tracker.update("LAYER 3: Analyzing compression...")
-        compression_result = analyze_region_compression(frame_paths)
-        results['layer3_compression'] = compression_result
         
-        print(f"  Mismatches: {compression_result.get('compression_mismatches', 0)}")
-        tracker.update(f"Compression mismatches: {compression_result.get('compression_mismatches', 0)}")
+        if schedule.runs('compression'):
+            with schedule.measure('compression', len(frame_paths)):
+                compression_result = analyze_region_compression(frame_paths, face_store)
+                results['layer3_compression'] = compression_result
+        
+                print(f"  Mismatches: {compression_result.get('compression_mismatches', 0)}")
+                tracker.update(f"Compression mismatches: {compression_result.get('compression_mismatches', 0)}")
+        else:
+            skip_layer(schedule, 'compression')
+            results['layer3_compression'] = None
         
         # =====================================================
         # INTELLIGENT SCORE FUSION
@@ -261,6 +436,8 @@ def analyze_video_comprehensive(video_path, output_dir="temp_frames"):
         tracker.update("Combining all analysis results...")
         
         final_score, confidence, breakdown = intelligent_fusion(results)
+        results['schedule'] = schedule.summary()
+        results['motion'] = motion.summary()
         
         results['final_score'] = final_score
         results['confidence'] = confidence
@@ -287,6 +464,14 @@ def analyze_video_comprehensive(video_path, output_dir="temp_frames"):
             'final_score': 0.5,
             'risk_level': 'Unknown'
         }
+    
+    finally:
+        if frame_data and frame_data.get('arena') is not None:
+            frame_data['arena'].close()
+        if cascade is not None:
+            cascade.close()
+        if ingest is not None:
+            ingest.close()
 
 
 def intelligent_fusion(results):
@@ -1,9 +1,15 @@
 import cv2
 import numpy as np
 from scipy import fftpack
+from models.face_detectors import detect_faces_haar, largest_box
+from models.video.frame_store import read_bgr
 
 
-def analyze_region_compression(frame_paths):
+# Face data read from the per-video FaceTrackStore
+FACE_ATTRIBUTES = ('boxes',)
+
+
+def analyze_region_compression(frame_paths, face_store=None):
     try:
         results = {
             'score': 0.0,
@@ -25,7 +31,7 @@ def analyze_region_compression(frame_paths):
             
             frame_path = frame_paths[idx]
             
-            face_region, bg_region = extract_face_and_background(frame_path)
+            face_region, bg_region = extract_face_and_background(frame_path, face_store, idx)
             
             if face_region is None or bg_region is None:
                 continue
@@ -67,20 +73,23 @@ def analyze_region_compression(frame_paths):
         }
 
 
-def extract_face_and_background(frame_path):
+def extract_face_and_background(frame_path, face_store=None, frame_index=None):
     try:
-        image = cv2.imread(frame_path)
+        image = read_bgr(frame_path)
         if image is None:
             return None, None
         
         h, w = image.shape[:2]
         
+        if face_store is not None:
+            return split_face_background(image, face_store.face_box(frame_index))
+        
         return extract_face_opencv(image)
         
     except Exception as e:
         print(f"Face/background extraction error: {e}")
         try:
-            image = cv2.imread(frame_path)
+            image = read_bgr(frame_path)
             h, w = image.shape[:2]
             face_region = image[h//4:3*h//4, w//4:3*w//4]
             bg_region = np.vstack([image[:h//4, :], image[3*h//4:, :]])
@@ -93,19 +102,28 @@ def extract_face_opencv(image):
     try:
         h, w = image.shape[:2]
         
-        face_cascade = cv2.CascadeClassifier(
-            cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
-        )
+        face_box = largest_box(detect_faces_haar(image, 1.1, 4, (30, 30)))
+        
+        return split_face_background(image, face_box)
         
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        faces = face_cascade.detectMultiScale(gray, 1.1, 4, minSize=(30, 30))
+    except Exception as e:
+        h, w = image.shape[:2]
+        face_region = image[h//4:3*h//4, w//4:3*w//4]
+        bg_region = np.vstack([image[:h//4, :], image[3*h//4:, :]])
+        return face_region, bg_region
+
+
+def split_face_background(image, face_box):
+    """Face region and surrounding background for an (x, y, w, h) box; centre crop if None"""
+    try:
+        h, w = image.shape[:2]
         
-        if len(faces) == 0:
+        if face_box is None:
             face_region = image[h//4:3*h//4, w//4:3*w//4]
             bg_region = np.vstack([image[:h//4, :], image[3*h//4:, :]])
             return face_region, bg_region
         
-        x, y, fw, fh = max(faces, key=lambda f: f[2] * f[3])
+        x, y, fw, fh = face_box
         
         x = max(0, x)
         y = max(0, y)
@@ -0,0 +1,217 @@
+import time
+import cv2
+import numpy as np
+
+import config
+from models.face_detectors import detect_faces_dnn_batch, detect_faces_haar, get_face_dnn, largest_box
+from models.video.frame_store import read_rgb
+from models.landmark_service import get_landmark_tracker, landmarks_to_pixel_array, landmarks_to_pixels, LandmarkTrack
+
+
+# Face attributes a layer can ask for. Each face-dependent video module declares
+# the ones it reads as FACE_ATTRIBUTES and the store computes only their union.
+#   boxes     - largest face per frame as (x, y, w, h), plus per-frame track ids
+#   landmarks - LandmarkTrack from MediaPipe VIDEO-mode tracking
+#   crops     - BGR face crop per frame (implies boxes)
+FACE_ATTRIBUTES = ('boxes', 'landmarks', 'crops')
+
+TRACK_IOU_THRESHOLD = 0.3
+
+
+def box_iou(a, b):
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+
+    ix = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    iy = max(0, min(ay + ah, by + bh) - max(ay, by))
+    inter = ix * iy
+    union = aw * ah + bw * bh - inter
+
+    return inter / union if union > 0 else 0.0
+
+
+def box_from_landmarks(face_landmarks, width, height):
+    points = landmarks_to_pixels(face_landmarks, width, height)
+    x1, y1 = points.min(axis=0)
+    x2, y2 = points.max(axis=0)
+
+    if x2 <= x1 or y2 <= y1:
+        return None
+
+    return (int(x1), int(y1), int(x2 - x1), int(y2 - y1))
+
+
+class FaceTrackStore:
+    """
+    Face data for the sampled frames of one video, computed in a single pass.
+
+    Every frame is decoded once and face-detected once: with MediaPipe the
+    boxes come from the tracked landmarks, otherwise from batched res10 DNN
+    detection, with a Haar pass as the last resort.
+    Per-frame lists are aligned with frame_paths; missing faces are None.
+    """
+
+    def __init__(self, frame_paths, timestamps, attributes=FACE_ATTRIBUTES):
+        unknown = set(attributes) - set(FACE_ATTRIBUTES)
+        if unknown:
+            raise ValueError(f"Unknown face attributes: {sorted(unknown)}")
+
+        self.frame_paths = list(frame_paths)
+        self.timestamps = list(timestamps)
+        self.attributes = set(attributes)
+
+        if 'crops' in self.attributes:
+            self.attributes.add('boxes')
+
+        n = len(self.frame_paths)
+        self.frame_sizes = [None] * n
+        self.boxes = [None] * n
+        self.track_ids = [None] * n
+        self.crops = [None] * n
+        self.landmarks = None
+        self.detector = None
+        self.build_ms = 0.0
+
+        start = time.perf_counter()
+        self._build()
+        self.build_ms = (time.perf_counter() - start) * 1000
+
+    @classmethod
+    def for_layers(cls, frame_paths, timestamps, layer_modules, extra=()):
+        """Store with the union of FACE_ATTRIBUTES declared by the given modules"""
+        attributes = set(extra)
+        for module in layer_modules:
+            attributes.update(getattr(module, 'FACE_ATTRIBUTES', ()))
+        return cls(frame_paths, timestamps, attributes)
+
+    def _build(self):
+        want_boxes = 'boxes' in self.attributes
+        tracker = get_landmark_tracker() if 'landmarks' in self.attributes else None
+
+        if tracker is not None and tracker.available:
+            self.detector = 'mediapipe'
+            timestamps_ms = [t * 1000.0 for t in self.timestamps]
+            results = []
+
+            for i, (rgb, face_landmarks) in enumerate(tracker.iter_track(self._rgb_frames(), timestamps_ms)):
+                results.append(face_landmarks)
+
+                if want_boxes and face_landmarks is not None:
+                    self._set_box(i, box_from_landmarks(face_landmarks, rgb.shape[1], rgb.shape[0]), rgb)
+
+            self.landmarks = LandmarkTrack.from_results(results, timestamps_ms[:len(results)])
+
+        elif want_boxes and get_face_dnn() is not None:
+            self.detector = 'dnn'
+            batch = []
+
+            for i, rgb in enumerate(self._rgb_frames()):
+                if rgb is not None:
+                    batch.append((i, rgb))
+
+                if len(batch) >= config.FACE_DNN_BATCH_SIZE:
+                    self._detect_batch(batch)
+                    batch = []
+
+            self._detect_batch(batch)
+
+        elif want_boxes:
+            self.detector = 'haar'
+            for i, rgb in enumerate(self._rgb_frames()):
+                if rgb is None:
+                    continue
+
+                box = largest_box(detect_faces_haar(rgb, 1.1, 4, (30, 30), color=cv2.COLOR_RGB2GRAY))
+                self._set_box(i, box, rgb)
+
+        if want_boxes:
+            self._assign_track_ids()
+
+    def _rgb_frames(self):
+        for i, frame_path in enumerate(self.frame_paths):
+            rgb = read_rgb(frame_path)
+
+            if rgb is None:
+                yield None
+                continue
+
+            self.frame_sizes[i] = (rgb.shape[1], rgb.shape[0])
+            yield rgb
+
+    def _detect_batch(self, batch):
+        if not batch:
+            return
+
+        detections = detect_faces_dnn_batch([rgb for _, rgb in batch], rgb=True)
+
+        for (i, rgb), faces in zip(batch, detections):
+            if faces:
+                self._set_box(i, faces[0][0], rgb)
+
+    def _set_box(self, i, box, rgb):
+        if box is None:
+            return
+
+        self.boxes[i] = box
+
+        if 'crops' in self.attributes:
+            x, y, w, h = box
+            self.crops[i] = cv2.cvtColor(rgb[y:y+h, x:x+w], cv2.COLOR_RGB2BGR)
+
+    def _assign_track_ids(self):
+        # Link boxes frame to frame by overlap; a jump starts a new track
+        next_id = 0
+        prev_box = None
+
+        for i, box in enumerate(self.boxes):
+            if box is None:
+                continue
+
+            if prev_box is None or box_iou(prev_box, box) < TRACK_IOU_THRESHOLD:
+                next_id += 1
+
+            self.track_ids[i] = next_id
+            prev_box = box
+
+    def _require(self, attribute):
+        if attribute not in self.attributes:
+            raise ValueError(f"Face attribute '{attribute}' was not requested for this store")
+
+    def has_face(self, i):
+        if self.landmarks is not None:
+            return bool(self.landmarks.present[i])
+        return self.boxes[i] is not None
+
+    @property
+    def face_frames(self):
+        return [path for i, path in enumerate(self.frame_paths) if self.has_face(i)]
+
+    @property
+    def num_tracks(self):
+        return max([t for t in self.track_ids if t is not None], default=0)
+
+    def face_box(self, i):
+        self._require('boxes')
+        return self.boxes[i]
+
+    def face_crop(self, i):
+        self._require('crops')
+        return self.crops[i]
+
+    def pixel_landmarks(self, i):
+        """(N, 3) float32 landmarks of frame i in pixel coords, or None (no track or no face)"""
+        if self.landmarks is None or not self.landmarks.present[i] or self.frame_sizes[i] is None:
+            return None
+
+        width, height = self.frame_sizes[i]
+        return landmarks_to_pixel_array(self.landmarks.landmarks[i], width, height)
+
+    def summary(self):
+        return {
+            'attributes': sorted(self.attributes),
+            'detector': self.detector,
+            'frames': len(self.frame_paths),
+            'face_frames': sum(1 for i in range(len(self.frame_paths)) if self.has_face(i)),
+            'tracks': self.num_tracks,
+            'build_ms': round(self.build_ms, 1)
+        }
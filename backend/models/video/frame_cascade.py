@@ -0,0 +1,143 @@
+import time
+import cv2
+import numpy as np
+
+import config
+from models.ensemble_detector import predict_quick_batch
+from models.video.frame_store import build_frame_arena
+
+
+# Stage 2 budget split: highest proxy scores, proxy scores nearest 0.5, random control
+TOP_SHARE = 0.5
+UNCERTAIN_SHARE = 0.25
+CONTROL_SEED = 0
+
+
+class FrameCascade:
+    """
+    Coarse-to-fine frame scoring over the thumbnails an ingest screened.
+
+    Stage 1 scores every screened frame, plus the sampled frames, with the
+    quick model on screen-size thumbnails. Stage 2 frames are the highest
+    scoring, the least certain and a random control set; they get the full
+    per-frame layers. Stage 2 frames that were sampled reuse the sample
+    (and its face tracks); the rest are decoded again at full resolution.
+
+    estimate() averages both stages: stage 2 frames keep their ensemble
+    score, other frames their proxy score shifted by the mean ensemble -
+    proxy gap measured on the control set. Calibrated proxies are never
+    used for the maximum, which only measured stage 2 scores may set.
+    """
+
+    def __init__(self, ingest, frame_paths):
+        self.video_path = ingest.video_path
+        self.fps = ingest.probe['fps']
+        self.frame_paths = frame_paths
+        self.sample_of = {frame_idx: i for i, frame_idx in enumerate(ingest.arena.frame_indices)}
+
+        # Pool: screened thumbnails plus any sampled frame the screen missed
+        thumbs = dict(zip(ingest.screen_indices, ingest.screen))
+        for frame_idx, i in self.sample_of.items():
+            if frame_idx not in thumbs:
+                thumbs[frame_idx] = cv2.resize(ingest.arena.rgb(i), ingest.screen_size, interpolation=cv2.INTER_AREA)
+
+        self.indices = sorted(thumbs)
+        self._thumbs = np.stack([thumbs[frame_idx] for frame_idx in self.indices])
+        self.proxy = None
+        self.reasons = {}
+        self.offset = 0.0
+        self.extra_arena = None
+        self.redecoded = 0
+        self.screen_ms = 0.0
+
+    def screen(self):
+        """Stage 1; False when the quick model is unavailable"""
+        start = time.perf_counter()
+        scores = predict_quick_batch(self._thumbs, config.CASCADE_BATCH_SIZE)
+        self.screen_ms = (time.perf_counter() - start) * 1000
+        self._thumbs = None
+
+        if scores is None:
+            return False
+
+        self.proxy = np.asarray(scores, dtype=np.float32)
+        return True
+
+    def select(self, budget):
+        """Pool positions for stage 2, each tagged 'top', 'uncertain' or 'control'"""
+        remaining = list(range(len(self.indices)))
+        budget = min(max(1, budget), len(remaining))
+
+        n_top = int(np.ceil(budget * TOP_SHARE))
+        n_uncertain = int(round(budget * UNCERTAIN_SHARE))
+
+        ranked = sorted(remaining, key=lambda pos: -self.proxy[pos])
+        chosen = {pos: 'top' for pos in ranked[:n_top]}
+
+        ranked = sorted((pos for pos in remaining if pos not in chosen), key=lambda pos: abs(self.proxy[pos] - 0.5))
+        chosen.update({pos: 'uncertain' for pos in ranked[:n_uncertain]})
+
+        rest = [pos for pos in remaining if pos not in chosen]
+        n_control = min(budget - len(chosen), len(rest))
+        if n_control > 0:
+            rng = np.random.default_rng(CONTROL_SEED)
+            chosen.update({int(pos): 'control' for pos in rng.choice(rest, n_control, replace=False)})
+
+        self.reasons = chosen
+        return sorted(chosen)
+
+    def stage2_frames(self, positions):
+        """(frame, sample index or None, pool position) per stage 2 position"""
+        extra = [self.indices[pos] for pos in positions if self.indices[pos] not in self.sample_of]
+        extra_of = {}
+
+        if extra:
+            self.extra_arena = build_frame_arena(self.video_path, extra, self.fps)
+            if self.extra_arena is not None:
+                extra_of = {frame_idx: ref for frame_idx, ref in zip(self.extra_arena.frame_indices, self.extra_arena.refs())}
+        self.redecoded = len(extra_of)
+
+        frames = []
+        for pos in positions:
+            frame_idx = self.indices[pos]
+            if frame_idx in self.sample_of:
+                sample = self.sample_of[frame_idx]
+                frames.append((self.frame_paths[sample], sample, pos))
+            elif frame_idx in extra_of:
+                frames.append((extra_of[frame_idx], None, pos))
+
+        return frames
+
+    def estimate(self, full_scores):
+        """Estimated mean ensemble score over the whole pool from {pool position: ensemble score}"""
+        basis = [pos for pos, reason in self.reasons.items() if reason == 'control' and pos in full_scores]
+        basis = basis or list(full_scores)
+
+        offset = float(np.mean([full_scores[pos] - self.proxy[pos] for pos in basis])) if basis else 0.0
+        values = np.clip(self.proxy + offset, 0.0, 1.0)
+        for pos, score in full_scores.items():
+            values[pos] = score
+
+        self.offset = offset
+        return float(values.mean())
+
+    def summary(self, full_scores):
+        counts = {}
+        for reason in self.reasons.values():
+            counts[reason] = counts.get(reason, 0) + 1
+
+        return {
+            'stage1_frames': len(self.indices),
+            'stage2_frames': len(full_scores),
+            'stage2_reasons': counts,
+            'redecoded_frames': self.redecoded,
+            'proxy_mean': round(float(self.proxy.mean()), 3),
+            'proxy_max': round(float(self.proxy.max()), 3),
+            'calibration_offset': round(self.offset, 3),
+            'screen_ms': round(self.screen_ms, 1)
+        }
+
+    def close(self):
+        if self.extra_arena is not None:
+            self.extra_arena.close()
+            self.extra_arena = None
@@ -0,0 +1,101 @@
+import time
+import cv2
+import numpy as np
+
+import config
+from models.video.frame_store import read_gray
+
+
+# pHash: DCT of a HASH_SIZE x HASH_SIZE grayscale downscale, low-frequency DCT_SIZE x DCT_SIZE block
+HASH_SIZE = 32
+DCT_SIZE = 8
+
+
+def perceptual_hash(gray):
+    """64-bit pHash of a grayscale image as an int"""
+    small = cv2.resize(gray, (HASH_SIZE, HASH_SIZE), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:DCT_SIZE, :DCT_SIZE].flatten()
+
+    # The DC term only carries overall brightness
+    bits = low > np.median(low[1:])
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+
+class FrameDedup:
+    """
+    Clusters near-duplicate sampled frames by perceptual hash so the
+    per-frame layers run once per cluster.
+
+    Frames are taken in order; each joins the first representative whose
+    pHash is within max_distance bits, or becomes a representative itself.
+    Unreadable frames are always their own representative. broadcast()
+    maps per-representative scores back to every frame of its cluster,
+    which weights each score by the cluster's multiplicity.
+    """
+
+    def __init__(self, frames, max_distance=None, enabled=None):
+        self.max_distance = config.FRAME_DEDUP_MAX_DISTANCE if max_distance is None else max_distance
+        self.enabled = config.FRAME_DEDUP_ENABLED if enabled is None else enabled
+        self.frame_count = len(frames)
+        self.cluster_of = list(range(self.frame_count))
+        self.representatives = list(range(self.frame_count))
+        self.hash_ms = 0.0
+
+        if self.enabled and self.frame_count > 1:
+            start = time.perf_counter()
+            self._cluster(frames)
+            self.hash_ms = (time.perf_counter() - start) * 1000
+
+    def _cluster(self, frames):
+        hashes = {}
+        representatives = []
+
+        for idx, frame in enumerate(frames):
+            try:
+                gray = read_gray(frame)
+            except Exception:
+                gray = None
+
+            if gray is None:
+                representatives.append(idx)
+                continue
+
+            value = perceptual_hash(gray)
+            match = next((rep for rep in representatives
+                          if rep in hashes and hamming(hashes[rep], value) <= self.max_distance), None)
+
+            if match is None:
+                hashes[idx] = value
+                representatives.append(idx)
+            else:
+                self.cluster_of[idx] = match
+
+        self.representatives = representatives
+
+    def broadcast(self, rep_scores):
+        """One score per frame, in frame order, from {representative: score}; frames of unscored clusters are dropped"""
+        return [rep_scores[cluster] for cluster in self.cluster_of if cluster in rep_scores]
+
+    def summary(self, layer_ms=None):
+        """Dedup ratio, and the time saved estimated from layer_ms (hashing plus the representatives' layers)"""
+        unique = len(self.representatives)
+        skipped = self.frame_count - unique
+
+        summary = {
+            'enabled': self.enabled,
+            'frames': self.frame_count,
+            'unique_frames': unique,
+            'dedup_ratio': round(skipped / float(self.frame_count), 3) if self.frame_count else 0.0,
+            'max_distance': self.max_distance,
+            'hash_ms': round(self.hash_ms, 1)
+        }
+
+        if layer_ms is not None and unique:
+            per_frame_ms = (layer_ms - self.hash_ms) / unique
+            summary['saved_ms'] = round(per_frame_ms * skipped - self.hash_ms, 1)
+
+        return summary
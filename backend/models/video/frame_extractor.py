@@ -1,81 +1,111 @@
 import cv2
 import numpy as np
 import os
+import config
 from scenedetect import detect, ContentDetector, AdaptiveDetector
+from models.face_detectors import detect_faces_dnn_batch, detect_faces_haar
+from models.video.frame_reader import iter_frames, new_read_stats, probe_video, segment_frames
+from models.video.frame_store import build_frame_arena, read_bgr
 
 
-def smart_frame_extraction(video_path, output_dir="temp_frames", target_frames=50):
+def smart_frame_extraction(video_path, output_dir="temp_frames", target_frames=50, detect_faces=True, in_memory=False,
+                           start=None, end=None):
+    """
+    Sample up to target_frames frames around scene cuts, clip boundaries and a
+    regular grid, within start..end seconds when given.
+
+    With in_memory=True the frames are decoded into a FrameArena and 'frames'
+    holds FrameRefs instead of JPEG paths; the caller owns result['arena'] and
+    must close() it.
+    """
     try:
-        os.makedirs(output_dir, exist_ok=True)
-        
-        for f in os.listdir(output_dir):
-            if f.endswith('.jpg'):
-                os.remove(os.path.join(output_dir, f))
+        if not in_memory:
+            os.makedirs(output_dir, exist_ok=True)
+            
+            for f in os.listdir(output_dir):
+                if f.endswith('.jpg'):
+                    os.remove(os.path.join(output_dir, f))
         
-        cap = cv2.VideoCapture(video_path)
+        probe = probe_video(video_path)
         
-        if not cap.isOpened():
+        if probe is None:
             return None
         
-        fps = cap.get(cv2.CAP_PROP_FPS)
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        duration = total_frames / fps if fps > 0 else 0
-        
-        cap.release()
+        fps = probe['fps']
+        first, last = segment_frames(probe, start, end)
         
         frame_indices = set()
         
-        scene_frames = detect_scene_changes(video_path, fps, total_frames)
+        scene_frames = detect_scene_changes(video_path, fps, last, start_frame=first)
         frame_indices.update(scene_frames)
         
-        boundary_frames = list(range(0, min(10, total_frames)))
-        boundary_frames.extend(range(max(0, total_frames - 10), total_frames))
+        boundary_frames = list(range(first, min(first + 10, last)))
+        boundary_frames.extend(range(max(first, last - 10), last))
         frame_indices.update(boundary_frames)
         
         current_count = len(frame_indices)
         if current_count < target_frames:
             remaining = target_frames - current_count
-            step = max(1, total_frames // remaining)
-            regular_samples = list(range(0, total_frames, step))[:remaining]
+            step = max(1, (last - first) // remaining)
+            regular_samples = list(range(first, last, step))[:remaining]
             frame_indices.update(regular_samples)
         
         frame_indices = sorted(list(frame_indices))[:target_frames]
         
-        extracted_frames = []
-        timestamps = []
+        read_stats = new_read_stats()
+        extracted_frames, timestamps, arena = store_frames(video_path, frame_indices, fps, output_dir, in_memory, read_stats)
         
-        cap = cv2.VideoCapture(video_path)
+        print(f"  Decoded {read_stats['decoded']} frames ({read_stats['seeks']} seeks) in {read_stats['decode_ms']:.0f} ms")
         
-        for idx, frame_idx in enumerate(frame_indices):
-            cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
-            ret, frame = cap.read()
-            
-            if ret:
-                frame_path = os.path.join(output_dir, f"frame_{idx:04d}.jpg")
-                cv2.imwrite(frame_path, frame)
-                extracted_frames.append(frame_path)
-                timestamps.append(frame_idx / fps if fps > 0 else frame_idx)
-        
-        cap.release()
-        
-        face_frames = detect_face_frames(extracted_frames)
+        # Callers with a FaceTrackStore take face frames from it instead
+        face_frames = detect_face_frames(extracted_frames) if detect_faces else []
         
         return {
             'frames': extracted_frames,
             'timestamps': timestamps,
             'scene_boundaries': [idx for idx in scene_frames if idx in frame_indices],
             'face_frames': face_frames,
-            'total_extracted': len(extracted_frames)
+            'total_extracted': len(extracted_frames),
+            'decode_stats': read_stats,
+            'arena': arena
         }
         
     except Exception as e:
         print(f"Smart frame extraction error: {e}")
-        return simple_frame_extraction(video_path, output_dir, target_frames)
+        return simple_frame_extraction(video_path, output_dir, target_frames, in_memory, start, end)
+
+
+def store_frames(video_path, frame_indices, fps, output_dir, in_memory=False, stats=None):
+    """
+    Decode frame_indices once, either into a FrameArena or as JPEGs in
+    output_dir. Returns (frames, timestamps, arena); arena is None for JPEGs.
+    """
+    if in_memory:
+        arena = build_frame_arena(video_path, frame_indices, fps, stats=stats)
+        if arena is None:
+            return [], [], None
+        return arena.refs(), list(arena.timestamps), arena
+    
+    os.makedirs(output_dir, exist_ok=True)
+    
+    frame_paths = []
+    timestamps = []
+    
+    for count, (frame_idx, frame) in enumerate(iter_frames(video_path, frame_indices, stats=stats)):
+        frame_path = os.path.join(output_dir, f"frame_{count:04d}.jpg")
+        cv2.imwrite(frame_path, frame)
+        frame_paths.append(frame_path)
+        timestamps.append(frame_idx / fps if fps > 0 else frame_idx)
+    
+    return frame_paths, timestamps, None
 
 
-def detect_scene_changes(video_path, fps, total_frames, threshold=27.0):
+def detect_scene_changes(video_path, fps, total_frames, threshold=27.0, start_frame=0):
     try:
-        scene_list = detect(video_path, ContentDetector(threshold=threshold))
+        scene_list = detect(
+            video_path, ContentDetector(threshold=threshold),
+            start_time=start_frame or None, end_time=total_frames
+        )
         
         scene_frames = []
         for scene in scene_list:
@@ -86,25 +116,17 @@ def detect_scene_changes(video_path, fps, total_frames, threshold=27.0):
         
     except Exception as e:
         print(f"Scene detection error: {e}, using fallback")
-        return detect_scene_changes_fallback(video_path, fps, total_frames)
+        return detect_scene_changes_fallback(video_path, fps, total_frames, start_frame)
 
 
-def detect_scene_changes_fallback(video_path, fps, total_frames):
+def detect_scene_changes_fallback(video_path, fps, total_frames, start_frame=0):
     try:
-        cap = cv2.VideoCapture(video_path)
         scene_frames = []
         
         prev_frame = None
-        frame_idx = 0
         sample_rate = max(1, int(fps))
         
-        while frame_idx < total_frames:
-            cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
-            ret, frame = cap.read()
-            
-            if not ret:
-                break
-            
+        for frame_idx, frame in iter_frames(video_path, range(start_frame, total_frames, sample_rate)):
             gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
             gray = cv2.resize(gray, (320, 240))
             
@@ -116,9 +138,7 @@ def detect_scene_changes_fallback(video_path, fps, total_frames):
                     scene_frames.append(frame_idx)
             
             prev_frame = gray
-            frame_idx += sample_rate
         
-        cap.release()
         return scene_frames
         
     except Exception as e:
@@ -128,6 +148,10 @@ def detect_scene_changes_fallback(video_path, fps, total_frames):
 
 def detect_face_frames(frame_paths):
     try:
+        face_frames = detect_face_frames_dnn(frame_paths)
+        if face_frames is not None:
+            return face_frames
+        
         return detect_face_frames_opencv(frame_paths)
         
     except Exception as e:
@@ -135,21 +159,37 @@ def detect_face_frames(frame_paths):
         return []
 
 
-def detect_face_frames_opencv(frame_paths):
+def detect_face_frames_dnn(frame_paths):
+    """Batched res10 DNN detection; None when the DNN model is unavailable"""
     try:
-        face_cascade = cv2.CascadeClassifier(
-            cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
-        )
+        face_frames = []
         
+        for start in range(0, len(frame_paths), config.FACE_DNN_BATCH_SIZE):
+            chunk = frame_paths[start:start + config.FACE_DNN_BATCH_SIZE]
+            detections = detect_faces_dnn_batch([read_bgr(frame_path) for frame_path in chunk])
+            
+            if detections is None:
+                return None
+            
+            face_frames.extend(frame_path for frame_path, faces in zip(chunk, detections) if faces)
+        
+        return face_frames
+        
+    except Exception as e:
+        print(f"DNN face detection error: {e}")
+        return None
+
+
+def detect_face_frames_opencv(frame_paths):
+    try:
         face_frames = []
         
         for frame_path in frame_paths:
-            image = cv2.imread(frame_path)
+            image = read_bgr(frame_path)
             if image is None:
                 continue
             
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-            faces = face_cascade.detectMultiScale(gray, 1.1, 4, minSize=(30, 30))
+            faces = detect_faces_haar(image, 1.1, 4, (30, 30))
             
             if len(faces) > 0:
                 face_frames.append(frame_path)
@@ -161,44 +201,24 @@ def detect_face_frames_opencv(frame_paths):
         return []
 
 
-def simple_frame_extraction(video_path, output_dir, target_frames):
+def simple_frame_extraction(video_path, output_dir, target_frames, in_memory=False, start=None, end=None):
     try:
-        os.makedirs(output_dir, exist_ok=True)
-        
-        cap = cv2.VideoCapture(video_path)
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        fps = cap.get(cv2.CAP_PROP_FPS)
-        
-        step = max(1, total_frames // target_frames)
+        probe = probe_video(video_path)
+        fps = probe['fps']
+        first, last = segment_frames(probe, start, end)
         
-        extracted_frames = []
-        timestamps = []
-        frame_idx = 0
-        count = 0
-        
-        while count < target_frames:
-            cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
-            ret, frame = cap.read()
-            
-            if not ret:
-                break
-            
-            frame_path = os.path.join(output_dir, f"frame_{count:04d}.jpg")
-            cv2.imwrite(frame_path, frame)
-            extracted_frames.append(frame_path)
-            timestamps.append(frame_idx / fps if fps > 0 else frame_idx)
-            
-            frame_idx += step
-            count += 1
+        step = max(1, (last - first) // target_frames)
+        frame_indices = list(range(first, last, step))[:target_frames]
         
-        cap.release()
+        extracted_frames, timestamps, arena = store_frames(video_path, frame_indices, fps, output_dir, in_memory)
         
         return {
             'frames': extracted_frames,
             'timestamps': timestamps,
             'scene_boundaries': [],
             'face_frames': [],
-            'total_extracted': len(extracted_frames)
+            'total_extracted': len(extracted_frames),
+            'arena': arena
         }
         
     except Exception as e:
@@ -0,0 +1,333 @@
+import queue
+import re
+import subprocess
+import threading
+import time
+import cv2
+import numpy as np
+import config
+from utils.video_utils import FFMPEG_PATH
+
+
+# showinfo log line of one output frame, e.g. "n:   3 pts: 180180 pts_time:2.002 ..."
+SHOWINFO_PTS = re.compile(r'\bn:\s*\d+.*?\bpts_time:\s*(-?[\d.]+)')
+
+# Wanted frames per ffmpeg run: the select expression is one argument (Linux caps
+# those at 128 KB) and ffmpeg evaluates it for every decoded frame
+FFMPEG_SELECT_MAX_FRAMES = 512
+
+_ffmpeg_available = None
+_ffmpeg_lock = threading.Lock()
+
+
+def new_read_stats():
+    return {'requested': 0, 'decoded': 0, 'retrieved': 0, 'seeks': 0, 'decode_ms': 0.0}
+
+
+def probe_video(video_path):
+    """Container properties as reported by OpenCV, or None when the file cannot be opened"""
+    cap = cv2.VideoCapture(video_path)
+
+    try:
+        if not cap.isOpened():
+            return None
+
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        codec = int(cap.get(cv2.CAP_PROP_FOURCC))
+
+        return {
+            'fps': fps,
+            'frame_count': frame_count,
+            'width': int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            'height': int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            'codec': "".join([chr((codec >> 8 * i) & 0xFF) for i in range(4)]),
+            'duration_seconds': frame_count / fps if fps > 0 else 0
+        }
+
+    finally:
+        cap.release()
+
+
+def segment_frames(probe, start=None, end=None):
+    """[first, last) frame range covering start..end seconds, clamped to the video"""
+    total = probe['frame_count']
+    fps = probe['fps']
+
+    if fps <= 0:
+        return 0, total
+
+    first = int(round(start * fps)) if start else 0
+    last = int(round(end * fps)) if end is not None else total
+
+    return max(0, min(first, total)), max(0, min(last, total))
+
+
+def ffmpeg_available():
+    """True when FFMPEG_PATH runs; checked once per process"""
+    global _ffmpeg_available
+
+    with _ffmpeg_lock:
+        if _ffmpeg_available is None:
+            try:
+                result = subprocess.run([FFMPEG_PATH, '-version'], capture_output=True, timeout=5)
+                _ffmpeg_available = result.returncode == 0
+            except (OSError, subprocess.SubprocessError):
+                _ffmpeg_available = False
+
+        return _ffmpeg_available
+
+
+def scaled_size(width, height, max_side=None):
+    """(width, height) shrunk so the longest side is <= max_side"""
+    if not max_side or max(width, height) <= max_side:
+        return width, height
+
+    scale = max_side / float(max(width, height))
+    return max(1, int(width * scale)), max(1, int(height * scale))
+
+
+def iter_frames(video_path, frame_indices, max_gap=None, stats=None, max_side=None, backend=None):
+    """
+    Yield (frame_idx, BGR frame) for the requested indices in ascending order,
+    at most max_side on the longest side, from the VIDEO_READER_BACKEND decoder.
+    """
+    backend = backend or config.VIDEO_READER_BACKEND
+
+    if backend == 'ffmpeg' and ffmpeg_available():
+        frame_indices = list(frame_indices)
+        yielded = 0
+
+        for item in iter_frames_ffmpeg(video_path, frame_indices, max_side=max_side, stats=stats):
+            yielded += 1
+            yield item
+
+        # Nothing decoded (unsupported input, ffmpeg error): retry with OpenCV
+        if yielded > 0:
+            return
+
+    for frame_idx, frame in iter_frames_opencv(video_path, frame_indices, max_gap, stats):
+        width, height = scaled_size(frame.shape[1], frame.shape[0], max_side)
+
+        if (width, height) != (frame.shape[1], frame.shape[0]):
+            frame = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+
+        yield frame_idx, frame
+
+
+def iter_frames_opencv(video_path, frame_indices, max_gap=None, stats=None):
+    """
+    Yield (frame_idx, BGR frame) for the requested indices in ascending order.
+
+    Frames are decoded in one sequential pass: grab() steps over unwanted
+    frames and retrieve() converts only the wanted ones. A seek is issued
+    only when the next wanted frame is more than max_gap frames ahead, since
+    every seek re-decodes from the previous keyframe anyway.
+    """
+    if max_gap is None:
+        max_gap = config.VIDEO_SEEK_GAP_FRAMES
+
+    wanted = sorted(set(int(i) for i in frame_indices if i >= 0))
+    if stats is None:
+        stats = new_read_stats()
+    stats['requested'] += len(wanted)
+
+    start = time.perf_counter()
+    cap = cv2.VideoCapture(video_path)
+
+    try:
+        if not cap.isOpened():
+            return
+
+        # Index of the frame the next grab() returns
+        position = 0
+
+        for frame_idx in wanted:
+            if frame_idx - position > max_gap:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
+                stats['seeks'] += 1
+                position = frame_idx
+
+            while position < frame_idx:
+                if not cap.grab():
+                    return
+                stats['decoded'] += 1
+                position += 1
+
+            if not cap.grab():
+                return
+            stats['decoded'] += 1
+            position += 1
+
+            ret, frame = cap.retrieve()
+            if ret:
+                stats['retrieved'] += 1
+                # Only decoder time counts, not time spent by the consumer
+                stats['decode_ms'] += (time.perf_counter() - start) * 1000
+                yield frame_idx, frame
+                start = time.perf_counter()
+
+    finally:
+        stats['decode_ms'] += (time.perf_counter() - start) * 1000
+        cap.release()
+
+
+def select_filter(wanted, base):
+    """ffmpeg select expression for sorted frame indices, runs merged into between() terms"""
+    terms = []
+    first = prev = wanted[0]
+
+    for idx in wanted[1:] + [None]:
+        if idx is not None and idx == prev + 1:
+            prev = idx
+            continue
+
+        if first == prev:
+            terms.append(f'eq(n\\,{first - base})')
+        else:
+            terms.append(f'between(n\\,{first - base}\\,{prev - base})')
+        first = prev = idx
+
+    return 'select=' + '+'.join(terms)
+
+
+def iter_frames_ffmpeg(video_path, frame_indices=None, max_side=None, keyframes_only=False, stats=None, probe=None,
+                       start_frame=0, end_frame=None):
+    """
+    Yield (frame_idx, BGR frame) from one ffmpeg process writing bgr24
+    rawvideo to a pipe.
+
+    Scaling to max_side happens inside ffmpeg and frames are read straight
+    into numpy buffers. frame_indices are picked by a select filter (None
+    means every frame from start_frame to end_frame). keyframes_only decodes
+    nothing but keyframes (-skip_frame nokey) and ignores frame_indices; their
+    indices come from the pts reported by the showinfo filter.
+
+    Decoding starts with an input seek to the first wanted frame, so ffmpeg
+    only decodes from the keyframe before it instead of from frame 0. More
+    than FFMPEG_SELECT_MAX_FRAMES wanted frames are read in several runs.
+    Nothing is yielded when ffmpeg cannot be started.
+    """
+    if stats is None:
+        stats = new_read_stats()
+
+    probe = probe or probe_video(video_path)
+    if probe is None or probe['width'] <= 0 or probe['height'] <= 0:
+        return
+
+    fps = probe['fps']
+    width, height = scaled_size(probe['width'], probe['height'], max_side)
+    frame_bytes = width * height * 3
+
+    wanted = None
+    filters = []
+    base = max(0, start_frame)
+
+    if not keyframes_only and frame_indices is not None:
+        wanted = sorted(set(int(i) for i in frame_indices if i >= 0))
+
+        if len(wanted) > FFMPEG_SELECT_MAX_FRAMES:
+            for i in range(0, len(wanted), FFMPEG_SELECT_MAX_FRAMES):
+                yield from iter_frames_ffmpeg(video_path, wanted[i:i + FFMPEG_SELECT_MAX_FRAMES], max_side,
+                                              stats=stats, probe=probe)
+            return
+
+        stats['requested'] += len(wanted)
+
+        if not wanted:
+            return
+
+        # Frame numbers in the filter graph count from the seek point
+        base = wanted[0]
+
+        # A contiguous run needs no select, just a frame limit
+        if wanted[-1] - base != len(wanted) - 1:
+            filters.append(select_filter(wanted, base))
+
+    # Half a frame early so rounding never drops the first wanted frame
+    seek = (base - 0.5) / fps if base > 0 and fps > 0 else 0.0
+
+    # Explicit output size, so the pipe stride is known whatever the input
+    if (width, height) != (probe['width'], probe['height']):
+        filters.append(f'scale={width}:{height}:flags=area')
+
+    if keyframes_only:
+        filters.append('showinfo')
+
+    cmd = [FFMPEG_PATH, '-hide_banner', '-nostats', '-loglevel', 'info' if keyframes_only else 'error', '-noautorotate']
+    if keyframes_only:
+        cmd += ['-skip_frame', 'nokey']
+    if seek > 0:
+        cmd += ['-ss', f'{seek:.6f}']
+    cmd += ['-i', video_path, '-map', '0:v:0', '-an', '-sn']
+    if wanted is None and end_frame is not None and fps > 0:
+        cmd += ['-t', f'{(end_frame - base) / fps:.6f}']
+    if filters:
+        cmd += ['-vf', ','.join(filters)]
+    cmd += ['-vsync', '0']
+    if wanted is not None:
+        cmd += ['-frames:v', str(len(wanted))]
+    cmd += ['-f', 'rawvideo', '-pix_fmt', 'bgr24', 'pipe:1']
+
+    start = time.perf_counter()
+    try:
+        proc = subprocess.Popen(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE if keyframes_only else subprocess.DEVNULL,
+            bufsize=frame_bytes
+        )
+    except OSError as e:
+        print(f"FFmpeg could not be started: {e}")
+        return
+
+    pts_queue = None
+    if keyframes_only:
+        pts_queue = queue.Queue()
+        threading.Thread(target=_read_showinfo, args=(proc.stderr, pts_queue), daemon=True).start()
+
+    try:
+        count = 0
+
+        while wanted is None or count < len(wanted):
+            frame = np.empty((height, width, 3), dtype=np.uint8)
+            if proc.stdout.readinto(memoryview(frame).cast('B')) != frame_bytes:
+                break
+
+            if keyframes_only:
+                try:
+                    pts_time = pts_queue.get(timeout=10)
+                except queue.Empty:
+                    pts_time = None
+                frame_idx = int(round((pts_time + seek) * fps)) if pts_time is not None and fps > 0 else base + count
+            elif wanted is not None:
+                frame_idx = wanted[count]
+            else:
+                frame_idx = base + count
+
+            count += 1
+            stats['decoded'] += 1
+            stats['retrieved'] += 1
+            stats['decode_ms'] += (time.perf_counter() - start) * 1000
+            yield frame_idx, frame
+            start = time.perf_counter()
+
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+        proc.stdout.close()
+        proc.wait()
+        stats['decode_ms'] += (time.perf_counter() - start) * 1000
+
+
+def _read_showinfo(stream, pts_queue):
+    for line in iter(stream.readline, b''):
+        match = SHOWINFO_PTS.search(line.decode('utf-8', 'replace'))
+        if match:
+            pts_queue.put(float(match.group(1)))
+    stream.close()
+
+
+def read_frames(video_path, frame_indices, max_gap=None, stats=None, max_side=None):
+    """iter_frames() collected into a {frame_idx: BGR frame} dict"""
+    return dict(iter_frames(video_path, frame_indices, max_gap, stats, max_side))
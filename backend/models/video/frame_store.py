@@ -0,0 +1,175 @@
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+import cv2
+import numpy as np
+from PIL import Image
+import config
+from models.video.frame_reader import iter_frames
+
+
+class FrameRef:
+    """Handle to one frame of a FrameArena; analyzers accept these in place of frame paths"""
+
+    __slots__ = ('arena', 'index')
+
+    def __init__(self, arena, index):
+        self.arena = arena
+        self.index = index
+
+    def __repr__(self):
+        return f"<frame {self.index}>"
+
+
+class FrameArena:
+    """
+    Decoded BGR frames of one video in a single contiguous (F, H, W, 3) uint8
+    array, optionally np.memmap-backed.
+
+    bgr() hands out read-only zero-copy views; gray() and rgb() variants are
+    converted on use, and only the FRAME_ARENA_CACHE_FRAMES most recently
+    used conversions are kept, so a memmap-backed arena stays on disk.
+    """
+
+    def __init__(self, capacity, height, width, memmap_dir=None):
+        shape = (capacity, height, width, 3)
+        nbytes = capacity * height * width * 3
+
+        self.memmap_path = None
+
+        if nbytes > config.FRAME_ARENA_MEMMAP_MB * 1024 * 1024:
+            fd, self.memmap_path = tempfile.mkstemp(suffix='.frames', dir=memmap_dir or config.FRAME_ARENA_DIR)
+            os.close(fd)
+            self.frames = np.memmap(self.memmap_path, dtype=np.uint8, mode='w+', shape=shape)
+        else:
+            self.frames = np.empty(shape, dtype=np.uint8)
+
+        self.size = (width, height)
+        self.length = 0
+        self.frame_indices = []
+        self.timestamps = []
+
+        self._gray = OrderedDict()
+        self._rgb = OrderedDict()
+        self._cache_frames = max(1, config.FRAME_ARENA_CACHE_FRAMES)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self.length
+
+    def append(self, frame, frame_idx=None, timestamp=None):
+        if self.length >= len(self.frames):
+            raise ValueError("Frame arena is full")
+
+        if frame.shape[1::-1] != self.size:
+            frame = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+
+        self.frames[self.length] = frame
+        self.frame_indices.append(frame_idx)
+        self.timestamps.append(timestamp)
+        self.length += 1
+
+    def compact(self, keep):
+        """Keep only the slots in keep (ascending), moving them to the front in place"""
+        for new_i, old_i in enumerate(keep):
+            if new_i != old_i:
+                self.frames[new_i] = self.frames[old_i]
+
+        self.frame_indices = [self.frame_indices[i] for i in keep]
+        self.timestamps = [self.timestamps[i] for i in keep]
+        self.length = len(keep)
+        self._gray = OrderedDict()
+        self._rgb = OrderedDict()
+
+    def refs(self):
+        return [FrameRef(self, i) for i in range(self.length)]
+
+    def bgr(self, i):
+        view = self.frames[i]
+        view.flags.writeable = False
+        return view
+
+    def _converted(self, cache, i, code):
+        with self._lock:
+            if i in cache:
+                cache.move_to_end(i)
+                return cache[i]
+
+            image = cv2.cvtColor(self.frames[i], code)
+            image.flags.writeable = False
+            cache[i] = image
+            if len(cache) > self._cache_frames:
+                cache.popitem(last=False)
+            return image
+
+    def gray(self, i):
+        return self._converted(self._gray, i, cv2.COLOR_BGR2GRAY)
+
+    def rgb(self, i):
+        return self._converted(self._rgb, i, cv2.COLOR_BGR2RGB)
+
+    def nbytes(self):
+        cached = sum(a.nbytes for a in self._gray.values()) + sum(a.nbytes for a in self._rgb.values())
+        return int(self.frames[:self.length].nbytes + cached)
+
+    def close(self):
+        self._gray = OrderedDict()
+        self._rgb = OrderedDict()
+
+        self.frames = None
+
+        if self.memmap_path is not None:
+            try:
+                os.remove(self.memmap_path)
+            except OSError:
+                pass
+            self.memmap_path = None
+
+
+def build_frame_arena(video_path, frame_indices, fps, stats=None):
+    """Decode frame_indices (one sequential pass) straight into a FrameArena"""
+    wanted = sorted(set(int(i) for i in frame_indices if i >= 0))
+    arena = None
+
+    for frame_idx, frame in iter_frames(video_path, wanted, stats=stats):
+        if arena is None:
+            arena = FrameArena(len(wanted), frame.shape[0], frame.shape[1])
+
+        arena.append(frame, frame_idx, frame_idx / fps if fps > 0 else frame_idx)
+
+    return arena
+
+
+# Accessors used by the video analyzers: each takes a frame path or a FrameRef
+
+def read_bgr(frame):
+    if isinstance(frame, FrameRef):
+        return frame.arena.bgr(frame.index)
+    return cv2.imread(frame)
+
+
+def read_gray(frame):
+    if isinstance(frame, FrameRef):
+        return frame.arena.gray(frame.index)
+    image = cv2.imread(frame)
+    return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image is not None else None
+
+
+def read_rgb(frame):
+    if isinstance(frame, FrameRef):
+        return frame.arena.rgb(frame.index)
+    image = cv2.imread(frame)
+    return cv2.cvtColor(image, cv2.COLOR_BGR2RGB) if image is not None else None
+
+
+def open_pil(frame):
+    if isinstance(frame, FrameRef):
+        return Image.fromarray(frame.arena.rgb(frame.index))
+    return Image.open(frame).convert('RGB')
+
+
+def frame_exists(frame):
+    if isinstance(frame, FrameRef):
+        return frame.arena.frames is not None and frame.index < len(frame.arena)
+    return os.path.exists(frame)
@@ -0,0 +1,303 @@
+import time
+import cv2
+import numpy as np
+
+import config
+from models.face_detectors import detect_faces_haar, largest_box
+from models.video.clip_selector import ClipSelector
+from models.video.frame_reader import ffmpeg_available, iter_frames, iter_frames_ffmpeg, new_read_stats, probe_video, segment_frames
+from models.video.frame_store import FrameArena
+from models.video.video_3d_model import ClipAssembler, clip_image, video_clip_indices
+
+
+# Boundary frames sampled at each end of the video, as in smart_frame_extraction
+BOUNDARY_FRAMES = 10
+# Face boxes for the mouth trace are refreshed this many times per second
+MOUTH_DETECTIONS_PER_SECOND = 5
+
+
+def content_score(prev_hsv, hsv):
+    """PySceneDetect ContentDetector score: mean absolute H, S and V change"""
+    return float(np.mean(cv2.absdiff(prev_hsv, hsv).reshape(-1, 3).mean(axis=0)))
+
+
+def mouth_region(gray, box):
+    h, w = gray.shape
+
+    if box is None:
+        return gray[int(h*0.5):int(h*0.8), int(w*0.3):int(w*0.7)]
+
+    x, y, bw, bh = box
+    return gray[y+int(bh*0.6):y+bh, x+int(bw*0.25):x+int(bw*0.75)]
+
+
+class VideoIngest:
+    """
+    Everything the video layers need from one sequential decode of the file.
+
+    Every frame is decoded once. A low-res copy feeds the scene-cut score and
+    the global and mouth-region motion traces, while frames chosen for
+    sampling and for the 3D model clips are captured as they stream past.
+    Every clip window is a candidate; a ClipSelector keeps the max_clips
+    most informative ones (clip_selection explains the choice).
+    Traces hold one value per pair of consecutive frames.
+
+    keyframes_only decodes just the keyframes through ffmpeg (quick mode):
+    each planned frame is then served by the first keyframe at or after it,
+    and clips and the mouth trace are skipped. max_side caps the decoded size.
+
+    screen_frames > 0 also keeps that many evenly spaced frames as RGB
+    thumbnails of screen_size (width, height) for the frame cascade.
+
+    start / end (seconds) restrict everything to that segment; decoding
+    seeks to it, so the cost follows the segment length, not the file's.
+    """
+
+    def __init__(self, video_path, target_frames=50, clip_duration=2.0, clip_frames=16, with_clips=True,
+                 keyframes_only=False, max_side=None, max_clips=10, probe=None, start=None, end=None,
+                 screen_frames=0, screen_size=(224, 224)):
+        self.video_path = video_path
+        self.target_frames = target_frames
+        self.keyframes_only = keyframes_only
+        self.max_side = max_side
+        with_clips = with_clips and not keyframes_only
+
+        self.probe = probe
+        self.max_clips = max_clips
+        self.start = start
+        self.end = end
+        self.first_frame = 0
+        self.last_frame = 0
+        self.arena = None
+        self.frames = []
+        self.timestamps = []
+        self.scene_boundaries = []
+        self.scene_cuts = []
+        self.scene_scores = np.zeros(0, dtype=np.float32)
+        self.motion = np.zeros(0, dtype=np.float32)
+        self.mouth_motion = np.zeros(0, dtype=np.float32)
+        self.clips = [] if with_clips else None
+        self.clip_selection = None
+        self.screen_frames = 0 if keyframes_only else screen_frames
+        self.screen_size = tuple(screen_size)
+        self.screen = None
+        self.screen_indices = []
+        self.decode_stats = new_read_stats()
+        self.build_ms = 0.0
+
+        start = time.perf_counter()
+        try:
+            self._build(clip_duration, clip_frames, with_clips)
+        except Exception:
+            self.close()
+            raise
+        self.build_ms = (time.perf_counter() - start) * 1000
+
+    def _build(self, clip_duration, clip_frames, with_clips):
+        if self.probe is None:
+            self.probe = probe_video(self.video_path)
+        if self.probe is None:
+            return
+
+        fps = self.probe['fps']
+        if fps <= 0 or self.probe['frame_count'] <= 0:
+            return
+
+        first, last = segment_frames(self.probe, self.start, self.end)
+        self.first_frame, self.last_frame = first, last
+        if last <= first:
+            return
+
+        # Sampling plan: boundaries and a regular grid are known up front,
+        # scene-cut frames are captured when the cut is seen
+        boundaries = set(range(first, min(first + BOUNDARY_FRAMES, last)))
+        boundaries.update(range(max(first, last - BOUNDARY_FRAMES), last))
+        remaining = max(0, self.target_frames - len(boundaries))
+        grid = set(range(first, last, max(1, (last - first) // remaining))[:remaining]) if remaining else set()
+        plan = sorted(boundaries | grid)
+        next_plan = 0
+        boundary_hits = set()
+        grid_hits = set()
+
+        candidates = video_clip_indices(fps, last, clip_duration, clip_frames, last - first, first) if with_clips else []
+        selector = ClipSelector(self.max_clips)
+        assembler = ClipAssembler(candidates, selector.offer)
+
+        screen_plan = set()
+        if self.screen_frames > 0:
+            screen_plan = set(np.linspace(first, last - 1, min(self.screen_frames, last - first)).round().astype(int).tolist())
+        screen = []
+
+        cuts = []
+        scene_scores = []
+        motion = []
+        mouth_motion = []
+
+        work_size = None
+        face_scale = 1.0
+        face_box = None
+        face_stride = max(1, int(round(fps / MOUTH_DETECTIONS_PER_SECOND)))
+        prev_hsv = prev_gray = None
+        last_cut = first
+
+        if self.keyframes_only:
+            source = iter_frames_ffmpeg(self.video_path, None, self.max_side, keyframes_only=True,
+                                        stats=self.decode_stats, probe=self.probe, start_frame=first, end_frame=last)
+        else:
+            source = iter_frames(self.video_path, range(first, last), stats=self.decode_stats, max_side=self.max_side)
+
+        for frame_idx, frame in source:
+            if frame_idx >= last:
+                break
+
+            if work_size is None:
+                h, w = frame.shape[:2]
+                face_scale = min(1.0, config.INGEST_WORK_WIDTH / float(w))
+                work_size = (max(1, int(w * face_scale)), max(1, int(h * face_scale)))
+                self.arena = FrameArena(len(plan) + self.target_frames, h, w)
+
+            small = cv2.resize(frame, work_size, interpolation=cv2.INTER_AREA)
+            hsv = cv2.cvtColor(small, cv2.COLOR_BGR2HSV)
+            gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+            if not self.keyframes_only and frame_idx % face_stride == 0:
+                min_side = max(10, int(100 * face_scale))
+                face_box = largest_box(detect_faces_haar(gray, 1.1, 4, (min_side, min_side), max_side=0))
+
+            is_cut = False
+
+            if prev_hsv is not None:
+                score = content_score(prev_hsv, hsv)
+                scene_scores.append(score)
+                motion.append(float(np.mean(cv2.absdiff(prev_gray, gray))))
+
+                if not self.keyframes_only:
+                    prev_mouth, mouth = mouth_region(prev_gray, face_box), mouth_region(gray, face_box)
+                    mouth_motion.append(float(np.mean(cv2.absdiff(prev_mouth, mouth))) if mouth.size > 0 else 0.0)
+
+                if score >= config.INGEST_SCENE_THRESHOLD and frame_idx - last_cut >= config.INGEST_MIN_SCENE_FRAMES:
+                    is_cut = True
+                    cuts.append(frame_idx)
+                    last_cut = frame_idx
+
+            # Planned frames this one stands in for (exactly itself on a full decode)
+            covered = []
+            while next_plan < len(plan) and plan[next_plan] <= frame_idx:
+                covered.append(plan[next_plan])
+                next_plan += 1
+
+            if covered or (is_cut and len(cuts) <= self.target_frames):
+                self.arena.append(frame, frame_idx, frame_idx / fps)
+
+                if any(p in boundaries for p in covered):
+                    boundary_hits.add(frame_idx)
+                if any(p in grid for p in covered):
+                    grid_hits.add(frame_idx)
+
+            if frame_idx in assembler.slots:
+                assembler.add(frame_idx, clip_image(frame))
+
+            if frame_idx in screen_plan:
+                thumb = cv2.resize(frame, self.screen_size, interpolation=cv2.INTER_AREA)
+                screen.append(cv2.cvtColor(thumb, cv2.COLOR_BGR2RGB))
+                self.screen_indices.append(frame_idx)
+
+            prev_hsv, prev_gray = hsv, gray
+
+        if screen:
+            self.screen = np.stack(screen)
+
+        self.scene_scores = np.asarray(scene_scores, dtype=np.float32)
+        self.motion = np.asarray(motion, dtype=np.float32)
+        self.mouth_motion = np.asarray(mouth_motion, dtype=np.float32)
+        self.scene_cuts = cuts
+
+        if with_clips:
+            self.clips = selector.clips()
+            self.clip_selection = selector.summary()
+
+        if self.arena is not None:
+            self._select_frames(first, cuts, boundary_hits, grid_hits)
+
+    def _select_frames(self, first, cuts, boundaries, grid):
+        # Same priorities as smart_frame_extraction: scene starts and
+        # boundaries first, then an even spread of grid frames up to target
+        captured = self.arena.frame_indices
+        scene_frames = [first] + cuts if cuts else []
+
+        chosen = (set(scene_frames) | boundaries) & set(captured)
+        need = self.target_frames - len(chosen)
+
+        if need > 0:
+            fill = sorted((grid & set(captured)) - chosen)
+            if len(fill) > need:
+                fill = [fill[i] for i in np.linspace(0, len(fill) - 1, need).round().astype(int)]
+            chosen.update(fill)
+
+        # Too many scene starts and boundaries: thin them evenly over the whole range
+        chosen = sorted(chosen)
+        if len(chosen) > self.target_frames:
+            chosen = [chosen[i] for i in np.linspace(0, len(chosen) - 1, self.target_frames).round().astype(int)]
+        slot_of = {frame_idx: slot for slot, frame_idx in enumerate(captured)}
+        self.arena.compact([slot_of[frame_idx] for frame_idx in chosen])
+
+        self.frames = self.arena.refs()
+        self.timestamps = list(self.arena.timestamps)
+        kept = set(chosen)
+        self.scene_boundaries = [idx for idx in scene_frames if idx in kept]
+
+    def frame_data(self):
+        """Sampled frames in the same shape as smart_frame_extraction(in_memory=True)"""
+        return {
+            'frames': self.frames,
+            'timestamps': self.timestamps,
+            'scene_boundaries': self.scene_boundaries,
+            'face_frames': [],
+            'total_extracted': len(self.frames),
+            'decode_stats': self.decode_stats,
+            'arena': self.arena
+        }
+
+    def summary(self):
+        return {
+            'decoded_frames': self.decode_stats['decoded'],
+            'sampled_frames': len(self.frames),
+            'scene_cuts': len(self.scene_cuts),
+            'clips': len(self.clips) if self.clips is not None else 0,
+            'screen_frames': len(self.screen_indices),
+            'keyframes_only': self.keyframes_only,
+            'first_frame': self.first_frame,
+            'last_frame': self.last_frame,
+            'decode_ms': round(self.decode_stats['decode_ms'], 1),
+            'build_ms': round(self.build_ms, 1)
+        }
+
+    def close(self):
+        if self.arena is not None:
+            self.arena.close()
+        self.clips = None
+        self.screen = None
+        self.frames = []
+
+
+def ingest_video(video_path, target_frames=50, clip_duration=2.0, clip_frames=16, with_clips=True,
+                 keyframes_only=False, max_side=None, max_clips=10, probe=None, start=None, end=None,
+                 screen_frames=0, screen_size=(224, 224)):
+    """VideoIngest for video_path, or None when the single pass could not sample any frames"""
+    if keyframes_only and not ffmpeg_available():
+        print("  FFmpeg not found - decoding every frame instead of keyframes only")
+        keyframes_only = False
+
+    try:
+        ingest = VideoIngest(video_path, target_frames, clip_duration, clip_frames, with_clips,
+                             keyframes_only, max_side, max_clips, probe, start, end, screen_frames, screen_size)
+
+        if len(ingest.frames) == 0:
+            ingest.close()
+            return None
+
+        return ingest
+
+    except Exception as e:
+        print(f"Video ingest error: {e}")
+        return None
@@ -3,9 +3,10 @@ import json
 import subprocess
 import os
 from datetime import datetime
+from models.video.frame_reader import probe_video
 
 
-def analyze_video_metadata(video_path):
+def analyze_video_metadata(video_path, probe=None, start=None, end=None):
     try:
         results = {
             'score': 0.0,
@@ -17,27 +18,29 @@ def analyze_video_metadata(video_path):
             'resolution_changes': False
         }
         
-        cap = cv2.VideoCapture(video_path)
+        # The video ingest pass already opened the file; reuse its probe
+        if probe is None:
+            probe = probe_video(video_path)
         
-        if not cap.isOpened():
+        if probe is None:
             return {'score': 0.5, 'error': 'Cannot open video'}
         
-        fps = cap.get(cv2.CAP_PROP_FPS)
-        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        codec = int(cap.get(cv2.CAP_PROP_FOURCC))
-        codec_str = "".join([chr((codec >> 8 * i) & 0xFF) for i in range(4)])
-        
         results['metadata'] = {
-            'fps': fps,
-            'frame_count': frame_count,
-            'resolution': f"{width}x{height}",
-            'codec': codec_str,
-            'duration_seconds': frame_count / fps if fps > 0 else 0
+            'fps': probe['fps'],
+            'frame_count': probe['frame_count'],
+            'resolution': f"{probe['width']}x{probe['height']}",
+            'codec': probe['codec'],
+            'duration_seconds': probe['duration_seconds']
         }
         
-        cap.release()
+        # Container checks cover the whole file; the segment records what the other layers saw
+        if start is not None or end is not None:
+            end_seconds = min(end, probe['duration_seconds']) if end is not None else probe['duration_seconds']
+            results['metadata']['segment'] = {
+                'start_seconds': start or 0.0,
+                'end_seconds': end_seconds,
+                'duration_seconds': max(0.0, end_seconds - (start or 0.0))
+            }
         
         ffprobe_data = get_ffprobe_metadata(video_path)
         
@@ -0,0 +1,199 @@
+import time
+import cv2
+import numpy as np
+
+import config
+from models.video.frame_store import read_gray
+
+
+# Frame regions as (top, bottom, left, right) fractions of the frame
+REGIONS = {
+    'center': (0.25, 0.75, 0.25, 0.75),
+    'torso': (1 / 3.0, 1.0, 0.0, 1.0),
+    'mouth': (0.5, 0.8, 0.3, 0.7)
+}
+
+# Side of the thumbnails compared by the structural change check
+STRUCTURE_SIZE = 128
+STRUCTURE_THRESHOLD = 30
+
+SSIM_C1 = (0.01 * 255) ** 2
+SSIM_C2 = (0.03 * 255) ** 2
+
+
+def region_of(image, region=None):
+    if region is None:
+        return image
+
+    top, bottom, left, right = REGIONS[region]
+    h, w = image.shape[:2]
+    return image[int(h * top):int(h * bottom), int(w * left):int(w * right)]
+
+
+def ssim(a, b):
+    """Mean SSIM of two grayscale images (11x11 Gaussian window)"""
+    a = a.astype(np.float32)
+    b = b.astype(np.float32)
+
+    mu_a = cv2.GaussianBlur(a, (11, 11), 1.5)
+    mu_b = cv2.GaussianBlur(b, (11, 11), 1.5)
+    var_a = cv2.GaussianBlur(a * a, (11, 11), 1.5) - mu_a * mu_a
+    var_b = cv2.GaussianBlur(b * b, (11, 11), 1.5) - mu_b * mu_b
+    cov = cv2.GaussianBlur(a * b, (11, 11), 1.5) - mu_a * mu_b
+
+    ssim_map = ((2 * mu_a * mu_b + SSIM_C1) * (2 * cov + SSIM_C2)) / \
+        ((mu_a * mu_a + mu_b * mu_b + SSIM_C1) * (var_a + var_b + SSIM_C2))
+
+    return float(ssim_map.mean())
+
+
+class MotionEngine:
+    """
+    Motion statistics between consecutive sampled frames, computed once per
+    pair and shared by the temporal, physiological and boundary layers.
+
+    Optical flow is DIS on grayscale frames downscaled to MOTION_WORK_WIDTH.
+    Flow magnitudes are scaled back to full-resolution pixels, so thresholds
+    tuned on full-size Farneback flow still apply. Frame differences and
+    histograms use the full-resolution grayscale frames. Pair i is
+    (frame i, frame i + 1); a statistic is None when either frame is unreadable.
+    """
+
+    def __init__(self, frame_paths, work_width=None):
+        self.frame_paths = list(frame_paths)
+        self.work_width = work_width or config.MOTION_WORK_WIDTH
+        self.flow_ms = 0.0
+
+        self._pairs = {}
+        self._small = {}
+        self._hist = {}
+        self._recent = {}
+        self._scale = 1.0
+        self._dis = None
+
+    def __len__(self):
+        return max(0, len(self.frame_paths) - 1)
+
+    @staticmethod
+    def _recent_frame(cache, i, compute):
+        # Pairs are walked in order, so the last two frames cover every read
+        if i not in cache:
+            if len(cache) >= 2:
+                del cache[min(cache)]
+            cache[i] = compute(i)
+        return cache[i]
+
+    def _gray(self, i):
+        return self._recent_frame(self._recent, i, lambda i: read_gray(self.frame_paths[i]))
+
+    def _small_gray(self, i):
+        return self._recent_frame(self._small, i, self._downscale)
+
+    def _downscale(self, i):
+        gray = self._gray(i)
+
+        if gray is not None:
+            h, w = gray.shape
+            self._scale = min(1.0, self.work_width / float(w))
+            if self._scale < 1.0:
+                size = (max(1, int(w * self._scale)), max(1, int(h * self._scale)))
+                gray = cv2.resize(gray, size, interpolation=cv2.INTER_AREA)
+
+        return gray
+
+    def _pair(self, i):
+        if i not in self._pairs:
+            self._pairs[i] = {}
+        return self._pairs[i]
+
+    def _compute_flow(self, i):
+        pair = self._pair(i)
+        prev, curr = self._small_gray(i), self._small_gray(i + 1)
+
+        if prev is None or curr is None or prev.shape != curr.shape:
+            pair['flow'] = pair['center_flow'] = None
+            return pair
+
+        if self._dis is None:
+            self._dis = cv2.DISOpticalFlow_create(cv2.DISOPTICAL_FLOW_PRESET_MEDIUM)
+
+        start = time.perf_counter()
+        flow = self._dis.calc(prev, curr, None)
+        self.flow_ms += (time.perf_counter() - start) * 1000
+
+        magnitude = np.sqrt(flow[..., 0] ** 2 + flow[..., 1] ** 2) / self._scale
+        pair['flow'] = float(np.mean(magnitude))
+        pair['center_flow'] = float(np.mean(region_of(magnitude, 'center')))
+        return pair
+
+    def _compute_stats(self, i):
+        pair = self._pair(i)
+        prev, curr = self._gray(i), self._gray(i + 1)
+
+        if prev is None or curr is None or prev.shape != curr.shape:
+            pair['diff'] = None
+            return pair
+
+        diff = cv2.absdiff(prev, curr)
+        pair['diff'] = {region: float(np.mean(region_of(diff, region))) for region in (None,) + tuple(REGIONS)}
+
+        prev_small, curr_small = self._small_gray(i), self._small_gray(i + 1)
+        pair['ssim'] = ssim(prev_small, curr_small)
+
+        pair['hist_correlation'] = float(cv2.compareHist(self._histogram(i), self._histogram(i + 1), cv2.HISTCMP_CORREL))
+
+        size = (STRUCTURE_SIZE, STRUCTURE_SIZE)
+        structure = cv2.absdiff(cv2.resize(prev, size), cv2.resize(curr, size))
+        pair['structural_change'] = float(np.count_nonzero(structure > STRUCTURE_THRESHOLD) / structure.size)
+        return pair
+
+    def _histogram(self, i):
+        return self._recent_frame(self._hist, i, self._compute_histogram)
+
+    def _compute_histogram(self, i):
+        hist = cv2.calcHist([self._gray(i)], [0], None, [256], [0, 256])
+        return cv2.normalize(hist, hist).flatten()
+
+    def _stat(self, i, key):
+        pair = self._pair(i)
+        if 'diff' not in pair:
+            self._compute_stats(i)
+        return pair.get(key)
+
+    def flow_magnitude(self, i, region=None):
+        """Mean optical flow magnitude of pair i in full-resolution pixels; region is None or 'center'"""
+        pair = self._pair(i)
+        if 'flow' not in pair:
+            self._compute_flow(i)
+        return pair['center_flow'] if region == 'center' else pair['flow']
+
+    def diff_mean(self, i, region=None):
+        """Mean absolute grayscale difference of pair i over region (None is the whole frame)"""
+        diff = self._stat(i, 'diff')
+        return diff[region] if diff is not None else None
+
+    def hist_correlation(self, i):
+        return self._stat(i, 'hist_correlation')
+
+    def ssim(self, i):
+        return self._stat(i, 'ssim')
+
+    def structural_change(self, i):
+        """Share of STRUCTURE_SIZE thumbnail pixels that changed by more than STRUCTURE_THRESHOLD"""
+        return self._stat(i, 'structural_change')
+
+    def flow_magnitudes(self, region=None):
+        magnitudes = (self.flow_magnitude(i, region) for i in range(len(self)))
+        return [m for m in magnitudes if m is not None]
+
+    def diff_means(self, region=None):
+        diffs = (self.diff_mean(i, region) for i in range(len(self)))
+        return [d for d in diffs if d is not None]
+
+    def summary(self):
+        return {
+            'pairs': len(self),
+            'flow_pairs': sum(1 for pair in self._pairs.values() if pair.get('flow') is not None),
+            'flow_ms': round(self.flow_ms, 1),
+            'work_width': self.work_width
+        }
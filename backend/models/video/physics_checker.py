@@ -2,7 +2,7 @@ import cv2
 import numpy as np
 import torch
 from PIL import Image
-import os
+from models.video.frame_store import frame_exists, read_bgr, read_gray, read_rgb
 
 
 _midas_model = None
@@ -80,10 +80,10 @@ def analyze_lighting_consistency(frame_paths):
         lighting_values = []
         
         for frame_path in frame_paths:
-            if not os.path.exists(frame_path):
+            if not frame_exists(frame_path):
                 continue
             
-            image = cv2.imread(frame_path)
+            image = read_bgr(frame_path)
             if image is None or image.size == 0:
                 continue
             
@@ -122,7 +122,7 @@ def analyze_depth_consistency(frame_paths):
         depth_maps = []
         
         for frame_path in frame_paths[:10]:
-            if not os.path.exists(frame_path):
+            if not frame_exists(frame_path):
                 continue
             
             depth = estimate_depth_midas(frame_path)
@@ -162,11 +162,11 @@ def estimate_depth_midas(frame_path):
         if midas is None:
             return None
         
-        if not os.path.exists(frame_path):
+        if not frame_exists(frame_path):
             print(f"Frame path does not exist: {frame_path}")
             return None
         
-        img = cv2.imread(frame_path)
+        img = read_bgr(frame_path)
         
         if img is None:
             print(f"Failed to load image: {frame_path}")
@@ -180,7 +180,7 @@ def estimate_depth_midas(frame_path):
             print(f"Empty image dimensions: {img.shape}")
             return None
         
-        img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+        img_rgb = read_rgb(frame_path)
         
         input_batch = transform(img_rgb).to(device)
         
@@ -209,15 +209,13 @@ def analyze_shadows(frame_paths):
         shadow_directions = []
         
         for frame_path in frame_paths:
-            if not os.path.exists(frame_path):
+            if not frame_exists(frame_path):
                 continue
             
-            image = cv2.imread(frame_path)
-            if image is None or image.size == 0:
+            gray = read_gray(frame_path)
+            if gray is None or gray.size == 0:
                 continue
             
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-            
             _, shadow_mask = cv2.threshold(gray, 80, 255, cv2.THRESH_BINARY_INV)
             
             contours, _ = cv2.findContours(shadow_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
@@ -6,19 +6,28 @@ Analyzes biological signals that are hard to fake:
 - Eye movements
 - Breathing patterns
 """
-import cv2
 import numpy as np
 from scipy import signal, fftpack
 from PIL import Image
+import config
+from models.face_detectors import detect_faces_dnn_batch, detect_faces_haar, largest_box
+from models.video.frame_store import read_bgr
+from models.video.motion_engine import MotionEngine
 
 
-def analyze_physiological_signals(frame_paths, fps=30):
+# Face data read from the per-video FaceTrackStore
+FACE_ATTRIBUTES = ('landmarks', 'crops')
+
+
+def analyze_physiological_signals(frame_paths, fps=30, face_store=None, motion=None):
     """
     Analyze physiological signals from video frames
     
     Args:
         frame_paths: List of frame paths
         fps: Frame rate of video
+        face_store: Shared FaceTrackStore for the frames (faces detected here if None)
+        motion: Shared MotionEngine for the frames (built here if None)
     
     Returns:
         dict: {
@@ -38,7 +47,7 @@ def analyze_physiological_signals(frame_paths, fps=30):
         }
         
         # 1. rPPG Heartbeat Detection
-        heartbeat_result = detect_heartbeat_rppg(frame_paths, fps)
+        heartbeat_result = detect_heartbeat_rppg(frame_paths, fps, face_store)
         results['heartbeat_detected'] = heartbeat_result['detected']
         results['heartbeat_bpm'] = heartbeat_result.get('bpm', 0)
         
@@ -50,7 +59,8 @@ def analyze_physiological_signals(frame_paths, fps=30):
             results['score'] += 0.25
         
         # 2. Blink Pattern Analysis
-        blink_result = analyze_blink_pattern(frame_paths, fps)
+        landmark_track = face_store.landmarks if face_store is not None else None
+        blink_result = analyze_blink_pattern(frame_paths, fps, landmark_track)
         results['blink_pattern_natural'] = blink_result['natural']
         results['blink_count'] = blink_result.get('count', 0)
         
@@ -59,7 +69,7 @@ def analyze_physiological_signals(frame_paths, fps=30):
             results['score'] += 0.3
         
         # 3. Breathing Detection (if torso visible)
-        breathing_result = detect_breathing(frame_paths)
+        breathing_result = detect_breathing(frame_paths, motion)
         results['breathing_detected'] = breathing_result['detected']
         
         if not breathing_result['detected'] and len(frame_paths) > 30:
@@ -79,14 +89,14 @@ def analyze_physiological_signals(frame_paths, fps=30):
         }
 
 
-def detect_heartbeat_rppg(frame_paths, fps):
+def detect_heartbeat_rppg(frame_paths, fps, face_store=None):
     """
     Detect heartbeat using remote PPG (photoplethysmography)
     Analyzes subtle color changes in face due to blood flow
     """
     try:
         # Extract facial ROI from frames
-        face_regions = extract_face_regions(frame_paths)
+        face_regions = extract_face_regions(frame_paths, face_store)
         
         if len(face_regions) < 30:  # Need at least ~1 second
             return {'detected': False, 'reason': 'Insufficient frames with faces'}
@@ -172,10 +182,18 @@ def detect_heartbeat_rppg(frame_paths, fps):
         return {'detected': False, 'error': str(e)}
 
 
-def extract_face_regions(frame_paths):
+def extract_face_regions(frame_paths, face_store=None):
     """Extract facial regions from frames"""
     try:
+        if face_store is not None and 'crops' in face_store.attributes:
+            return face_store.crops
+        
+
         # Use OpenCV directly - more reliable for video processing
+        face_regions = extract_face_regions_dnn(frame_paths)
+        if face_regions is not None:
+            return face_regions
+        
         return extract_face_regions_opencv(frame_paths)
         
     except Exception as e:
@@ -183,27 +201,48 @@ def extract_face_regions(frame_paths):
         return []
 
 
+def extract_face_regions_dnn(frame_paths):
+    """Batched res10 DNN face crops; None when the DNN model is unavailable"""
+    try:
+        face_regions = []
+        
+        for start in range(0, len(frame_paths), config.FACE_DNN_BATCH_SIZE):
+            images = [read_bgr(frame_path) for frame_path in frame_paths[start:start + config.FACE_DNN_BATCH_SIZE]]
+            detections = detect_faces_dnn_batch(images)
+            
+            if detections is None:
+                return None
+            
+            for image, faces in zip(images, detections):
+                if faces:
+                    x, y, w, h = faces[0][0]
+                    face_regions.append(image[y:y+h, x:x+w])
+                else:
+                    face_regions.append(None)
+        
+        return face_regions
+        
+    except Exception as e:
+        print(f"DNN face region extraction error: {e}")
+        return None
+
+
 def extract_face_regions_opencv(frame_paths):
     """OpenCV fallback for face region extraction"""
     try:
-        face_cascade = cv2.CascadeClassifier(
-            cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
-        )
-        
         face_regions = []
         
         for frame_path in frame_paths:
-            image = cv2.imread(frame_path)
+            image = read_bgr(frame_path)
             if image is None:
                 face_regions.append(None)
                 continue
             
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-            faces = face_cascade.detectMultiScale(gray, 1.1, 4, minSize=(30, 30))
+            box = largest_box(detect_faces_haar(image, 1.1, 4, (30, 30)))
             
-            if len(faces) > 0:
+            if box is not None:
                 # Use largest face
-                x, y, w, h = max(faces, key=lambda f: f[2] * f[3])
+                x, y, w, h = box
                 face_roi = image[y:y+h, x:x+w]
                 face_regions.append(face_roi)
             else:
@@ -215,70 +254,27 @@ def extract_face_regions_opencv(frame_paths):
         return []
 
 
-def analyze_blink_pattern(frame_paths, fps):
+def analyze_blink_pattern(frame_paths, fps, landmark_track=None):
     """
     Analyze blink patterns
     Natural blinking: 15-20 times per minute, duration 100-400ms
     """
     try:
-        # Try MediaPipe Tasks API with proper initialization
+        # Landmarks come from the per-video MediaPipe landmark track
         try:
-            from mediapipe.tasks import python
-            from mediapipe.tasks.python import vision
-            import mediapipe as mp
-            import os
-            
-            # Path to face landmarker model
-            model_dir = os.path.join(os.path.dirname(__file__), '..', '..', 'models_cache')
-            face_landmarker_model = os.path.join(model_dir, 'face_landmarker.task')
-            
-            if not os.path.exists(face_landmarker_model):
-                raise Exception("Face landmarker model not found")
-            
-            # Proper initialization matching face_analyzer.py
-            base_options = python.BaseOptions(
-                model_asset_path=face_landmarker_model,
-                delegate=python.BaseOptions.Delegate.CPU
-            )
-            
-            options = vision.FaceLandmarkerOptions(
-                base_options=base_options,
-                running_mode=vision.RunningMode.IMAGE,
-                output_face_blendshapes=False,
-                output_facial_transformation_matrixes=False,
-                num_faces=1,
-                min_face_detection_confidence=0.5,
-                min_face_presence_confidence=0.5,
-                min_tracking_confidence=0.5
-            )
+            if landmark_track is None:
+                from models.landmark_service import track_frame_landmarks
+                
+                landmark_track = track_frame_landmarks(frame_paths, [i / fps for i in range(len(frame_paths))])
             
-            landmarker = vision.FaceLandmarker.create_from_options(options)
+            if landmark_track is None:
+                raise Exception("Face landmarker not available")
             
             # Track Eye Aspect Ratio (EAR) across frames
-            ear_values = []
-            
-            for frame_path in frame_paths:
-                image = cv2.imread(frame_path)
-                if image is None:
-                    ear_values.append(None)
-                    continue
-                
-                rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-                mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=rgb_image)
-                
-                try:
-                    detection_result = landmarker.detect(mp_image)
-                    
-                    if detection_result.face_landmarks:
-                        landmarks = detection_result.face_landmarks[0]
-                        ear = calculate_eye_aspect_ratio_tasks(landmarks)
-                        ear_values.append(ear)
-                    else:
-                        ear_values.append(None)
-                except Exception:
-                    ear_values.append(None)
-            
-            landmarker.close()
+            ear_values = [
+                float(ear) if present else None
+                for ear, present in zip(landmark_track.eye_aspect_ratio(), landmark_track.present)
+            ]
             
             if len([e for e in ear_values if e is not None]) < 10:
                 return {'natural': True, 'reason': 'Insufficient data'}
@@ -324,74 +320,6 @@ def analyze_blink_pattern(frame_paths, fps):
         return {'natural': True, 'error': str(e)}
 
 
-def calculate_eye_aspect_ratio_tasks(face_landmarks):
-    """Calculate Eye Aspect Ratio (EAR) for Tasks API landmarks"""
-    # Left eye landmarks
-    left_eye = [33, 160, 158, 133, 153, 144]
-    # Right eye landmarks
-    right_eye = [362, 385, 387, 263, 373, 380]
-    
-    def eye_aspect_ratio(eye_points):
-        if any(idx >= len(face_landmarks) for idx in eye_points):
-            return 0.3  # Default value
-        
-        # Vertical distances
-        v1 = np.linalg.norm(np.array([face_landmarks[eye_points[1]].x,
-                                      face_landmarks[eye_points[1]].y]) -
-                           np.array([face_landmarks[eye_points[5]].x,
-                                    face_landmarks[eye_points[5]].y]))
-        v2 = np.linalg.norm(np.array([face_landmarks[eye_points[2]].x,
-                                      face_landmarks[eye_points[2]].y]) -
-                           np.array([face_landmarks[eye_points[4]].x,
-                                    face_landmarks[eye_points[4]].y]))
-        # Horizontal distance
-        h = np.linalg.norm(np.array([face_landmarks[eye_points[0]].x,
-                                     face_landmarks[eye_points[0]].y]) -
-                          np.array([face_landmarks[eye_points[3]].x,
-                                   face_landmarks[eye_points[3]].y]))
-        
-        if h == 0:
-            return 0.3
-        
-        return (v1 + v2) / (2.0 * h)
-    
-    left_ear = eye_aspect_ratio(left_eye)
-    right_ear = eye_aspect_ratio(right_eye)
-    
-    return (left_ear + right_ear) / 2.0
-
-
-def calculate_eye_aspect_ratio(face_landmarks):
-    """Calculate Eye Aspect Ratio (EAR)"""
-    # Left eye landmarks
-    left_eye = [33, 160, 158, 133, 153, 144]
-    # Right eye landmarks
-    right_eye = [362, 385, 387, 263, 373, 380]
-    
-    def eye_aspect_ratio(eye_points):
-        # Vertical distances
-        v1 = np.linalg.norm(np.array([face_landmarks.landmark[eye_points[1]].x,
-                                      face_landmarks.landmark[eye_points[1]].y]) -
-                           np.array([face_landmarks.landmark[eye_points[5]].x,
-                                    face_landmarks.landmark[eye_points[5]].y]))
-        v2 = np.linalg.norm(np.array([face_landmarks.landmark[eye_points[2]].x,
-                                      face_landmarks.landmark[eye_points[2]].y]) -
-                           np.array([face_landmarks.landmark[eye_points[4]].x,
-                                    face_landmarks.landmark[eye_points[4]].y]))
-        # Horizontal distance
-        h = np.linalg.norm(np.array([face_landmarks.landmark[eye_points[0]].x,
-                                     face_landmarks.landmark[eye_points[0]].y]) -
-                          np.array([face_landmarks.landmark[eye_points[3]].x,
-                                   face_landmarks.landmark[eye_points[3]].y]))
-        
-        return (v1 + v2) / (2.0 * h)
-    
-    left_ear = eye_aspect_ratio(left_eye)
-    right_ear = eye_aspect_ratio(right_eye)
-    
-    return (left_ear + right_ear) / 2.0
-
-
 def detect_blinks(ear_values, threshold, fps):
     """Detect blinks from EAR sequence"""
     blinks = []
@@ -420,33 +348,16 @@ def detect_blinks(ear_values, threshold, fps):
     return blinks
 
 
-def detect_breathing(frame_paths):
+def detect_breathing(frame_paths, motion=None):
     """
     Detect breathing motion (chest/shoulder movement)
     """
     try:
-        # Simple motion detection in torso region
-        prev_frame = None
-        motion_values = []
+        if motion is None:
+            motion = MotionEngine(frame_paths)
         
-        for frame_path in frame_paths:
-            frame = cv2.imread(frame_path)
-            if frame is None:
-                continue
-            
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            
-            # Focus on lower 2/3 of frame (torso area)
-            h, w = gray.shape
-            torso_region = gray[h//3:, :]
-            
-            if prev_frame is not None:
-                # Calculate frame difference in torso region
-                diff = cv2.absdiff(prev_frame, torso_region)
-                motion = np.mean(diff)
-                motion_values.append(motion)
-            
-            prev_frame = torso_region
+        # Frame difference in the lower 2/3 of the frame (torso area)
+        motion_values = motion.diff_means('torso')
         
         if len(motion_values) < 10:
             return {'detected': False, 'reason': 'Insufficient frames'}
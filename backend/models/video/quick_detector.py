@@ -1,10 +1,16 @@
 import os
-from PIL import Image
+import time
 import numpy as np
+import config
 from models.progress_tracker import get_progress_tracker
 
 from models.video.metadata_analyzer import analyze_video_metadata
 from models.video.frame_extractor import smart_frame_extraction
+from models.video.frame_dedup import FrameDedup
+from models.video.frame_store import open_pil
+from models.video.ingest import ingest_video
+from models.video.frame_reader import probe_video, segment_frames
+from models.video.scheduler import plan_video
 
 from models.ensemble_detector import predict_ensemble
 from models.face_analyzer import analyze_face
@@ -14,6 +20,16 @@ from models.video.video_3d_model import analyze_with_3d_model
 
 from models.video.audio_analyzer import analyze_audio_stream
 
+from models.video import temporal_analyzer, audio_analyzer
+from models.video.face_track_store import FaceTrackStore
+from models.video.motion_engine import MotionEngine
+
+# The per-frame face analysis reuses tracked landmarks from the face store
+FRAME_FACE_ATTRIBUTES = ('landmarks',)
+
+# Quick mode has only one optional layer for the scheduler to drop
+QUICK_OPTIONAL_LAYERS = ('3d_video',)
+
 
 def convert_numpy_types(obj):
     if isinstance(obj, dict):
@@ -32,8 +48,10 @@ def convert_numpy_types(obj):
         return obj
 
 
-def analyze_video_quick(video_path, output_dir="temp_frames"):
+def analyze_video_quick(video_path, output_dir="temp_frames", budget_ms=None, start=None, end=None, keyframes_only=None):
     tracker = get_progress_tracker()
+    frame_data = None
+    ingest = None
     
     try:
         print(f"\n{'='*60}")
@@ -54,10 +72,44 @@ def analyze_video_quick(video_path, output_dir="temp_frames"):
             'method_breakdown': {}
         }
         
+        if keyframes_only is None:
+            keyframes_only = config.QUICK_KEYFRAMES_ONLY
+        
+        # Frame count, clip count and the 3D layer fitted to budget_ms
+        probe = probe_video(video_path)
+        frame_range = segment_frames(probe, start, end) if probe else None
+        if frame_range is not None and frame_range[1] <= frame_range[0]:
+            tracker.update("Segment is outside the video")
+            return {'error': 'Segment is outside the video', 'final_score': 0.5}
+        
+        schedule = plan_video(probe, budget_ms, QUICK_OPTIONAL_LAYERS, frame_range=frame_range)
+        if budget_ms is not None:
+            print(f"Budget {budget_ms:.0f} ms: {schedule.target_frames} frames, {schedule.max_clips} clips, skipping {sorted(schedule.skipped) or 'nothing'}")
+        
+        # One decode of the whole video feeds sampling, scene cuts, 3D clips and motion traces
+        print("Ingesting video (single decode pass)...")
+        tracker.update("Decoding video...")
+        ingest = ingest_video(
+            video_path, target_frames=schedule.target_frames, clip_duration=2.0,
+            with_clips=schedule.runs('3d_video'),
+            keyframes_only=keyframes_only or schedule.keyframes_only,
+            max_side=config.QUICK_DECODE_MAX_SIDE, max_clips=schedule.max_clips, probe=probe, start=start, end=end
+        )
+        if ingest is not None:
+            schedule.record('decode', ingest.build_ms, ingest.decode_stats['decoded'] * schedule.megapixels)
+            results['ingest'] = ingest.summary()
+            print(f"  Decoded {ingest.decode_stats['decoded']} frames in {ingest.build_ms:.0f} ms ({len(ingest.scene_cuts)} scene cuts)")
+            
+            # Keyframe ingest builds no clips; decoding them separately would undo the cheap pass
+            if ingest.keyframes_only and schedule.runs('3d_video'):
+                schedule.skip('3d_video', 'keyframes only: clips would need a full decode')
+        
         print("LAYER 1: Metadata Analysis...")
         tracker.update("LAYER 1: Analyzing metadata...")
-        metadata_result = analyze_video_metadata(video_path)
+        metadata_result = analyze_video_metadata(video_path, probe=ingest.probe if ingest else None, start=start, end=end)
         results['layer1_metadata'] = metadata_result
+        if 'segment' in metadata_result.get('metadata', {}):
+            results['segment'] = metadata_result['metadata']['segment']
         
         has_audio = metadata_result.get('has_audio', False)
         print(f"LAYER 1: Metadata Analysis")
@@ -67,7 +119,13 @@ def analyze_video_quick(video_path, output_dir="temp_frames"):
         
         print(f"\nLAYER 2A: Smart Frame Extraction")
         tracker.update("LAYER 2A: Extracting key frames...")
-        frame_data = smart_frame_extraction(video_path, output_dir, target_frames=50)
+        if ingest is not None:
+            frame_data = ingest.frame_data()
+        else:
+            frame_data = smart_frame_extraction(
+                video_path, output_dir, target_frames=schedule.target_frames, detect_faces=False, in_memory=True,
+                start=start, end=end
+            )
         
         if not frame_data or len(frame_data['frames']) == 0:
             tracker.update("Failed to extract frames")
@@ -79,9 +137,26 @@ def analyze_video_quick(video_path, output_dir="temp_frames"):
         frame_paths = frame_data['frames']
         timestamps = frame_data['timestamps']
         print(f"  Extracted {len(frame_paths)} frames")
-        print(f"  Faces: {len(frame_data.get('face_frames', []))}")
+        if frame_data.get('arena') is not None:
+            results['frame_arena'] = {
+                'frames': len(frame_data['arena']),
+                'mb': round(frame_data['arena'].nbytes() / (1024 * 1024), 1),
+                'memmap': frame_data['arena'].memmap_path is not None
+            }
         tracker.update(f"Extracted {len(frame_paths)} frames")
         
+        # Faces are detected once per video; each layer reads what it declared
+        face_layers = [temporal_analyzer]
+        if has_audio:
+            face_layers.append(audio_analyzer)
+        face_store = FaceTrackStore.for_layers(frame_paths, timestamps, face_layers, extra=FRAME_FACE_ATTRIBUTES)
+        schedule.record('face_track', face_store.build_ms, len(frame_paths))
+        results['face_track'] = face_store.summary()
+        print(f"  Faces: {len(face_store.face_frames)} ({face_store.detector or 'none'}, {face_store.build_ms:.0f} ms)")
+        
+        # Optical flow and frame differences are computed once per frame pair
+        motion = MotionEngine(frame_paths)
+        
         print(f"\nLAYER 2A: Frame-Based Analysis")
         tracker.update("Analyzing frames with AI models...")
         
@@ -94,27 +169,47 @@ def analyze_video_quick(video_path, output_dir="temp_frames"):
             'avg_frequency': 0.0
         }
         
-        for idx, frame_path in enumerate(frame_paths):
+        ensemble_scores, face_scores, frequency_scores = {}, {}, {}
+        face_ms = []
+        layer_start = time.perf_counter()
+        
+        # Near-duplicate frames share their representative's scores
+        dedup = FrameDedup(frame_paths)
+        unique = len(dedup.representatives)
+        
+        for done, idx in enumerate(dedup.representatives, 1):
             try:
-                img = Image.open(frame_path).convert('RGB')
+                img = open_pil(frame_paths[idx])
                 
                 ensemble_result = predict_ensemble(img, silent=True)
-                frame_results['ensemble_scores'].append(ensemble_result.get('score', 0.5))
+                ensemble_scores[idx] = ensemble_result.get('score', 0.5)
                 
-                face_result = analyze_face(img)
-                if face_result.get('face_detected', False):
-                    frame_results['face_scores'].append(face_result.get('score', 0.5))
+                if face_store.has_face(idx) or face_store.detector is None:
+                    face_result = analyze_face(img, face_store.pixel_landmarks(idx))
+                    if face_result.get('face_detected', False):
+                        face_scores[idx] = face_result.get('score', 0.5)
+                    if 'timings' in face_result:
+                        face_ms.append(face_result['timings'].get('total_ms', face_result['timings']['detect_ms']))
                 
                 freq_result = analyze_frequency_domain(img)
-                frame_results['frequency_scores'].append(freq_result.get('score', 0.5))
+                frequency_scores[idx] = freq_result.get('score', 0.5)
                 
-                if (idx + 1) % 10 == 0:
-                    print(f"  Processed {idx + 1}/{len(frame_paths)} frames")
-                    tracker.update(f"Processed {idx + 1}/{len(frame_paths)} frames")
+                if done % 10 == 0:
+                    print(f"  Processed {done}/{unique} unique frames")
+                    tracker.update(f"Processed {done}/{unique} unique frames")
                     
             except Exception:
                 continue
         
+        layer_ms = (time.perf_counter() - layer_start) * 1000
+        schedule.record('frame_based', layer_ms, len(frame_paths))
+        
+        frame_results['ensemble_scores'] = dedup.broadcast(ensemble_scores)
+        frame_results['face_scores'] = dedup.broadcast(face_scores)
+        frame_results['frequency_scores'] = dedup.broadcast(frequency_scores)
+        results['frame_dedup'] = dedup.summary(layer_ms)
+        print(f"  Dedup: {unique}/{len(frame_paths)} unique frames ({results['frame_dedup']['dedup_ratio']:.0%} skipped)")
+        
         if frame_results['ensemble_scores']:
             frame_results['avg_ensemble'] = np.mean(frame_results['ensemble_scores'])
             frame_results['max_ensemble'] = np.max(frame_results['ensemble_scores'])
@@ -125,6 +220,10 @@ def analyze_video_quick(video_path, output_dir="temp_frames"):
         if frame_results['frequency_scores']:
             frame_results['avg_frequency'] = np.mean(frame_results['frequency_scores'])
         
+        if face_ms:
+            frame_results['avg_face_ms'] = float(np.mean(face_ms))
+            print(f"  Face analysis: {frame_results['avg_face_ms']:.1f} ms/frame over {len(face_ms)} frames")
+        
         results['layer2a_frame_based'] = frame_results
         
         print(f"  Avg: {frame_results['avg_ensemble']:.2f}, Max: {frame_results.get('max_ensemble', 0):.2f}")
@@ -133,7 +232,8 @@ def analyze_video_quick(video_path, output_dir="temp_frames"):
         
         print(f"\nLAYER 2A: Temporal Consistency")
         tracker.update("Temporal: Analyzing consistency...")
-        temporal_result = analyze_temporal_consistency(frame_paths, timestamps)
+        with schedule.measure('temporal', len(frame_paths)):
+            temporal_result = analyze_temporal_consistency(frame_paths, timestamps, face_store, motion)
         results['layer2a_temporal'] = temporal_result
         
         print(f"  Score: {temporal_result.get('score', 0):.2f}")
@@ -142,16 +242,29 @@ def analyze_video_quick(video_path, output_dir="temp_frames"):
         
         print(f"\nLAYER 2A: 3D Video Model")
         tracker.update("3D Model: Running video analysis...")
-        video_3d_result = analyze_with_3d_model(video_path, clip_duration=2.0)
-        results['layer2a_3d_video'] = video_3d_result
-        
-        print(f"  Score: {video_3d_result.get('score', 0):.2f}")
-        tracker.update(f"3D Model: Score {video_3d_result.get('score', 0):.2f}")
+        if schedule.runs('3d_video'):
+            with schedule.measure('3d_video', schedule.max_clips):
+                video_3d_result = analyze_with_3d_model(
+                    video_path, clip_duration=2.0, clips=ingest.clips if ingest else None,
+                    max_clips=schedule.max_clips, start=start, end=end,
+                    clip_selection=ingest.clip_selection if ingest else None
+                )
+            results['layer2a_3d_video'] = video_3d_result
+            
+            print(f"  Score: {video_3d_result.get('score', 0):.2f}")
+            tracker.update(f"3D Model: Score {video_3d_result.get('score', 0):.2f}")
+        else:
+            print(f"  Skipped: {schedule.skipped.get('3d_video')}")
+            tracker.update(f"Skipping 3D model ({schedule.skipped.get('3d_video')})")
         
         if has_audio:
             print(f"\nLAYER 2B: Audio Analysis")
             tracker.update("LAYER 2B: Analyzing audio...")
-            audio_result = analyze_audio_stream(video_path)
+            with schedule.measure('audio', schedule.duration):
+                audio_result = analyze_audio_stream(
+                    video_path, face_store.landmarks, has_audio=True,
+                    mouth_trace=ingest.mouth_motion if ingest else None, start=start, end=end
+                )
             results['layer2b_audio'] = audio_result
             
             print(f"  Score: {audio_result.get('score', 0):.2f}")
@@ -165,6 +278,8 @@ def analyze_video_quick(video_path, output_dir="temp_frames"):
         tracker.update("Combining quick analysis results...")
         
         final_score, confidence, breakdown = quick_fusion(results)
+        results['schedule'] = schedule.summary()
+        results['motion'] = motion.summary()
         
         results['final_score'] = final_score
         results['confidence'] = confidence
@@ -191,6 +306,12 @@ def analyze_video_quick(video_path, output_dir="temp_frames"):
             'final_score': 0.5,
             'risk_level': 'Unknown'
         }
+    
+    finally:
+        if frame_data and frame_data.get('arena') is not None:
+            frame_data['arena'].close()
+        if ingest is not None:
+            ingest.close()
 
 
 def quick_fusion(results):
@@ -0,0 +1,230 @@
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+import config
+from models.video.frame_reader import ffmpeg_available
+
+
+# Prior cost per unit (ms) before any run has been measured. Units:
+#   decode          - decoded frames x megapixels
+#   audio           - seconds of video
+#   3d_video        - clips
+#   everything else - sampled frames
+DEFAULT_UNIT_COST_MS = {
+    'decode': 4.0,
+    'face_track': 15.0,
+    'frame_based': 350.0,
+    'temporal': 60.0,
+    'audio': 25.0,
+    '3d_video': 1500.0,
+    'physiological': 30.0,
+    'physics': 40.0,
+    'boundary': 10.0,
+    'compression': 15.0
+}
+
+CORE_PER_FRAME_LAYERS = ('face_track', 'frame_based', 'temporal')
+
+# Optional layers in the order they are granted budget
+OPTIONAL_LAYERS = ('3d_video', 'compression', 'boundary', 'physiological', 'physics')
+
+# Weight of a new measurement in the running per-unit cost
+COST_EMA_ALPHA = 0.3
+
+
+def resolution_bucket(megapixels):
+    if megapixels < 0.5:
+        return 'sd'
+    if megapixels < 1.5:
+        return 'hd'
+    if megapixels < 4.0:
+        return 'fhd'
+    return 'uhd'
+
+
+class LayerCostModel:
+    """
+    Per-layer cost per unit, calibrated online from measured layer timings.
+
+    Estimates are kept per resolution bucket; a bucket that has not been
+    measured yet borrows from the layer's other buckets, then from the prior.
+    """
+
+    def __init__(self, priors=None):
+        self.priors = dict(priors or DEFAULT_UNIT_COST_MS)
+        self._costs = {}
+        self._lock = threading.Lock()
+
+    def unit_cost(self, layer, megapixels):
+        bucket = resolution_bucket(megapixels)
+
+        with self._lock:
+            if (layer, bucket) in self._costs:
+                return self._costs[(layer, bucket)]['ms']
+
+            measured = [cost['ms'] for (name, _), cost in self._costs.items() if name == layer]
+
+        if measured:
+            return sum(measured) / len(measured)
+        return self.priors.get(layer, 0.0)
+
+    def estimate(self, layer, units, megapixels):
+        return self.unit_cost(layer, megapixels) * max(0.0, units)
+
+    def record(self, layer, elapsed_ms, units, megapixels):
+        if units <= 0:
+            return
+
+        key = (layer, resolution_bucket(megapixels))
+        per_unit = elapsed_ms / units
+
+        with self._lock:
+            cost = self._costs.get(key)
+            if cost is None:
+                self._costs[key] = {'ms': per_unit, 'samples': 1}
+            else:
+                cost['ms'] += COST_EMA_ALPHA * (per_unit - cost['ms'])
+                cost['samples'] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                f"{layer}:{bucket}": {'ms_per_unit': round(cost['ms'], 3), 'samples': cost['samples']}
+                for (layer, bucket), cost in sorted(self._costs.items())
+            }
+
+
+_cost_model = LayerCostModel()
+
+
+def get_cost_model():
+    return _cost_model
+
+
+class VideoSchedule:
+    """
+    Frame budget, clip count and optional layers chosen for one request.
+
+    layers maps each optional layer to whether it runs; skipped holds the
+    reason for every layer that does not. frame_range (first, last) plans
+    for that segment of the video only.
+    """
+
+    def __init__(self, probe, budget_ms=None, optional_layers=OPTIONAL_LAYERS, cost_model=None, frame_range=None):
+        self.budget_ms = budget_ms
+        self.cost_model = cost_model or get_cost_model()
+
+        self.frame_count = probe['frame_count'] if probe else 0
+        self.duration = probe['duration_seconds'] if probe else 0.0
+        if probe and frame_range is not None:
+            self.frame_count = max(0, frame_range[1] - frame_range[0])
+            self.duration = self.frame_count / probe['fps'] if probe['fps'] > 0 else 0.0
+        self.megapixels = (probe['width'] * probe['height']) / 1e6 if probe else 0.0
+
+        self.target_frames = config.VIDEO_MAX_TARGET_FRAMES
+        self.max_clips = config.VIDEO_MAX_CLIPS
+        self.keyframes_only = False
+        self.layers = {layer: True for layer in optional_layers}
+        self.skipped = {}
+        self.estimates = {}
+        self.measured = {}
+        self.over_budget = False
+
+        if budget_ms is not None and probe is not None:
+            self._plan(optional_layers)
+
+    def _estimate(self, layer, units):
+        return self.cost_model.estimate(layer, units, self.megapixels)
+
+    def _keyframe_count(self):
+        # Keyframe-only decoding touches roughly one frame per second
+        return max(1, math.ceil(self.duration))
+
+    def _decode_ms(self):
+        frames = self._keyframe_count() if self.keyframes_only else self.frame_count
+        return self._estimate('decode', frames * self.megapixels)
+
+    def _plan(self, optional_layers):
+        budget = float(self.budget_ms)
+        fixed = self._decode_ms() + self._estimate('audio', self.duration)
+
+        # Full decode alone would eat too much of the budget: keyframes only
+        # (ingest decodes every frame anyway without ffmpeg, so price that instead)
+        if self._decode_ms() > budget * config.SCHEDULER_DECODE_SHARE and ffmpeg_available():
+            self.keyframes_only = True
+            fixed = self._decode_ms() + self._estimate('audio', self.duration)
+
+        per_frame = sum(self.cost_model.unit_cost(layer, self.megapixels) for layer in CORE_PER_FRAME_LAYERS)
+        affordable = int((budget - fixed) / per_frame) if per_frame > 0 else self.target_frames
+        self.target_frames = max(config.VIDEO_MIN_TARGET_FRAMES, min(self.target_frames, affordable))
+
+        # Keyframe-only ingest cannot sample more frames than there are keyframes
+        if self.keyframes_only:
+            self.target_frames = min(self.target_frames, self._keyframe_count())
+
+        remaining = budget - fixed - per_frame * self.target_frames
+        self.estimates['core'] = round(budget - remaining, 1)
+        self.over_budget = remaining < 0
+
+        for layer in optional_layers:
+            # Keyframe ingest builds no clips and a separate clip decode is the cost keyframes avoid
+            if layer == '3d_video' and self.keyframes_only:
+                self.skip(layer, 'keyframes only: clips would need a full decode')
+                continue
+
+            if layer == '3d_video':
+                clip_ms = self.cost_model.unit_cost(layer, self.megapixels)
+                clips = min(self.max_clips, int(remaining / clip_ms)) if clip_ms > 0 else self.max_clips
+                cost = clip_ms * max(clips, 1)
+
+                if clips >= 1:
+                    self.max_clips = clips
+            else:
+                cost = self._estimate(layer, self.target_frames)
+
+            self.estimates[layer] = round(cost, 1)
+
+            if cost <= remaining:
+                remaining -= cost
+            else:
+                self.layers[layer] = False
+                self.skipped[layer] = f"budget: needs ~{cost:.0f} ms, {max(remaining, 0):.0f} ms left"
+
+    def runs(self, layer):
+        return self.layers.get(layer, True)
+
+    def skip(self, layer, reason):
+        self.layers[layer] = False
+        self.skipped[layer] = reason
+
+    def record(self, layer, elapsed_ms, units):
+        self.measured[layer] = round(elapsed_ms, 1)
+        self.cost_model.record(layer, elapsed_ms, units, self.megapixels)
+
+    @contextmanager
+    def measure(self, layer, units):
+        """Time one layer run and feed it back into the cost model"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(layer, (time.perf_counter() - start) * 1000, units)
+
+    def summary(self):
+        return {
+            'budget_ms': self.budget_ms,
+            'target_frames': self.target_frames,
+            'max_clips': self.max_clips,
+            'keyframes_only': self.keyframes_only,
+            'over_budget': self.over_budget,
+            'layers': dict(self.layers),
+            'skipped': dict(self.skipped),
+            'estimated_ms': dict(self.estimates),
+            'measured_ms': dict(self.measured)
+        }
+
+
+def plan_video(probe, budget_ms=None, optional_layers=OPTIONAL_LAYERS, frame_range=None):
+    return VideoSchedule(probe, budget_ms, optional_layers, frame_range=frame_range)
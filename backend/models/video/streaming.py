@@ -0,0 +1,347 @@
+import os
+import time
+import numpy as np
+
+import config
+from models.progress_tracker import get_progress_tracker
+from models.ensemble_detector import predict_ensemble
+from models.face_analyzer import analyze_face
+from models.frequency_analyzer import analyze_frequency_domain
+from models.video import temporal_analyzer, audio_analyzer
+from models.video.audio_analyzer import extract_audio, score_audio
+from models.video.face_track_store import FaceTrackStore
+from models.video.frame_dedup import FrameDedup
+from models.video.frame_reader import iter_frames, new_read_stats, probe_video, segment_frames
+from models.video.frame_store import FrameArena, open_pil
+from models.video.metadata_analyzer import analyze_video_metadata
+from models.video.quick_detector import FRAME_FACE_ATTRIBUTES, convert_numpy_types, determine_risk_level, quick_fusion
+from models.video.temporal_analyzer import analyze_temporal_consistency
+from models.video.video_3d_model import analyze_with_3d_model, clip_image, video_clip_indices
+
+
+CLIP_DURATION = 2.0
+CLIP_FRAMES = 16
+
+
+class RollingScore:
+    """Running mean and max of one layer's scores, without keeping the scores"""
+
+    __slots__ = ('total', 'count', 'max')
+
+    def __init__(self):
+        self.total = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def add(self, score, weight=1):
+        self.total += float(score) * weight
+        self.count += weight
+        self.max = max(self.max, float(score))
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+
+def plan_windows(fps, first_frame, last_frame, window_seconds, frames_per_window):
+    """(start, end, sample indices, clip indices) per window of frames [first_frame, last_frame)"""
+    window_frames = max(1, int(round(window_seconds * fps)))
+
+    for start in range(first_frame, last_frame, window_frames):
+        end = min(last_frame, start + window_frames)
+        samples = sorted(set(np.linspace(start, end - 1, frames_per_window).round().astype(int).tolist()))
+
+        clips = video_clip_indices(fps, end - start, CLIP_DURATION, CLIP_FRAMES, max_clips=1)
+        clip = [start + idx for idx in clips[0]] if clips else []
+
+        yield start, end, samples, clip
+
+
+def iter_windows(video_path, fps, windows, stats=None):
+    """
+    Decode every window's frames in one sequential pass and yield
+    (start, end, FrameArena of samples, clip) as each window completes.
+    Only the current window's frames are held. A window none of whose
+    samples decoded yields (start, end, None, None) and the pass goes on.
+    """
+    windows = list(windows)
+    wanted = [idx for _, _, samples, clip in windows for idx in samples + clip]
+    frames = iter_frames(video_path, wanted, stats=stats)
+    pending = None
+
+    try:
+        for start, end, samples, clip in windows:
+            sample_set = set(samples)
+            clip_pos = {idx: pos for pos, idx in enumerate(clip)}
+            arena = None
+            clip_frames = [None] * len(clip)
+
+            while True:
+                if pending is None:
+                    pending = next(frames, None)
+                    if pending is None:
+                        break
+
+                frame_idx, frame = pending
+                if frame_idx >= end:
+                    break
+                pending = None
+
+                if frame_idx in sample_set:
+                    if arena is None:
+                        arena = FrameArena(len(samples), frame.shape[0], frame.shape[1])
+                    arena.append(frame, frame_idx, frame_idx / fps)
+
+                if frame_idx in clip_pos:
+                    clip_frames[clip_pos[frame_idx]] = clip_image(frame)
+
+            if arena is None:
+                yield start, end, None, None
+                continue
+
+            yield start, end, arena, np.stack(clip_frames) if clip and all(f is not None for f in clip_frames) else None
+
+    finally:
+        frames.close()
+
+
+def score_window_frames(frames, face_store):
+    ensemble_scores, face_scores, frequency_scores = {}, {}, {}
+    layer_start = time.perf_counter()
+    dedup = FrameDedup(frames)
+
+    for idx in dedup.representatives:
+        try:
+            img = open_pil(frames[idx])
+
+            ensemble_scores[idx] = predict_ensemble(img, silent=True).get('score', 0.5)
+
+            if face_store.has_face(idx) or face_store.detector is None:
+                face_result = analyze_face(img, face_store.pixel_landmarks(idx))
+                if face_result.get('face_detected', False):
+                    face_scores[idx] = face_result.get('score', 0.5)
+
+            frequency_scores[idx] = analyze_frequency_domain(img).get('score', 0.5)
+
+        except Exception:
+            continue
+
+    return {
+        'ensemble_scores': dedup.broadcast(ensemble_scores),
+        'face_scores': dedup.broadcast(face_scores),
+        'frequency_scores': dedup.broadcast(frequency_scores),
+        'dedup': dedup.summary((time.perf_counter() - layer_start) * 1000)
+    }
+
+
+def analyze_window(arena, clip, audio_path, start_s, end_s):
+    """
+    Quick-mode layers over one window; returns the window's layer results.
+    start_s / end_s are seconds into the extracted audio.
+    """
+    frames = arena.refs()
+    timestamps = list(arena.timestamps)
+
+    face_layers = [temporal_analyzer]
+    if audio_path:
+        face_layers.append(audio_analyzer)
+    face_store = FaceTrackStore.for_layers(frames, timestamps, face_layers, extra=FRAME_FACE_ATTRIBUTES)
+
+    frame_results = score_window_frames(frames, face_store)
+    results = {'frame_scores': frame_results}
+
+    if frame_results['ensemble_scores']:
+        results['layer2a_frame_based'] = {
+            'avg_ensemble': float(np.mean(frame_results['ensemble_scores'])),
+            'max_ensemble': float(np.max(frame_results['ensemble_scores'])),
+            'avg_face': float(np.mean(frame_results['face_scores'])) if frame_results['face_scores'] else 0.0,
+            'avg_frequency': float(np.mean(frame_results['frequency_scores'])) if frame_results['frequency_scores'] else 0.0
+        }
+
+    if len(frames) >= 2:
+        results['layer2a_temporal'] = analyze_temporal_consistency(frames, timestamps, face_store)
+
+    if clip is not None:
+        results['layer2a_3d_video'] = analyze_with_3d_model(None, clip_duration=CLIP_DURATION, clips=[clip])
+
+    if audio_path:
+        results['layer2b_audio'] = score_audio(
+            audio_path, None, face_store.landmarks, offset=start_s, duration=end_s - start_s
+        )
+
+    return results
+
+
+def analyze_video_streaming(video_path, window_seconds=None, frames_per_window=None, on_window=None, start=None, end=None):
+    """
+    Windowed analysis for long videos.
+
+    The video is cut into fixed windows of window_seconds. Each window runs
+    through the quick-mode layers as soon as its frames are decoded, and its
+    score is reported to the progress tracker and to on_window(window). Only
+    the current window's frames and running per-layer aggregates are kept,
+    so memory does not grow with duration. The final score fuses the
+    aggregates. start / end (seconds) stream only that segment.
+    """
+    tracker = get_progress_tracker()
+    window_seconds = window_seconds or config.STREAM_WINDOW_SECONDS
+    frames_per_window = frames_per_window or config.STREAM_FRAMES_PER_WINDOW
+    audio_path = None
+
+    try:
+        print(f"\n{'='*60}")
+        print(f"STREAMING VIDEO DEEPFAKE DETECTION")
+        print(f"{'='*60}\n")
+        tracker.update("Starting streaming video analysis...")
+        tracker.update(f"Video: {os.path.basename(video_path)}")
+
+        probe = probe_video(video_path)
+        if probe is None or probe['fps'] <= 0 or probe['frame_count'] <= 0:
+            return {'error': 'Cannot open video', 'final_score': 0.5}
+
+        fps = probe['fps']
+        first, last = segment_frames(probe, start, end)
+        if last <= first:
+            return {'error': 'Segment is outside the video', 'final_score': 0.5}
+
+        start_time = time.perf_counter()
+
+        metadata_result = analyze_video_metadata(video_path, probe=probe, start=start, end=end)
+        has_audio = metadata_result.get('has_audio', False)
+        audio_path = extract_audio(video_path, start, end) if has_audio else None
+        # Extracted audio begins at the segment start
+        audio_origin = start or 0.0
+
+        windows = plan_windows(fps, first, last, window_seconds, frames_per_window)
+        num_windows = int(np.ceil((last - first) / max(1, int(round(window_seconds * fps)))))
+        print(f"  {num_windows} windows of {window_seconds:.0f}s, {frames_per_window} frames each")
+
+        ensemble = RollingScore()
+        ensemble_max = RollingScore()
+        face = RollingScore()
+        frequency = RollingScore()
+        temporal = RollingScore()
+        video_3d = RollingScore()
+        audio = RollingScore()
+        window_score = RollingScore()
+        max_identity_shifts = 0
+        unique_frames = 0
+        dedup_saved_ms = 0.0
+        window_summaries = []
+        skipped_windows = []
+        read_stats = new_read_stats()
+
+        for k, (window_start, window_end, arena, clip) in enumerate(iter_windows(video_path, fps, windows, read_stats)):
+            start_s, end_s = window_start / fps, window_end / fps
+
+            if arena is None:
+                skipped_windows.append({'window': k, 'start_seconds': round(start_s, 2), 'end_seconds': round(end_s, 2)})
+                print(f"  Window {k + 1}/{num_windows} [{start_s:.0f}-{end_s:.0f}s]: no decodable frames, skipped")
+                tracker.update(f"Window {k + 1}/{num_windows} ({start_s:.0f}-{end_s:.0f}s): no decodable frames, skipped")
+                continue
+
+            try:
+                layers = analyze_window(arena, clip, audio_path, start_s - audio_origin, end_s - audio_origin)
+            finally:
+                arena.close()
+
+            frame_scores = layers.pop('frame_scores')
+            for score in frame_scores['ensemble_scores']:
+                ensemble.add(score)
+            for score in frame_scores['face_scores']:
+                face.add(score)
+            for score in frame_scores['frequency_scores']:
+                frequency.add(score)
+            unique_frames += frame_scores['dedup']['unique_frames']
+            dedup_saved_ms += frame_scores['dedup'].get('saved_ms', 0.0)
+
+            if 'layer2a_frame_based' in layers:
+                ensemble_max.add(layers['layer2a_frame_based']['max_ensemble'])
+            if 'layer2a_temporal' in layers:
+                temporal.add(layers['layer2a_temporal'].get('score', 0.0))
+                max_identity_shifts = max(max_identity_shifts, layers['layer2a_temporal'].get('identity_shifts', 0))
+            if 'layer2a_3d_video' in layers:
+                video_3d.add(layers['layer2a_3d_video'].get('score', 0.5))
+            if 'layer2b_audio' in layers:
+                audio.add(layers['layer2b_audio'].get('score', 0.0))
+
+            score, confidence, breakdown = quick_fusion(layers)
+            window_score.add(score)
+
+            window = convert_numpy_types({
+                'window': k,
+                'start_seconds': round(start_s, 2),
+                'end_seconds': round(end_s, 2),
+                'score': round(score, 3),
+                'confidence': round(confidence, 3),
+                'breakdown': breakdown
+            })
+            window_summaries.append(window)
+
+            print(f"  Window {k + 1}/{num_windows} [{start_s:.0f}-{end_s:.0f}s]: {score:.2f}")
+            tracker.update(f"Window {k + 1}/{num_windows} ({start_s:.0f}-{end_s:.0f}s): score {score:.2f}")
+
+            if on_window is not None:
+                on_window(window)
+
+        if not window_summaries:
+            tracker.update("Failed to extract frames")
+            return {'error': 'Failed to extract frames', 'final_score': 0.5}
+
+        results = {
+            'layer1_metadata': metadata_result,
+            'layer2a_frame_based': {
+                'avg_ensemble': ensemble.mean,
+                'max_ensemble': ensemble_max.max,
+                'avg_face': face.mean,
+                'avg_frequency': frequency.mean
+            },
+            'layer2a_temporal': {'score': temporal.mean, 'identity_shifts': max_identity_shifts} if temporal.count else None,
+            'layer2a_3d_video': {'score': video_3d.mean, 'confidence': 0.7} if video_3d.count else None,
+            'layer2b_audio': {'has_audio': True, 'score': audio.mean} if audio.count else None
+        }
+
+        if 'segment' in metadata_result.get('metadata', {}):
+            results['segment'] = metadata_result['metadata']['segment']
+
+        final_score, confidence, breakdown = quick_fusion(results)
+
+        results.update({
+            'final_score': final_score,
+            'confidence': confidence,
+            'risk_level': determine_risk_level(final_score),
+            'method_breakdown': breakdown,
+            'windows': window_summaries,
+            'max_window_score': window_score.max,
+            'stream': {
+                'windows': len(window_summaries),
+                'skipped_windows': skipped_windows,
+                'window_seconds': window_seconds,
+                'decoded_frames': read_stats['decoded'],
+                'unique_frames': unique_frames,
+                'dedup_saved_ms': round(dedup_saved_ms, 1),
+                'decode_ms': round(read_stats['decode_ms'], 1),
+                'total_ms': round((time.perf_counter() - start_time) * 1000, 1)
+            }
+        })
+
+        print(f"  FINAL: {final_score:.2f} | {results['risk_level']} | Confidence: {confidence:.2f}")
+        print(f"{'='*60}\n")
+        tracker.update("Streaming analysis complete!")
+        tracker.update(f"Final Score: {final_score:.2f}")
+
+        return convert_numpy_types(results)
+
+    except Exception as e:
+        tracker.update(f"Error: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return {
+            'error': str(e),
+            'final_score': 0.5,
+            'risk_level': 'Unknown'
+        }
+
+    finally:
+        if audio_path and os.path.exists(audio_path):
+            os.remove(audio_path)
@@ -1,10 +1,15 @@
-import cv2
 import numpy as np
-from PIL import Image
-import torch
+from models.video.frame_store import open_pil
+from models.identity_service import compare_identities, get_identity_service
+from models.video.motion_engine import MotionEngine
 
 
-def analyze_temporal_consistency(frame_paths, timestamps):
+# Face data read from the per-video FaceTrackStore
+FACE_ATTRIBUTES = ('landmarks',)
+
+
+def analyze_temporal_consistency(frame_paths, timestamps, face_store=None, motion=None):
+    """motion: MotionEngine shared with the other layers (built here if None)"""
     try:
         results = {
             'score': 0.0,
@@ -18,19 +23,23 @@ def analyze_temporal_consistency(frame_paths, timestamps):
         if len(frame_paths) < 2:
             return results
         
-        landmark_stability = analyze_landmark_stability(frame_paths)
+        if motion is None:
+            motion = MotionEngine(frame_paths)
+        
+        landmark_track = face_store.landmarks if face_store is not None else None
+        landmark_stability = analyze_landmark_stability(frame_paths, timestamps, landmark_track, motion)
         results['landmark_jitter'] = landmark_stability['jitter_score']
         
         if landmark_stability['jitter_score'] > 0.6:
             results['inconsistencies'].append('High facial landmark jitter detected')
         
-        identity_check = check_identity_persistence(frame_paths)
+        identity_check = check_identity_persistence(frame_paths, motion)
         results['identity_shifts'] = identity_check['num_shifts']
         
         if identity_check['num_shifts'] > 0:
             results['inconsistencies'].append(f'{identity_check["num_shifts"]} identity shifts detected')
         
-        flow_analysis = analyze_optical_flow(frame_paths)
+        flow_analysis = analyze_optical_flow(frame_paths, motion)
         results['motion_smoothness'] = flow_analysis['smoothness']
         results['optical_flow_anomalies'] = flow_analysis['anomalies']
         
@@ -54,76 +63,28 @@ def analyze_temporal_consistency(frame_paths, timestamps):
         }
 
 
-def analyze_landmark_stability(frame_paths):
+def analyze_landmark_stability(frame_paths, timestamps=None, landmark_track=None, motion=None):
     try:
         try:
-            from mediapipe.tasks import python
-            from mediapipe.tasks.python import vision
-            import mediapipe as mp
-            import os
-            
-            model_dir = os.path.join(os.path.dirname(__file__), '..', '..', 'models_cache')
-            face_landmarker_model = os.path.join(model_dir, 'face_landmarker.task')
-            
-            if not os.path.exists(face_landmarker_model):
-                raise Exception("Face landmarker model not found")
-            
-            base_options = python.BaseOptions(
-                model_asset_path=face_landmarker_model,
-                delegate=python.BaseOptions.Delegate.CPU
-            )
-            
-            options = vision.FaceLandmarkerOptions(
-                base_options=base_options,
-                running_mode=vision.RunningMode.IMAGE,
-                output_face_blendshapes=False,
-                output_facial_transformation_matrixes=False,
-                num_faces=1,
-                min_face_detection_confidence=0.5,
-                min_face_presence_confidence=0.5,
-                min_tracking_confidence=0.5
-            )
-            
-            landmarker = vision.FaceLandmarker.create_from_options(options)
-            
-            landmarks_sequence = []
-            
-            for frame_path in frame_paths:
-                image = cv2.imread(frame_path)
-                if image is None:
-                    continue
-                
-                rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-                mp_image = mp.Image(image_format=mp.ImageFormat.SRGB, data=rgb_image)
+            if landmark_track is None:
+                from models.landmark_service import track_frame_landmarks
                 
-                try:
-                    detection_result = landmarker.detect(mp_image)
-                except Exception:
-                    continue
+                if timestamps is None:
+                    timestamps = [i / 30.0 for i in range(len(frame_paths))]
                 
-                if detection_result.face_landmarks:
-                    face_landmarks = detection_result.face_landmarks[0]
-                    
-                    key_indices = [33, 133, 362, 263, 1, 61, 291, 199]
-                    
-                    key_landmarks = []
-                    for idx in key_indices:
-                        if idx < len(face_landmarks):
-                            lm = face_landmarks[idx]
-                            key_landmarks.append([lm.x, lm.y, lm.z])
-                    
-                    if key_landmarks:
-                        landmarks_sequence.append(np.array(key_landmarks))
+                landmark_track = track_frame_landmarks(frame_paths, timestamps)
             
-            landmarker.close()
+            if landmark_track is None:
+                raise Exception("Face landmarker not available")
+            
+            key_indices = [33, 133, 362, 263, 1, 61, 291, 199]
+            
+            landmarks_sequence = landmark_track.points(key_indices, present_only=True)
             
             if len(landmarks_sequence) < 2:
                 return {'jitter_score': 0.5, 'has_faces': False}
             
-            jitters = []
-            for i in range(len(landmarks_sequence) - 1):
-                diff = np.linalg.norm(landmarks_sequence[i] - landmarks_sequence[i+1])
-                jitters.append(diff)
+            jitters = np.linalg.norm(np.diff(landmarks_sequence, axis=0).reshape(len(landmarks_sequence) - 1, -1), axis=1)
             
             avg_jitter = np.mean(jitters)
             max_jitter = np.max(jitters)
@@ -135,43 +96,24 @@ def analyze_landmark_stability(frame_paths):
                 'jitter_score': float(jitter_score),
                 'avg_jitter': float(avg_jitter),
                 'max_jitter': float(max_jitter),
-                'has_faces': True
+                'has_faces': True,
+                'track_losses': landmark_track.track_losses
             }
             
         except Exception as mp_error:
-            return analyze_landmark_stability_opencv(frame_paths)
+            return analyze_landmark_stability_opencv(frame_paths, motion)
         
     except Exception as e:
         print(f"Landmark stability error: {e}")
         return {'jitter_score': 0.5, 'error': str(e)}
 
 
-def analyze_landmark_stability_opencv(frame_paths):
+def analyze_landmark_stability_opencv(frame_paths, motion=None):
     try:
-        movements = []
-        prev_frame = None
+        if motion is None:
+            motion = MotionEngine(frame_paths)
         
-        for frame_path in frame_paths:
-            image = cv2.imread(frame_path)
-            if image is None:
-                continue
-            
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-            
-            if prev_frame is not None:
-                flow = cv2.calcOpticalFlowFarneback(
-                    prev_frame, gray, None,
-                    pyr_scale=0.5, levels=3, winsize=15,
-                    iterations=3, poly_n=5, poly_sigma=1.2, flags=0
-                )
-                
-                h, w = flow.shape[:2]
-                center_flow = flow[h//4:3*h//4, w//4:3*w//4]
-                
-                magnitude = np.sqrt(center_flow[..., 0]**2 + center_flow[..., 1]**2)
-                movements.append(np.mean(magnitude))
-            
-            prev_frame = gray
+        movements = motion.flow_magnitudes('center')
         
         if len(movements) < 2:
             return {'jitter_score': 0.5, 'has_faces': False}
@@ -187,81 +129,35 @@ def analyze_landmark_stability_opencv(frame_paths):
         return {'jitter_score': 0.5, 'error': str(e)}
 
 
-def check_identity_persistence(frame_paths):
+def check_identity_persistence(frame_paths, motion=None):
     try:
-        from facenet_pytorch import InceptionResnetV1, MTCNN
-        
-        device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+        service = get_identity_service()
         
-        mtcnn = MTCNN(keep_all=False, device=device)
-        resnet = InceptionResnetV1(pretrained='vggface2').eval().to(device)
+        if not service.available:
+            raise Exception("FaceNet not available")
         
-        embeddings = []
+        # MTCNN-aligned faces: the similarity threshold was tuned on this alignment, not on landmark crops
+        faces = service.detect_faces(open_pil(frame_path) for frame_path in frame_paths)
         
-        for frame_path in frame_paths:
-            img = Image.open(frame_path).convert('RGB')
-            
-            face = mtcnn(img)
-            
-            if face is not None:
-                face = face.unsqueeze(0).to(device)
-                
-                with torch.no_grad():
-                    embedding = resnet(face)
-                
-                embeddings.append(embedding.cpu().numpy().flatten())
+        embeddings = service.embed(faces)
         
         if len(embeddings) < 2:
             return {'num_shifts': 0, 'has_faces': False}
         
-        identity_shifts = 0
-        similarities = []
-        
-        for i in range(len(embeddings) - 1):
-            emb1 = embeddings[i]
-            emb2 = embeddings[i+1]
-            
-            similarity = np.dot(emb1, emb2) / (np.linalg.norm(emb1) * np.linalg.norm(emb2))
-            similarities.append(similarity)
-            
-            if similarity < 0.85:
-                identity_shifts += 1
-        
-        avg_similarity = np.mean(similarities) if similarities else 1.0
-        
-        return {
-            'num_shifts': identity_shifts,
-            'avg_similarity': float(avg_similarity),
-            'has_faces': True
-        }
+        return compare_identities(embeddings)
         
     except Exception as e:
         print(f"Identity persistence check error: {e}")
-        return check_identity_persistence_fallback(frame_paths)
+        return check_identity_persistence_fallback(frame_paths, motion)
 
 
-def check_identity_persistence_fallback(frame_paths):
+def check_identity_persistence_fallback(frame_paths, motion=None):
     try:
-        identity_shifts = 0
+        if motion is None:
+            motion = MotionEngine(frame_paths)
         
-        prev_hist = None
-        
-        for frame_path in frame_paths:
-            img = cv2.imread(frame_path)
-            if img is None:
-                continue
-            
-            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-            hist = cv2.calcHist([gray], [0], None, [256], [0, 256])
-            hist = cv2.normalize(hist, hist).flatten()
-            
-            if prev_hist is not None:
-                correlation = cv2.compareHist(prev_hist, hist, cv2.HISTCMP_CORREL)
-                
-                if correlation < 0.7:
-                    identity_shifts += 1
-            
-            prev_hist = hist
+        correlations = (motion.hist_correlation(i) for i in range(len(motion)))
+        identity_shifts = sum(1 for correlation in correlations if correlation is not None and correlation < 0.7)
         
         return {
             'num_shifts': identity_shifts,
@@ -273,36 +169,13 @@ def check_identity_persistence_fallback(frame_paths):
         return {'num_shifts': 0, 'has_faces': False}
 
 
-def analyze_optical_flow(frame_paths):
+def analyze_optical_flow(frame_paths, motion=None):
     try:
-        anomalies = 0
-        flow_magnitudes = []
-        
-        prev_frame = None
+        if motion is None:
+            motion = MotionEngine(frame_paths)
         
-        for frame_path in frame_paths:
-            frame = cv2.imread(frame_path)
-            if frame is None:
-                continue
-            
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            
-            if prev_frame is not None:
-                flow = cv2.calcOpticalFlowFarneback(
-                    prev_frame, gray, None,
-                    pyr_scale=0.5, levels=3, winsize=15,
-                    iterations=3, poly_n=5, poly_sigma=1.2, flags=0
-                )
-                
-                magnitude = np.sqrt(flow[..., 0]**2 + flow[..., 1]**2)
-                avg_magnitude = np.mean(magnitude)
-                flow_magnitudes.append(avg_magnitude)
-                
-                if len(flow_magnitudes) > 1:
-                    if abs(avg_magnitude - flow_magnitudes[-2]) > 5.0:
-                        anomalies += 1
-            
-            prev_frame = gray
+        flow_magnitudes = motion.flow_magnitudes()
+        anomalies = int(np.sum(np.abs(np.diff(flow_magnitudes)) > 5.0)) if len(flow_magnitudes) > 1 else 0
         
         if len(flow_magnitudes) < 2:
             return {'smoothness': 1.0, 'anomalies': 0}
@@ -1,17 +1,112 @@
+import time
 import torch
 import numpy as np
 import cv2
-from PIL import Image
+import threading
+import config
+from models.video.clip_selector import ClipSelector
+from models.video.frame_reader import iter_frames, probe_video, segment_frames
 
 
-def analyze_with_3d_model(video_path, clip_duration=2.0):
+_videomae_model = None
+_videomae_processor = None
+_videomae_device = None
+_videomae_lock = threading.Lock()
+
+
+def get_videomae_model():
+    global _videomae_model, _videomae_processor, _videomae_device
+    
+    with _videomae_lock:
+        if _videomae_model is None:
+            try:
+                from transformers import VideoMAEImageProcessor, VideoMAEForVideoClassification
+                
+                print("Loading VideoMAE model (one-time initialization)...")
+                _videomae_device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+                
+                _videomae_processor = VideoMAEImageProcessor.from_pretrained("MCG-NJU/videomae-base")
+                model = VideoMAEForVideoClassification.from_pretrained("MCG-NJU/videomae-base")
+                model.to(_videomae_device)
+                model.eval()
+                _videomae_model = model
+                
+                print(f"VideoMAE model loaded on {_videomae_device}")
+            except Exception as e:
+                print(f"Failed to load VideoMAE model: {e}")
+                return None, None, None
+    
+    return _videomae_model, _videomae_processor, _videomae_device
+
+
+def clip_image(frame):
+    """BGR frame -> RGB clip frame for the 3D model, shrunk to INGEST_CLIP_SHORT_SIDE"""
+    # The clip models resize to 224 anyway; keeping clips small bounds memory
+    h, w = frame.shape[:2]
+    scale = config.INGEST_CLIP_SHORT_SIDE / float(min(h, w))
+    
+    if scale < 1.0:
+        frame = cv2.resize(frame, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+    
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+
+
+def clip_pixel_values(clip, processor):
+    """
+    (T, H, W, 3) uint8 RGB clip -> (T, 3, crop, crop) float32 array prepared
+    like VideoMAEImageProcessor: shortest-edge resize, center crop, rescale
+    and normalize, without the per-frame PIL round trip.
+    """
+    size = processor.size
+    short = size.get('shortest_edge') or min(size.get('height', 224), size.get('width', 224))
+    crop_h, crop_w = processor.crop_size['height'], processor.crop_size['width']
+    
+    h, w = clip.shape[1:3]
+    scale = short / float(min(h, w))
+    
+    if scale != 1.0:
+        width, height = max(crop_w, int(round(w * scale))), max(crop_h, int(round(h * scale)))
+        interpolation = cv2.INTER_AREA if scale < 1.0 else cv2.INTER_LINEAR
+        clip = np.stack([cv2.resize(frame, (width, height), interpolation=interpolation) for frame in clip])
+        h, w = height, width
+    
+    top, left = (h - crop_h) // 2, (w - crop_w) // 2
+    clip = clip[:, top:top + crop_h, left:left + crop_w]
+    
+    mean = np.asarray(processor.image_mean, dtype=np.float32)
+    std = np.asarray(processor.image_std, dtype=np.float32)
+    pixels = (clip.astype(np.float32) * np.float32(processor.rescale_factor) - mean) / std
+    
+    return pixels.transpose(0, 3, 1, 2)
+
+
+def analyze_with_3d_model(video_path, clip_duration=2.0, clips=None, max_clips=None, start=None, end=None,
+                          clip_selection=None):
+    """
+    clips: (T, H, W, 3) RGB frame stacks already captured by the video ingest
+    pass, with its clip_selection summary; otherwise the most informative
+    clips are extracted here.
+    """
+    if max_clips is None:
+        max_clips = config.VIDEO_MAX_CLIPS
+    
     try:
-        result = analyze_with_videomae(video_path, clip_duration)
+        if clips is None:
+            clips, clip_selection = extract_video_clips(
+                video_path, clip_duration, num_frames=16, max_clips=max_clips, start=start, end=end
+            )
+        
+        clips = clips[:max_clips]
+        
+        result = analyze_with_videomae(clips)
+        
+        if result is None:
+            result = analyze_with_temporal_features(clips)
         
-        if result is not None:
-            return result
+        if clip_selection is not None:
+            result['clip_selection'] = clip_selection
         
-        return analyze_with_temporal_features(video_path, clip_duration)
+        return result
         
     except Exception as e:
         print(f"3D model analysis error: {e}")
@@ -22,37 +117,35 @@ def analyze_with_3d_model(video_path, clip_duration=2.0):
         }
 
 
-def analyze_with_videomae(video_path, clip_duration):
+def analyze_with_videomae(clips):
+    if not clips:
+        return None
+    
     try:
-        from transformers import VideoMAEImageProcessor, VideoMAEForVideoClassification
-        
-        device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-        
-        processor = VideoMAEImageProcessor.from_pretrained("MCG-NJU/videomae-base")
-        model = VideoMAEForVideoClassification.from_pretrained("MCG-NJU/videomae-base")
-        model.to(device)
-        model.eval()
-        
-        clips = extract_video_clips(video_path, clip_duration, num_frames=16)
+        model, processor, device = get_videomae_model()
         
-        if not clips:
+        if model is None:
             return None
         
         clip_scores = []
+        batch_size = max(1, config.VIDEOMAE_BATCH_SIZE)
+        use_bf16 = config.VIDEOMAE_CPU_BF16 and device.type == 'cpu'
+        start = time.perf_counter()
         
-        for clip_frames in clips:
-            inputs = processor(clip_frames, return_tensors="pt")
-            inputs = {k: v.to(device) for k, v in inputs.items()}
+        # A few batched forwards instead of one per clip
+        for i in range(0, len(clips), batch_size):
+            pixel_values = np.stack([clip_pixel_values(clip, processor) for clip in clips[i:i + batch_size]])
+            pixel_values = torch.from_numpy(pixel_values).to(device)
             
-            with torch.no_grad():
-                outputs = model(**inputs)
-                logits = outputs.logits
-                
-                probs = torch.softmax(logits, dim=-1)
-                entropy = -torch.sum(probs * torch.log(probs + 1e-10), dim=-1)
-                
-                anomaly_score = entropy.item() / 5.0
-                clip_scores.append(min(anomaly_score, 1.0))
+            with torch.no_grad(), torch.autocast('cpu', dtype=torch.bfloat16, enabled=use_bf16):
+                logits = model(pixel_values=pixel_values).logits.float()
+            
+            probs = torch.softmax(logits, dim=-1)
+            entropy = -torch.sum(probs * torch.log(probs + 1e-10), dim=-1)
+            
+            clip_scores.extend(min(float(e) / 5.0, 1.0) for e in entropy.cpu())
+        
+        inference_ms = (time.perf_counter() - start) * 1000
         
         avg_score = np.mean(clip_scores)
         max_score = np.max(clip_scores)
@@ -63,7 +156,10 @@ def analyze_with_videomae(video_path, clip_duration):
             'score': float(final_score),
             'clip_scores': [float(s) for s in clip_scores],
             'confidence': 0.7,
-            'method': 'videomae'
+            'method': 'videomae',
+            'precision': 'bfloat16' if use_bf16 else 'float32',
+            'inference_ms': round(inference_ms, 1),
+            'ms_per_clip': round(inference_ms / len(clip_scores), 1)
         }
         
     except Exception as e:
@@ -71,10 +167,20 @@ def analyze_with_videomae(video_path, clip_duration):
         return None
 
 
-def analyze_with_temporal_features(video_path, clip_duration):
+def clip_batch(clips, size=224):
+    """(clips, T, size, size, 3) uint8 array of the clips' frames squashed to size x size"""
+    num_frames = len(clips[0])
+    batch = np.empty((len(clips), num_frames, size, size, 3), dtype=np.uint8)
+    
+    for c, clip in enumerate(clips):
+        for t in range(num_frames):
+            batch[c, t] = cv2.resize(clip[t], (size, size), interpolation=cv2.INTER_AREA)
+    
+    return batch
+
+
+def analyze_with_temporal_features(clips):
     try:
-        clips = extract_video_clips(video_path, clip_duration, num_frames=16)
-        
         if not clips:
             return {
                 'score': 0.5,
@@ -82,31 +188,20 @@ def analyze_with_temporal_features(video_path, clip_duration):
                 'error': 'No clips extracted'
             }
         
-        clip_scores = []
+        batch = clip_batch(clips)
         
-        for clip_frames in clips:
-            clip_array = np.stack([np.array(f.resize((224, 224))) for f in clip_frames])
-            clip_array = clip_array.astype(np.float32) / 255.0
-            
-            diffs = np.diff(clip_array, axis=0)
-            temporal_variance = np.var(diffs)
-            
-            motion = np.mean(np.abs(diffs))
-            
-            color_var = np.var(clip_array, axis=0).mean()
-            
-            anomaly_score = 0.0
-            
-            if temporal_variance > 0.05:
-                anomaly_score += 0.3
-            
-            if motion < 0.01:
-                anomaly_score += 0.3
-            
-            if color_var > 0.15:
-                anomaly_score += 0.4
-            
-            clip_scores.append(min(anomaly_score, 1.0))
+        # Integer frame differences; statistics rescaled to the [0, 1] pixel range
+        diffs = np.diff(batch.astype(np.int16), axis=1)
+        temporal_variance = diffs.var(axis=(1, 2, 3, 4), dtype=np.float32) / 255.0 ** 2
+        motion = np.abs(diffs).mean(axis=(1, 2, 3, 4), dtype=np.float32) / 255.0
+        color_var = batch.var(axis=1, dtype=np.float32).mean(axis=(1, 2, 3)) / 255.0 ** 2
+        
+        anomaly = (
+            0.3 * (temporal_variance > 0.05) +
+            0.3 * (motion < 0.01) +
+            0.4 * (color_var > 0.15)
+        )
+        clip_scores = np.minimum(anomaly, 1.0)
         
         avg_score = np.mean(clip_scores)
         
@@ -126,48 +221,74 @@ def analyze_with_temporal_features(video_path, clip_duration):
         }
 
 
-def extract_video_clips(video_path, clip_duration, num_frames=16):
+def video_clip_indices(fps, total_frames, clip_duration, num_frames=16, max_clips=10, start_frame=0):
+    """Frame indices of up to max_clips consecutive clips of num_frames evenly spaced frames"""
+    frames_per_clip = int(fps * clip_duration)
+    clip_step = max(1, frames_per_clip // num_frames)
+    
+    clip_indices = []
+    current_frame = start_frame
+    
+    while current_frame + frames_per_clip < total_frames and len(clip_indices) < max_clips:
+        clip_indices.append([current_frame + i * clip_step for i in range(num_frames)])
+        current_frame += max(1, frames_per_clip)
+    
+    return clip_indices
+
+
+class ClipAssembler:
+    """
+    Fills candidate clip windows from frames streamed in video order and
+    passes each complete clip to on_clip(start_frame, clip).
+
+    Below num_frames / clip_duration fps the windows overlap, so one frame
+    can fill a slot in several clips; only unfinished clips are held.
+    """
+
+    def __init__(self, candidates, on_clip):
+        self.candidates = candidates
+        self.on_clip = on_clip
+        self.slots = {}
+        self._open = {}
+
+        for clip_no, indices in enumerate(candidates):
+            for pos, idx in enumerate(indices):
+                self.slots.setdefault(idx, []).append((clip_no, pos))
+
+    def add(self, frame_idx, image):
+        for clip_no, pos in self.slots.get(frame_idx, ()):
+            buffer = self._open.setdefault(clip_no, [None] * len(self.candidates[clip_no]))
+            buffer[pos] = image
+
+            if pos == len(buffer) - 1:
+                del self._open[clip_no]
+                if all(f is not None for f in buffer):
+                    self.on_clip(self.candidates[clip_no][0], np.stack(buffer))
+
+
+def extract_video_clips(video_path, clip_duration, num_frames=16, max_clips=10, start=None, end=None):
+    """
+    (clips, selection): the max_clips most informative clips of the video as
+    (T, H, W, 3) RGB frame stacks in video order, and the ClipSelector summary.
+    """
     try:
-        cap = cv2.VideoCapture(video_path)
-        fps = cap.get(cv2.CAP_PROP_FPS)
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        
-        if fps <= 0 or total_frames <= 0:
-            cap.release()
-            return []
+        probe = probe_video(video_path)
         
-        frames_per_clip = int(fps * clip_duration)
+        if probe is None or probe['fps'] <= 0 or probe['frame_count'] <= 0:
+            return [], None
         
-        clip_step = max(1, frames_per_clip // num_frames)
+        first, last = segment_frames(probe, start, end)
+        candidates = video_clip_indices(probe['fps'], last, clip_duration, num_frames, last - first, start_frame=first)
         
-        clips = []
-        current_frame = 0
-        
-        while current_frame + frames_per_clip < total_frames:
-            clip_frames = []
-            
-            for i in range(num_frames):
-                frame_idx = current_frame + (i * clip_step)
-                cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
-                ret, frame = cap.read()
-                
-                if ret:
-                    frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                    pil_image = Image.fromarray(frame_rgb)
-                    clip_frames.append(pil_image)
-            
-            if len(clip_frames) == num_frames:
-                clips.append(clip_frames)
-            
-            current_frame += frames_per_clip
-            
-            if len(clips) >= 10:
-                break
+        selector = ClipSelector(max_clips)
+        assembler = ClipAssembler(candidates, selector.offer)
         
-        cap.release()
+        # One sequential decode over every candidate; only unfinished clips are held
+        for frame_idx, frame in iter_frames(video_path, sorted(assembler.slots)):
+            assembler.add(frame_idx, clip_image(frame))
         
-        return clips
+        return selector.clips(), selector.summary()
         
     except Exception as e:
         print(f"Clip extraction error: {e}")
-        return []
+        return [], None
@@ -1,17 +1,70 @@
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from PIL import Image
 import numpy as np
 import config
-from models.ensemble_detector import predict_ensemble
+from models.ensemble_detector import predict_ensemble, predict_ensemble_tiled
 from models.frequency_analyzer import analyze_frequency_domain
 from models.face_analyzer import analyze_face
 from models.metadata_analyzer import analyze_metadata
-
-
-def analyze_image_comprehensive(image_path):
+from models import ensemble_detector, frequency_analyzer, face_analyzer, metadata_analyzer
+from utils.image_utils import load_image, ImagePyramid
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+# Each layer module declares ANALYSIS_MAX_SIDE (the pyramid level it runs on,
+# None for native resolution) and WORKING_BYTES_PER_PIXEL (its transient
+# memory at that level).
+LAYER_MODULES = {
+    'neural_network': ensemble_detector,
+    'frequency_domain': frequency_analyzer,
+    'facial_analysis': face_analyzer,
+    'metadata_forensics': metadata_analyzer
+}
+
+# Shared across requests so concurrent image analyses stay within one bound
+_layer_executor = None
+_layer_executor_lock = threading.Lock()
+
+
+def get_enabled_layers():
+    enabled = {
+        'neural_network': config.NEURAL_ENSEMBLE_ENABLED,
+        'frequency_domain': config.FREQUENCY_ANALYSIS_ENABLED,
+        'facial_analysis': config.FACE_ANALYSIS_ENABLED,
+        'metadata_forensics': config.METADATA_ANALYSIS_ENABLED
+    }
+    return [layer for layer, on in enabled.items() if on]
+
+
+def get_layer_max_side(layer, tiled=False):
+    if layer == 'neural_network' and tiled:
+        return ensemble_detector.TILED_ANALYSIS_MAX_SIDE
+    return LAYER_MODULES[layer].ANALYSIS_MAX_SIDE
+
+
+def analyze_image_comprehensive(source, tiled=None):
+    """
+    source may be a path, bytes-like buffer or open file object (e.g. the
+    upload's SpooledTemporaryFile); nothing is written to disk.
+    tiled adds sliding-window neural scoring (defaults to TILED_NEURAL_ENABLED).
+    """
     try:
-
-        image = Image.open(image_path).convert('RGB')
+        if tiled is None:
+            tiled = config.TILED_NEURAL_ENABLED
+        
+        layers = get_enabled_layers()
+        # Native-resolution layers decode for themselves unless nothing needs a smaller image
+        max_side = max((side for side in (get_layer_max_side(layer, tiled) for layer in layers) if side), default=None)
+        
+        image, image_info = load_image(source, max_pixels=config.IMAGE_MAX_PIXELS, max_side=max_side)
+        pyramid = ImagePyramid(image)
         
         results = {
             'neural_network': None,
@@ -23,41 +76,20 @@ def analyze_image_comprehensive(image_path):
             'confidence': 0.0
         }
         
-
-        if config.NEURAL_ENSEMBLE_ENABLED:
-            try:
-                neural_result = predict_ensemble(image)
-                results['neural_network'] = neural_result
-            except Exception as e:
-                print(f"Neural network analysis failed: {e}")
-                results['neural_network'] = {'score': 0.5, 'error': str(e)}
+        layer_calls = build_layer_calls(source, pyramid, layers, tiled)
         
-
-        if config.FREQUENCY_ANALYSIS_ENABLED:
-            try:
-                freq_result = analyze_frequency_domain(image)
-                results['frequency_domain'] = freq_result
-            except Exception as e:
-                print(f"Frequency analysis failed: {e}")
-                results['frequency_domain'] = {'score': 0.5, 'error': str(e)}
+        start = time.perf_counter()
+        executor = get_layer_executor()
+        futures = {
+            layer: executor.submit(run_layer, *call)
+            for layer, call in layer_calls.items()
+        }
         
-
-        if config.FACE_ANALYSIS_ENABLED:
-            try:
-                face_result = analyze_face(image)
-                results['facial_analysis'] = face_result
-            except Exception as e:
-                print(f"Face analysis failed: {e}")
-                results['facial_analysis'] = {'score': 0.5, 'error': str(e)}
+        layer_timings = {}
+        for layer, future in futures.items():
+            results[layer], layer_timings[layer] = future.result()
         
-
-        if config.METADATA_ANALYSIS_ENABLED:
-            try:
-                metadata_result = analyze_metadata(image_path)
-                results['metadata_forensics'] = metadata_result
-            except Exception as e:
-                print(f"Metadata analysis failed: {e}")
-                results['metadata_forensics'] = {'score': 0.5, 'error': str(e)}
+        total_ms = (time.perf_counter() - start) * 1000
         
 
         final_score, confidence = combine_scores_aggressive(results)
@@ -65,6 +97,17 @@ def analyze_image_comprehensive(image_path):
         results['confidence'] = confidence
         results['risk_level'] = determine_risk_level(final_score)
         
+        image_info['memory'] = build_memory_report(pyramid, layers, tiled, image_info['original_size'])
+        results['image_info'] = image_info
+        
+        critical_layer = max(layer_timings, key=layer_timings.get) if layer_timings else None
+        results['timings'] = {
+            'layers_ms': {layer: round(ms, 1) for layer, ms in layer_timings.items()},
+            'total_ms': round(total_ms, 1),
+            'sequential_ms': round(sum(layer_timings.values()), 1),
+            'critical_path': critical_layer
+        }
+        
         return results
     
     except Exception as e:
@@ -76,6 +119,103 @@ def analyze_image_comprehensive(image_path):
         }
 
 
+def build_layer_calls(source, pyramid, layers, tiled=False):
+    """(label, func, args, kwargs) per enabled layer, with pyramid levels resolved"""
+    # Levels are built here, before dispatch: the pyramid cache is not thread-safe
+    calls = {}
+    
+    if 'neural_network' in layers:
+        calls['neural_network'] = (
+            'Neural network analysis',
+            predict_ensemble_tiled if tiled else predict_ensemble,
+            (pyramid.level(get_layer_max_side('neural_network', tiled)),), {}
+        )
+    
+    if 'frequency_domain' in layers:
+        calls['frequency_domain'] = (
+            'Frequency analysis', analyze_frequency_domain,
+            (pyramid.level(frequency_analyzer.ANALYSIS_MAX_SIDE),), {}
+        )
+    
+    if 'facial_analysis' in layers:
+        calls['facial_analysis'] = (
+            'Face analysis', analyze_face,
+            (pyramid.level(face_analyzer.ANALYSIS_MAX_SIDE),), {}
+        )
+    
+    if 'metadata_forensics' in layers:
+        calls['metadata_forensics'] = (
+            'Metadata analysis', analyze_metadata,
+            (source,), {'image': pyramid.level(metadata_analyzer.ANALYSIS_MAX_SIDE)}
+        )
+    
+    return calls
+
+
+def get_layer_executor():
+    global _layer_executor
+    with _layer_executor_lock:
+        if _layer_executor is None:
+            _layer_executor = ThreadPoolExecutor(
+                max_workers=config.IMAGE_LAYER_WORKERS,
+                thread_name_prefix='image-layer'
+            )
+        return _layer_executor
+
+
+def run_layer(label, func, args, kwargs):
+    """Run one analysis layer; failures are isolated to a neutral result"""
+    start = time.perf_counter()
+    try:
+        result = func(*args, **kwargs)
+    except Exception as e:
+        print(f"{label} failed: {e}")
+        result = {'score': 0.5, 'error': str(e)}
+    return result, (time.perf_counter() - start) * 1000
+
+
+def build_memory_report(pyramid, layers, tiled=False, native_size=None):
+    """Bound on per-request image memory, derived from the levels each layer used"""
+    mb = 1024 * 1024
+    base_w, base_h = pyramid.base.size
+    resident_bytes = base_w * base_h * 3
+    
+    level_sides = set()
+    per_layer = {}
+    total_working = 0
+    
+    for layer in layers:
+        module = LAYER_MODULES[layer]
+        if layer == 'metadata_forensics' and native_size is not None:
+            w, h = metadata_analyzer.analysis_size(native_size, pyramid.base.size)
+        else:
+            w, h = pyramid.level_size(get_layer_max_side(layer, tiled))
+        working_bytes = w * h * module.WORKING_BYTES_PER_PIXEL
+        
+        if (w, h) != (base_w, base_h) and (w, h) not in level_sides:
+            level_sides.add((w, h))
+            resident_bytes += w * h * 3
+        
+        # Layers run concurrently, so their working sets add up
+        total_working += working_bytes
+        per_layer[layer] = {
+            'resolution': [w, h],
+            'working_mb': round(working_bytes / mb, 1)
+        }
+    
+    report = {
+        'pixel_budget': config.IMAGE_MAX_PIXELS,
+        'layers': per_layer,
+        'estimated_peak_mb': round((resident_bytes + total_working) / mb, 1)
+    }
+    
+    if resource is not None:
+        # ru_maxrss is KiB on Linux; process-wide high-water mark
+        report['process_peak_rss_mb'] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    
+    return report
+
+
 def combine_scores_aggressive(results):
     weights = config.ENSEMBLE_WEIGHTS.copy()
     
@@ -238,6 +378,9 @@ def generate_detailed_breakdown(results):
             breakdown.append(f"  - Model Agreement: {nn['model_agreement']}")
         if 'num_models' in nn:
             breakdown.append(f"  - Models Used: {nn['num_models']}")
+        tiled = nn.get('tiled')
+        if tiled and 'error' not in tiled:
+            breakdown.append(f"  - Tiles Analyzed: {tiled['num_tiles']} (highest tile: {tiled['tile_max']:.2f})")
     
 
     if results.get('frequency_domain'):
@@ -0,0 +1,24 @@
+import time
+from models.ensemble_detector import get_ensemble_detector
+from utils.image_utils import load_image_resized
+
+
+def analyze_image_quick(source):
+    """
+    Latency-optimized image check on the shared ensemble.
+
+    The upload is decoded directly at the quick model's input size (JPEG
+    draft + one resize) and scored by the already-loaded model, so there is
+    no intermediate resize and no second model copy.
+    """
+    start = time.perf_counter()
+    
+    detector = get_ensemble_detector()
+    image = load_image_resized(source, detector.quick_input_size())
+    decode_ms = (time.perf_counter() - start) * 1000
+    
+    result = detector.predict_quick(image)
+    result['decode_ms'] = decode_ms
+    result['latency_ms'] = (time.perf_counter() - start) * 1000
+    
+    return result
@@ -0,0 +1,60 @@
+import types
+
+import numpy as np
+import pytest
+import torch
+from PIL import Image
+
+import config
+from models import ensemble_detector
+from models.ensemble_detector import EnsembleDetector, fake_label_index
+
+
+def labelled(id2label):
+    return types.SimpleNamespace(config=types.SimpleNamespace(id2label=id2label))
+
+
+@pytest.mark.parametrize('id2label, expected', [
+    ({0: 'Real', 1: 'Fake'}, 1),
+    ({0: 'Deepfake', 1: 'Realism'}, 0),
+    ({0: 'AI-generated', 1: 'human'}, 0),
+    ({0: 'Real', 1: 'other'}, 1),
+    ({0: 'other', 1: 'real'}, 0),
+    ({0: 'LABEL_0', 1: 'LABEL_1'}, 1),
+    ({}, 1),
+])
+def test_fake_label_index(id2label, expected):
+    assert fake_label_index(labelled(id2label)) == expected
+
+
+class StubClassifier(torch.nn.Module):
+    """Constant logits, labelled fake-first"""
+
+    config = types.SimpleNamespace(id2label={0: 'Fake', 1: 'Real'})
+
+    def forward(self, pixel_values):
+        logits = torch.tensor([[2.0, 0.0]]).repeat(pixel_values.shape[0], 1)
+        return types.SimpleNamespace(logits=logits)
+
+
+def stub_detector():
+    detector = EnsembleDetector.__new__(EnsembleDetector)
+    detector.models = [StubClassifier()]
+    detector.processors = [types.SimpleNamespace(size={'height': 8, 'width': 8}, do_rescale=True, rescale_factor=1 / 255,
+                                                 do_normalize=True, image_mean=[0.5] * 3, image_std=[0.5] * 3)]
+    detector.model_names = [config.QUICK_IMAGE_MODEL]
+    detector.model_types = ['huggingface']
+    detector.fake_indices = [fake_label_index(model) for model in detector.models]
+    detector._onnx_sessions = {}
+    return detector
+
+
+def test_quick_paths_score_the_fake_label(monkeypatch):
+    monkeypatch.setattr(config, 'QUICK_IMAGE_BACKEND', 'torch')
+    detector = stub_detector()
+    fake_prob = float(torch.softmax(torch.tensor([2.0, 0.0]), dim=0)[0])
+
+    batch = detector.predict_quick_batch(np.zeros((3, 8, 8, 3), dtype=np.uint8))
+    np.testing.assert_allclose(batch, fake_prob, rtol=1e-6)
+
+    assert detector.predict_quick(Image.new('RGB', (8, 8)))['score'] == pytest.approx(fake_prob)
@@ -0,0 +1,42 @@
+import pytest
+
+import config
+from models import ensemble_detector
+
+
+class StubDetector:
+    def __init__(self, global_score, tiled):
+        self.global_score = global_score
+        self.tiled = tiled
+
+    def predict_ensemble(self, image, silent=False):
+        return {'score': self.global_score, 'confidence': 0.9}
+
+    def predict_tiled(self, image):
+        return dict(self.tiled)
+
+
+def run(monkeypatch, global_score, tiled, weight=0.5):
+    monkeypatch.setattr(config, 'TILED_SCORE_WEIGHT', weight)
+    monkeypatch.setattr(ensemble_detector, 'get_ensemble_detector', lambda: StubDetector(global_score, tiled))
+    return ensemble_detector.predict_ensemble_tiled(None)
+
+
+def test_tiled_score_is_blended_not_maxed(monkeypatch):
+    result = run(monkeypatch, 0.2, {'score': 0.8})
+
+    assert result['score'] == pytest.approx(0.5)
+    assert result['global_score'] == 0.2
+    assert result['tiled']['score'] == 0.8
+
+
+def test_blend_weight(monkeypatch):
+    assert run(monkeypatch, 0.2, {'score': 0.8}, weight=0.25)['score'] == pytest.approx(0.35)
+    assert run(monkeypatch, 0.9, {'score': 0.1}, weight=1.0)['score'] == pytest.approx(0.1)
+
+
+def test_failed_tiling_keeps_global_score(monkeypatch):
+    result = run(monkeypatch, 0.3, {'score': 0.5, 'error': 'Tiled prediction failed on all models'})
+
+    assert result['score'] == 0.3
+    assert 'global_score' not in result
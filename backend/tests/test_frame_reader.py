@@ -0,0 +1,61 @@
+import io
+
+import numpy as np
+
+from models.video import frame_reader
+
+
+PROBE = {'width': 8, 'height': 6, 'fps': 30.0, 'frame_count': 100_000, 'duration_seconds': 3333.0}
+
+
+class FakeProcess:
+    """ffmpeg stand-in that writes -frames:v blank bgr24 frames"""
+
+    def __init__(self, cmd):
+        count = int(cmd[cmd.index('-frames:v') + 1])
+        self.stdout = io.BytesIO(bytes(8 * 6 * 3 * count))
+
+    def poll(self):
+        return 0
+
+    def wait(self):
+        return 0
+
+
+def test_select_filter_merges_runs():
+    assert frame_reader.select_filter([10, 11, 12, 20, 30, 31], 10) == \
+        'select=between(n\\,0\\,2)+eq(n\\,10)+between(n\\,20\\,21)'
+
+
+def test_many_indices_are_split_across_runs(monkeypatch):
+    commands = []
+
+    def popen(cmd, **kwargs):
+        commands.append(cmd)
+        return FakeProcess(cmd)
+
+    monkeypatch.setattr(frame_reader.subprocess, 'Popen', popen)
+    wanted = list(range(0, 60_000, 3))
+
+    indices = [idx for idx, _ in frame_reader.iter_frames_ffmpeg('video.mp4', wanted, probe=PROBE)]
+
+    assert indices == wanted
+    assert len(commands) == -(-len(wanted) // frame_reader.FFMPEG_SELECT_MAX_FRAMES)
+    assert max(len(cmd[cmd.index('-vf') + 1]) for cmd in commands) < 32 * 1024
+
+
+def test_ffmpeg_start_failure_falls_back_to_opencv(monkeypatch):
+    def popen(cmd, **kwargs):
+        raise OSError(7, 'Argument list too long')
+
+    def opencv(video_path, frame_indices, max_gap=None, stats=None):
+        for idx in frame_indices:
+            yield idx, np.zeros((6, 8, 3), dtype=np.uint8)
+
+    monkeypatch.setattr(frame_reader, 'ffmpeg_available', lambda: True)
+    monkeypatch.setattr(frame_reader, 'probe_video', lambda video_path: PROBE)
+    monkeypatch.setattr(frame_reader.subprocess, 'Popen', popen)
+    monkeypatch.setattr(frame_reader, 'iter_frames_opencv', opencv)
+
+    frames = list(frame_reader.iter_frames('video.mp4', [1, 5, 9], backend='ffmpeg'))
+    assert [idx for idx, _ in frames] == [1, 5, 9]
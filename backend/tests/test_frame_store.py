@@ -0,0 +1,36 @@
+import numpy as np
+
+import config
+from models.video.frame_store import FrameArena
+
+
+def filled_arena(count, monkeypatch, cache_frames=3):
+    monkeypatch.setattr(config, 'FRAME_ARENA_CACHE_FRAMES', cache_frames)
+    arena = FrameArena(count, 8, 8)
+    for i in range(count):
+        arena.append(np.full((8, 8, 3), i, dtype=np.uint8), i, i / 30.0)
+    return arena
+
+
+def test_conversion_caches_are_bounded(monkeypatch):
+    arena = filled_arena(10, monkeypatch)
+
+    for i in range(10):
+        assert arena.rgb(i)[0, 0].tolist() == [i, i, i]
+        assert arena.gray(i)[0, 0] == i
+
+    assert len(arena._rgb) == 3
+    assert len(arena._gray) == 3
+    assert arena.nbytes() == 10 * 8 * 8 * 3 + 3 * 8 * 8 * 3 + 3 * 8 * 8
+
+
+def test_recently_used_conversion_is_kept(monkeypatch):
+    arena = filled_arena(5, monkeypatch, cache_frames=2)
+
+    first = arena.rgb(0)
+    arena.rgb(1)
+    assert arena.rgb(0) is first
+    arena.rgb(2)
+
+    assert list(arena._rgb) == [0, 2]
+    assert not first.flags.writeable
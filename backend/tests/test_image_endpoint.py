@@ -0,0 +1,32 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+
+@pytest.fixture
+def tiled_arg(monkeypatch):
+    seen = []
+
+    def analyze(source, tiled=None):
+        seen.append(tiled)
+        return {'error': 'stub'}
+
+    monkeypatch.setattr(main, 'analyze_image_comprehensive', analyze)
+    # Not entered as a context manager, so startup model preloading does not run
+    client = TestClient(main.app)
+
+    def post(query=''):
+        client.post(f'/analyze/image/comprehensive{query}', files={'file': ('a.jpg', b'\xff\xd8', 'image/jpeg')})
+        return seen[-1]
+
+    return post
+
+
+def test_tiled_query_is_passed_through(tiled_arg):
+    assert tiled_arg('?tiled=true') is True
+    assert tiled_arg('?tiled=false') is False
+
+
+def test_unset_tiled_defers_to_config(tiled_arg):
+    assert tiled_arg() is None
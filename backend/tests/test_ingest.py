@@ -0,0 +1,38 @@
+import numpy as np
+
+from models.video.frame_store import FrameArena
+from models.video.ingest import VideoIngest
+
+
+def selected(captured, cuts, boundaries, grid, target_frames):
+    ingest = VideoIngest.__new__(VideoIngest)
+    ingest.target_frames = target_frames
+    ingest.arena = FrameArena(len(captured), 4, 4)
+    for frame_idx in captured:
+        ingest.arena.append(np.zeros((4, 4, 3), dtype=np.uint8), frame_idx, frame_idx / 30.0)
+
+    ingest._select_frames(captured[0], cuts, set(boundaries), set(grid))
+    return ingest.arena.frame_indices
+
+
+def test_excess_scene_frames_are_thinned_across_the_whole_video():
+    cuts = list(range(30, 3000, 30))
+    boundaries = list(range(10)) + list(range(2990, 3000))
+    captured = sorted(set([0] + cuts + boundaries))
+
+    frames = selected(captured, cuts, boundaries, [], target_frames=20)
+
+    assert len(frames) == 20
+    assert frames[0] == 0
+    assert frames[-1] == 2999
+
+
+def test_grid_fills_up_to_target():
+    boundaries = [0, 1, 98, 99]
+    grid = list(range(2, 98, 4))
+    captured = sorted(boundaries + grid)
+
+    frames = selected(captured, [], boundaries, grid, target_frames=10)
+
+    assert len(frames) == 10
+    assert set(boundaries) <= set(frames)
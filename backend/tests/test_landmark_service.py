@@ -0,0 +1,105 @@
+import numpy as np
+import pytest
+
+from models import landmark_service
+
+
+class FakeLandmarker:
+    created = []
+
+    def __init__(self):
+        self.timestamps = []
+        self.closed = False
+        FakeLandmarker.created.append(self)
+
+    def detect_for_video(self, image, timestamp_ms):
+        self.timestamps.append(timestamp_ms)
+        return type('Result', (), {'face_landmarks': []})()
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def tracker(monkeypatch):
+    if not landmark_service.MEDIAPIPE_AVAILABLE:
+        pytest.skip("MediaPipe not available")
+
+    FakeLandmarker.created = []
+    monkeypatch.setattr(landmark_service, 'download_model', lambda: True)
+    monkeypatch.setattr(landmark_service, 'create_landmarker', lambda video_mode=False: FakeLandmarker())
+    return landmark_service.LandmarkService(pool_size=1, video_mode=True)
+
+
+def frames(n):
+    return [np.zeros((32, 32, 3), dtype=np.uint8) for _ in range(n)]
+
+
+def settle(tracker):
+    """Wait for background renewal: with one instance, checkout blocks until it is back"""
+    with tracker.checkout():
+        pass
+
+
+def test_each_track_gets_a_fresh_landmarker(tracker):
+    tracker.track(frames(3), [0, 40, 80])
+    tracker.track(frames(3), [0, 40, 80])
+    settle(tracker)
+
+    first, second, spare = FakeLandmarker.created
+    assert first.closed and second.closed and not spare.closed
+    assert first.timestamps == second.timestamps == [1, 41, 81]
+    assert tracker.metrics()['pool_size'] == 1
+    assert tracker.metrics()['idle'] == 1
+
+
+def test_abandoned_track_still_renews(tracker):
+    stream = tracker.iter_track(frames(3), [0, 40, 80])
+    next(stream)
+    stream.close()
+    settle(tracker)
+
+    assert FakeLandmarker.created[0].closed
+    assert tracker.metrics()['idle'] == 1
+
+
+def test_track_metrics_are_nan_without_a_face():
+    face = np.zeros((landmark_service.NUM_LANDMARKS, 3), dtype=np.float32)
+    for eye in (landmark_service.LEFT_EYE, landmark_service.RIGHT_EYE):
+        face[eye, :2] = [(0, 0.5), (1, 0), (2, 0), (3, 0.5), (2, 1), (1, 1)]
+    face[landmark_service.MOUTH, :2] = [(1, 0.5), (1, 1.5), (0, 1), (2, 1)]
+
+    track = landmark_service.LandmarkTrack.from_results([face, None, np.zeros_like(face)], [0, 40, 80])
+
+    ear = track.eye_aspect_ratio()
+    assert ear[0] == pytest.approx(1 / 3)
+    assert np.isnan(ear[1])
+    assert ear[2] == pytest.approx(0.3)
+
+    mouth = track.mouth_openness()
+    assert mouth[0] == pytest.approx(0.5)
+    assert np.isnan(mouth[1])
+    assert mouth[2] == 0.0
+
+
+def test_renewal_happens_off_the_request_thread(tracker, monkeypatch):
+    import threading
+
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow_landmarker(video_mode=False):
+        started.set()
+        release.wait(5)
+        return FakeLandmarker()
+
+    monkeypatch.setattr(landmark_service, 'create_landmarker', slow_landmarker)
+    tracker.track(frames(2), [0, 40])
+
+    # track() returned while the replacement is still being built
+    assert started.wait(5)
+    assert tracker.metrics()['idle'] == 0
+
+    release.set()
+    settle(tracker)
+    assert tracker.metrics()['idle'] == 1
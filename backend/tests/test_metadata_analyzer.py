@@ -0,0 +1,65 @@
+import io
+
+import cv2
+import numpy as np
+import pytest
+from PIL import Image
+
+import config
+from models import metadata_analyzer
+from utils.forensics_utils import apply_ela, ela_difference
+
+
+def jpeg_bytes(w, h, seed=0):
+    rng = np.random.default_rng(seed)
+    noise = cv2.GaussianBlur(rng.random((h, w, 3)).astype(np.float32), (0, 0), 2)
+    pixels = cv2.normalize(noise, None, 0, 255, cv2.NORM_MINMAX).astype(np.uint8)
+
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format='JPEG', quality=85)
+    return buffer.getvalue()
+
+
+def test_tiled_ela_matches_one_resave():
+    image = Image.open(io.BytesIO(jpeg_bytes(700, 500))).convert('RGB')
+
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=95)
+    whole = cv2.absdiff(np.asarray(image), np.asarray(Image.open(buffer)))
+
+    assert np.array_equal(ela_difference(image, tile=1024), whole)
+    # Seams only differ by chroma upsampling
+    assert np.mean(ela_difference(image, tile=256) != whole) < 0.01
+
+
+def test_ela_statistics_match_normalized_map():
+    image = Image.open(io.BytesIO(jpeg_bytes(333, 517))).convert('RGB')
+    ela = apply_ela(image)
+
+    h, w = ela.shape[:2]
+    regions = [np.var(ela[i * h // 4:(i + 1) * h // 4, j * w // 4:(j + 1) * w // 4]) for i in range(4) for j in range(4)]
+    expected = min(np.var(ela) * 8.0 +
+                   np.mean(ela > ela.mean() + 2 * ela.std()) * 4.0 +
+                   np.std(regions) / (np.mean(regions) + 1e-10) * 2.0, 1.0)
+
+    assert metadata_analyzer.perform_ela_analysis(image) == pytest.approx(expected, rel=1e-4)
+
+
+def test_ela_runs_on_native_resolution():
+    data = jpeg_bytes(900, 600)
+    level = Image.open(io.BytesIO(data)).convert('RGB').resize((450, 300))
+
+    result = metadata_analyzer.analyze_metadata(data, image=level)
+    assert result['analysis_resolution'] == [900, 600]
+
+    native = Image.open(io.BytesIO(data)).convert('RGB')
+    assert metadata_analyzer.load_analysis_image(data, native) is native
+
+
+def test_over_budget_images_use_the_decoded_image(monkeypatch):
+    monkeypatch.setattr(config, 'IMAGE_MAX_PIXELS', 100_000)
+    data = jpeg_bytes(900, 600)
+    level = Image.open(io.BytesIO(data)).convert('RGB').resize((450, 300))
+
+    assert metadata_analyzer.load_analysis_image(data, level) is level
+    assert metadata_analyzer.analysis_size((900, 600), level.size) == (450, 300)
@@ -0,0 +1,76 @@
+import cv2
+import numpy as np
+import pytest
+
+from models.video.frame_store import FrameArena
+from models.video.motion_engine import MotionEngine
+
+
+H, W = 480, 640
+MARGIN = 24
+
+
+def texture(seed=0):
+    rng = np.random.default_rng(seed)
+    noise = rng.random((H + 2 * MARGIN, W + 2 * MARGIN)).astype(np.float32)
+    smooth = cv2.GaussianBlur(noise, (0, 0), 3)
+    return cv2.normalize(smooth, None, 0, 255, cv2.NORM_MINMAX).astype(np.uint8)
+
+
+def shifted_frames(shifts):
+    """Frames cropped from one texture, each moved by (dx, dy) pixels from the previous"""
+    base = texture()
+    arena = FrameArena(len(shifts) + 1, H, W)
+    x = y = 0
+
+    for dx, dy in [(0, 0)] + list(shifts):
+        x, y = x + dx, y + dy
+        crop = base[MARGIN - y:MARGIN - y + H, MARGIN - x:MARGIN - x + W]
+        arena.append(cv2.cvtColor(crop, cv2.COLOR_GRAY2BGR))
+
+    return arena
+
+
+def farneback_magnitude(prev, curr, region=None):
+    # Full-resolution Farneback with the parameters the temporal layer used before MotionEngine
+    flow = cv2.calcOpticalFlowFarneback(prev, curr, None, pyr_scale=0.5, levels=3, winsize=15,
+                                        iterations=3, poly_n=5, poly_sigma=1.2, flags=0)
+    magnitude = np.sqrt(flow[..., 0] ** 2 + flow[..., 1] ** 2)
+    if region == 'center':
+        magnitude = magnitude[H // 4:3 * H // 4, W // 4:3 * W // 4]
+    return float(magnitude.mean())
+
+
+@pytest.mark.parametrize('shift', [(3, 0), (6, 4), (0, 10)])
+@pytest.mark.parametrize('region', [None, 'center'])
+def test_dis_on_downscaled_frames_matches_full_resolution_farneback(shift, region):
+    arena = shifted_frames([shift])
+    engine = MotionEngine(arena.refs(), work_width=320)
+
+    dis = engine.flow_magnitude(0, region)
+    farneback = farneback_magnitude(arena.gray(0), arena.gray(1), region)
+
+    assert dis == pytest.approx(farneback, rel=0.15)
+    assert dis == pytest.approx(np.hypot(*shift), rel=0.15)
+
+
+def test_static_frames_have_no_motion():
+    arena = shifted_frames([(0, 0)])
+    engine = MotionEngine(arena.refs())
+
+    assert engine.flow_magnitude(0) < 0.1
+    assert engine.diff_mean(0) == 0.0
+    assert engine.ssim(0) == pytest.approx(1.0)
+
+
+def test_per_frame_caches_stay_bounded():
+    arena = shifted_frames([(2, 1)] * 7)
+    engine = MotionEngine(arena.refs())
+
+    assert len(engine.flow_magnitudes()) == 7
+    assert len(engine.diff_means()) == 7
+    assert [engine.hist_correlation(i) is not None for i in range(7)] == [True] * 7
+
+    assert len(engine._recent) <= 2
+    assert len(engine._small) <= 2
+    assert len(engine._hist) <= 2
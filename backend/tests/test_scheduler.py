@@ -0,0 +1,75 @@
+import pytest
+
+from models.video import scheduler
+from models.video.scheduler import CORE_PER_FRAME_LAYERS, DEFAULT_UNIT_COST_MS, LayerCostModel, VideoSchedule
+
+
+@pytest.fixture(autouse=True)
+def ffmpeg(monkeypatch):
+    monkeypatch.setattr(scheduler, 'ffmpeg_available', lambda: True)
+
+
+def probe(seconds, fps=60.0, width=3840, height=2160):
+    return {
+        'frame_count': int(seconds * fps),
+        'duration_seconds': float(seconds),
+        'fps': fps,
+        'width': width,
+        'height': height
+    }
+
+
+def plan(video, budget_ms, optional_layers=()):
+    return VideoSchedule(video, budget_ms, optional_layers=optional_layers, cost_model=LayerCostModel())
+
+
+def test_keyframes_only_caps_frames_at_duration():
+    schedule = plan(probe(20), 30_000)
+
+    assert schedule.keyframes_only
+    assert schedule.target_frames == 20
+
+    megapixels = 3840 * 2160 / 1e6
+    per_frame = sum(DEFAULT_UNIT_COST_MS[layer] for layer in CORE_PER_FRAME_LAYERS)
+    fixed = DEFAULT_UNIT_COST_MS['decode'] * 20 * megapixels + DEFAULT_UNIT_COST_MS['audio'] * 20
+    assert schedule.estimates['core'] == pytest.approx(fixed + per_frame * 20, abs=0.1)
+
+
+def test_keyframes_cap_overrides_minimum_frames():
+    schedule = plan(probe(3.2, fps=120.0), 5_000)
+
+    assert schedule.keyframes_only
+    assert schedule.target_frames == 4
+
+
+def test_full_decode_is_not_capped():
+    schedule = plan(probe(20, fps=30.0, width=640, height=360), 60_000)
+
+    assert not schedule.keyframes_only
+    assert schedule.target_frames == 50
+
+
+def test_skip_records_reason():
+    schedule = VideoSchedule(probe(20), None, optional_layers=('3d_video',), cost_model=LayerCostModel())
+    schedule.skip('3d_video', 'keyframes only: clips would need a full decode')
+
+    assert not schedule.runs('3d_video')
+    assert schedule.summary()['skipped'] == {'3d_video': 'keyframes only: clips would need a full decode'}
+
+
+def test_keyframes_only_skips_3d_video():
+    schedule = plan(probe(20), 30_000, optional_layers=('3d_video', 'compression'))
+
+    assert schedule.keyframes_only
+    assert not schedule.runs('3d_video')
+    assert schedule.skipped['3d_video'].startswith('keyframes only')
+    assert '3d_video' not in schedule.estimates
+    assert schedule.runs('compression')
+
+
+def test_keyframes_only_needs_ffmpeg(monkeypatch):
+    monkeypatch.setattr(scheduler, 'ffmpeg_available', lambda: False)
+    schedule = plan(probe(20), 30_000, optional_layers=('3d_video',))
+
+    assert not schedule.keyframes_only
+    assert schedule.over_budget
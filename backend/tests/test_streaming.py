@@ -0,0 +1,29 @@
+import numpy as np
+
+from models.video import streaming
+
+
+def fake_frames(missing):
+    def iter_frames(video_path, frame_indices, stats=None):
+        for idx in sorted(set(frame_indices)):
+            if idx not in missing:
+                yield idx, np.full((48, 64, 3), idx % 256, dtype=np.uint8)
+    return iter_frames
+
+
+def test_undecodable_window_is_skipped_not_the_rest(monkeypatch):
+    # Three 10 s windows at 10 fps; nothing in the middle window decodes
+    monkeypatch.setattr(streaming, 'iter_frames', fake_frames(set(range(100, 200))))
+    windows = list(streaming.plan_windows(10.0, 0, 300, 10.0, 4))
+
+    results = []
+    for start, end, arena, clip in streaming.iter_windows('video.mp4', 10.0, windows):
+        results.append((start, end, arena.frame_indices if arena is not None else None, clip))
+        if arena is not None:
+            arena.close()
+
+    assert [(start, end) for start, end, _, _ in results] == [(0, 100), (100, 200), (200, 300)]
+    assert results[0][2] == windows[0][2]
+    assert results[1][2] is None and results[1][3] is None
+    assert results[2][2] == windows[2][2]
+    assert results[2][3].shape[0] == streaming.CLIP_FRAMES
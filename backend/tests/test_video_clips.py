@@ -0,0 +1,50 @@
+import numpy as np
+
+from models.video.video_3d_model import ClipAssembler, video_clip_indices
+
+
+def assemble(candidates, total_frames):
+    clips = []
+    assembler = ClipAssembler(candidates, lambda start, clip: clips.append((start, clip)))
+
+    for frame_idx in range(total_frames):
+        if frame_idx in assembler.slots:
+            assembler.add(frame_idx, np.full((4, 4, 3), frame_idx, dtype=np.int32))
+
+    return clips
+
+
+def test_low_fps_windows_overlap_and_all_clips_complete():
+    # 5 fps * 2 s = 10 frames per window, shorter than a 16-frame clip
+    candidates = video_clip_indices(5.0, 200, 2.0, 16, max_clips=10)
+    assert len(candidates) == 10
+    assert set(candidates[0]) & set(candidates[1])
+
+    clips = assemble(candidates, 200)
+
+    assert [start for start, _ in clips] == [indices[0] for indices in candidates]
+    for (_, clip), indices in zip(clips, candidates):
+        assert clip.shape == (16, 4, 4, 3)
+        assert clip[:, 0, 0, 0].tolist() == indices
+
+
+def test_regular_fps_windows_do_not_overlap():
+    candidates = video_clip_indices(30.0, 600, 2.0, 16, max_clips=10)
+    flat = [idx for indices in candidates for idx in indices]
+    assert len(flat) == len(set(flat))
+
+    clips = assemble(candidates, 600)
+    assert len(clips) == len(candidates)
+
+
+def test_missing_frame_drops_only_that_clip():
+    candidates = video_clip_indices(5.0, 200, 2.0, 16, max_clips=3)
+    clips = []
+    assembler = ClipAssembler(candidates, lambda start, clip: clips.append(start))
+
+    # Frame 30 belongs only to the third window
+    for frame_idx in sorted(assembler.slots):
+        if frame_idx != 30:
+            assembler.add(frame_idx, np.zeros((4, 4, 3), dtype=np.uint8))
+
+    assert clips == [candidates[0][0], candidates[1][0]]
@@ -0,0 +1,118 @@
+import types
+
+import cv2
+import numpy as np
+import pytest
+import torch
+
+import config
+from models.video import video_3d_model
+
+
+CROP = 32
+FRAMES = 16
+
+
+class StubVideoMAE(torch.nn.Module):
+    """Per-sample linear classifier, so scores do not depend on the batch"""
+
+    def __init__(self):
+        super().__init__()
+        torch.manual_seed(0)
+        self.head = torch.nn.Linear(FRAMES * 3 * CROP * CROP, 10)
+
+    def forward(self, pixel_values):
+        logits = self.head(pixel_values.flatten(1))
+        return types.SimpleNamespace(logits=logits)
+
+
+def stub_processor():
+    return types.SimpleNamespace(
+        size={'shortest_edge': CROP},
+        crop_size={'height': CROP, 'width': CROP},
+        image_mean=[0.45, 0.45, 0.45],
+        image_std=[0.225, 0.225, 0.225],
+        rescale_factor=1 / 255.0
+    )
+
+
+def make_clips(count=7):
+    rng = np.random.default_rng(0)
+    return [rng.integers(0, 256, size=(FRAMES, 48, 64, 3), dtype=np.uint8) for _ in range(count)]
+
+
+def scores(monkeypatch, batch_size, bf16=False):
+    model = StubVideoMAE().eval()
+    monkeypatch.setattr(video_3d_model, 'get_videomae_model', lambda: (model, stub_processor(), torch.device('cpu')))
+    monkeypatch.setattr(config, 'VIDEOMAE_BATCH_SIZE', batch_size)
+    monkeypatch.setattr(config, 'VIDEOMAE_CPU_BF16', bf16)
+
+    return video_3d_model.analyze_with_videomae(make_clips())
+
+
+def test_batched_scores_match_per_clip_scores(monkeypatch):
+    per_clip = scores(monkeypatch, batch_size=1)
+    batched = scores(monkeypatch, batch_size=4)
+
+    assert len(batched['clip_scores']) == 7
+    np.testing.assert_allclose(batched['clip_scores'], per_clip['clip_scores'], atol=1e-5)
+    assert abs(batched['score'] - per_clip['score']) < 1e-5
+    assert batched['ms_per_clip'] >= 0
+
+
+def test_bf16_scores_within_tolerance(monkeypatch):
+    per_clip = scores(monkeypatch, batch_size=1)
+    bf16 = scores(monkeypatch, batch_size=4, bf16=True)
+
+    assert bf16['precision'] == 'bfloat16'
+    np.testing.assert_allclose(bf16['clip_scores'], per_clip['clip_scores'], atol=0.005)
+
+
+def videomae_processor():
+    # MCG-NJU/videomae-base preprocessing, built locally
+    from transformers import VideoMAEImageProcessor
+
+    return VideoMAEImageProcessor(
+        size={'shortest_edge': 224},
+        crop_size={'height': 224, 'width': 224},
+        image_mean=[0.485, 0.456, 0.406],
+        image_std=[0.229, 0.224, 0.225]
+    )
+
+
+def natural_frames(height, width):
+    """Smooth texture with hard edges, shifted a little per frame, BGR"""
+    rng = np.random.default_rng(1)
+    base = cv2.GaussianBlur(rng.random((height + 64, width + 64, 3)).astype(np.float32), (0, 0), 6)
+    base = cv2.normalize(base, None, 0, 255, cv2.NORM_MINMAX).astype(np.uint8)
+    cv2.rectangle(base, (width // 4, height // 4), (width // 2, height // 2), (255, 255, 255), -1)
+    return [base[t * 2:t * 2 + height, t * 3:t * 3 + width].copy() for t in range(FRAMES)]
+
+
+def processor_pixels(processor, frames):
+    rgb = [cv2.cvtColor(frame, cv2.COLOR_BGR2RGB) for frame in frames]
+    return processor(rgb, return_tensors='np')['pixel_values'][0]
+
+
+def test_clip_pixel_values_match_processor_at_clip_size():
+    # Ingest clips arrive at the processor's short side, so only rescale/crop/normalize remain
+    processor = videomae_processor()
+    frames = natural_frames(224, 398)
+
+    ours = video_3d_model.clip_pixel_values(np.stack([video_3d_model.clip_image(f) for f in frames]), processor)
+    np.testing.assert_allclose(ours, processor_pixels(processor, frames), atol=1e-5)
+
+
+@pytest.mark.parametrize('height, width', [(720, 1280), (1080, 1920), (180, 320)])
+def test_clip_pixel_values_track_processor_on_source_frames(height, width):
+    # INTER_AREA (clip_image) vs PIL bilinear (processor) on full-size frames, in normalized
+    # units (one gray level is ~0.017); the two filters only disagree much on hard edges
+    processor = videomae_processor()
+    frames = natural_frames(height, width)
+
+    ours = video_3d_model.clip_pixel_values(np.stack([video_3d_model.clip_image(f) for f in frames]), processor)
+    diff = np.abs(ours - processor_pixels(processor, frames))
+
+    assert ours.shape == (FRAMES, 3, 224, 224)
+    assert diff.mean() < 0.015
+    assert np.percentile(diff, 99) < 0.05
@@ -38,29 +38,52 @@ def apply_dct(image):
     return dct
 
 
-def apply_ela(image_path, quality=95):
+def ela_difference(image, quality=95, tile=1024):
     """
-    Error Level Analysis - detects regions with different compression levels
-    Returns difference image highlighting manipulated areas
+    uint8 |image - JPEG resave| at the image's own resolution.
+
+    The resave is done in tile x tile pieces; tile is a multiple of 16 so
+    every piece starts on the 8x8 (and 4:2:0 chroma) block grid of the whole
+    image. Only chroma upsampling along the seams differs from one resave.
     """
     import io
     from PIL import Image
+    from utils.image_utils import open_image_source
     
-    original = Image.open(image_path).convert('RGB')
+    if isinstance(image, Image.Image):
+        original = image.convert('RGB')
+    else:
+        original = open_image_source(image).convert('RGB')
     
-    # Resave at specified quality
-    temp_buffer = io.BytesIO()
-    original.save(temp_buffer, format='JPEG', quality=quality)
-    temp_buffer.seek(0)
+    pixels = np.asarray(original)
+    h, w = pixels.shape[:2]
+    diff = np.empty_like(pixels)
     
-    compressed = Image.open(temp_buffer)
+    for y in range(0, h, tile):
+        for x in range(0, w, tile):
+            block = pixels[y:y + tile, x:x + tile]
+            
+            # Resave at specified quality
+            temp_buffer = io.BytesIO()
+            Image.fromarray(block).save(temp_buffer, format='JPEG', quality=quality)
+            temp_buffer.seek(0)
+            
+            diff[y:y + tile, x:x + tile] = cv2.absdiff(block, np.asarray(Image.open(temp_buffer)))
     
-    # Calculate difference
-    ela_image = np.array(original).astype(np.float32) - np.array(compressed).astype(np.float32)
-    ela_image = np.abs(ela_image)
+    return diff
+
+
+def apply_ela(image, quality=95):
+    """
+    Error Level Analysis - detects regions with different compression levels
+    Returns difference image highlighting manipulated areas
+    """
+    ela_image = ela_difference(image, quality=quality)
     
     # Normalize
-    ela_image = (ela_image - ela_image.min()) / (ela_image.max() - ela_image.min() + 1e-10)
+    ela_min = float(ela_image.min())
+    ela_range = float(ela_image.max()) - ela_min
+    ela_image = (ela_image.astype(np.float32) - ela_min) / np.float32(ela_range + 1e-10)
     
     return ela_image
 
@@ -1,10 +1,120 @@
+import io
 from PIL import Image
 
-def preprocess_image(image_path):
-    img = Image.open(image_path).convert("RGB")
-    img = img.resize((299, 299))
-    return img
 
-if __name__ == "__main__":
-    img = preprocess_image("uploads/test.jpg")
-    img.show()
+def fit_within(size, max_pixels=None, max_side=None):
+    """Return the largest (w, h) with the same aspect ratio that fits both limits"""
+    w, h = size
+    scale = 1.0
+
+    if max_pixels and w * h > max_pixels:
+        scale = min(scale, (max_pixels / float(w * h)) ** 0.5)
+
+    if max_side and max(w, h) > max_side:
+        scale = min(scale, max_side / float(max(w, h)))
+
+    if scale >= 1.0:
+        return (w, h)
+
+    return (max(1, int(w * scale)), max(1, int(h * scale)))
+
+
+def open_image_source(source):
+    """Open a path, raw bytes or file-like object (rewound) with PIL"""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    elif hasattr(source, 'seek'):
+        source.seek(0)
+    return Image.open(source)
+
+
+def load_image(source, max_pixels=None, max_side=None):
+    """
+    Decode an image within a pixel budget.
+
+    JPEGs are decoded with libjpeg DCT scaling (Image.draft) so a 50 MP photo
+    never materializes at full resolution; everything else is decoded and then
+    downscaled. Returns (RGB image, info dict).
+    """
+    image = open_image_source(source)
+    original_size = image.size
+    image_format = image.format
+    target_size = fit_within(original_size, max_pixels, max_side)
+
+    draft_used = False
+    if target_size != original_size and image_format == 'JPEG':
+        # draft picks the smallest 1/2, 1/4, 1/8 scale that is still >= target
+        image.draft('RGB', target_size)
+        draft_used = image.size != original_size
+
+    image = image.convert('RGB')
+
+    if image.size != target_size:
+        image = image.resize(target_size, Image.BILINEAR, reducing_gap=2.0)
+
+    info = {
+        'format': image_format,
+        'original_size': list(original_size),
+        'decoded_size': list(image.size),
+        'draft_decoded': draft_used,
+        'downscaled': image.size != original_size
+    }
+
+    return image, info
+
+
+def load_image_resized(source, size):
+    """
+    Decode straight to a model's (width, height) input size.
+
+    JPEG draft decoding gets within 2x of the target for free, leaving a
+    single resize.
+    """
+    image = open_image_source(source)
+
+    if image.format == 'JPEG':
+        image.draft('RGB', size)
+
+    image = image.convert('RGB')
+
+    if image.size != tuple(size):
+        image = image.resize(tuple(size), Image.BILINEAR)
+
+    return image
+
+
+class ImagePyramid:
+    """
+    Lazily built set of downscaled copies of one decoded image.
+
+    Analyzers ask for the resolution they need via level(max_side) and each
+    level is derived from the smallest already-built level that is large enough.
+    """
+
+    def __init__(self, image):
+        self.base = image
+        self._levels = {max(image.size): image}
+
+    def level(self, max_side=None):
+        base_side = max(self.base.size)
+
+        if not max_side or max_side >= base_side:
+            return self.base
+
+        if max_side in self._levels:
+            return self._levels[max_side]
+
+        source_side = min(side for side in self._levels if side >= max_side)
+        source = self._levels[source_side]
+
+        target_size = fit_within(source.size, max_side=max_side)
+        level = source.resize(target_size, Image.BILINEAR, reducing_gap=2.0)
+
+        self._levels[max_side] = level
+        return level
+
+    def level_size(self, max_side=None):
+        if not max_side:
+            return self.base.size
+        return fit_within(self.base.size, max_side=max_side)
+